@@ -1,18 +1,87 @@
 from django.contrib import admin
-from .models import Part, BOMFile, BOMEntry
+from django.db.models import Q
+from .keys import normalize_manufacturer, normalize_mpn, prefix_range
+from .models import Part, BOMFile, BOMEntry, ComparisonJob, ImportedFile, ManufacturerAlias, PartUsage
+from .where_used import find_parts
+
+def part_key_search(queryset, search_term, prefix=''):
+    """
+    Filters queryset to parts whose MPN or manufacturer starts with search_term,
+    compared on the indexed lookup keys instead of scanning the raw columns.
+    """
+    return queryset.filter(
+        Q(**prefix_range(f'{prefix}mpn_key', normalize_mpn(search_term)))
+        | Q(**prefix_range(f'{prefix}manufacturer_key', normalize_manufacturer(search_term)))
+    )
 
 @admin.register(Part)
 class PartAdmin(admin.ModelAdmin):
     list_display = ('mpn', 'manufacturer')
     search_fields = ('mpn', 'manufacturer')
+    search_help_text = 'Part number or manufacturer prefix, ignoring case and spacing.'
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return part_key_search(queryset, search_term), False
 
 @admin.register(BOMFile)
 class BOMFileAdmin(admin.ModelAdmin):
-    list_display = ('name', 'user', 'is_master', 'uploaded_at')
+    list_display = ('name', 'user', 'is_master', 'revision', 'delta_depth', 'uploaded_at')
     list_filter = ('user', 'is_master')
     search_fields = ('name',)
 
 @admin.register(BOMEntry)
 class BOMEntryAdmin(admin.ModelAdmin):
     list_display = ('part', 'bom_file', 'quantity', 'reference_designators')
-    search_fields = ('part__mpn', 'part__manufacturer', 'bom_file__name')
\ No newline at end of file
+    list_select_related = ('part', 'bom_file')
+    search_fields = ('part__mpn', 'part__manufacturer', 'bom_file__name')
+    search_help_text = 'Part number or manufacturer prefix, or BOM file name.'
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        # Resolve the (few) matching parts and files first so the entry table is only
+        # reached through its (bom_file, part) and part indexes
+        parts = part_key_search(Part.objects.all(), search_term).values('pk')
+        files = BOMFile.objects.filter(name__icontains=search_term.strip()).values('pk')
+        return queryset.filter(Q(part__in=parts) | Q(bom_file__in=files)), False
+
+@admin.register(PartUsage)
+class PartUsageAdmin(admin.ModelAdmin):
+    """Where-used lookup across every user's BOM files."""
+    list_display = ('part', 'bom_file', 'quantity')
+    list_select_related = ('part', 'bom_file')
+    search_fields = ('part__mpn',)
+    search_help_text = 'Part number prefix, or a pattern with * and ? wildcards.'
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(part__in=find_parts(search_term).values('pk')), False
+
+    def has_add_permission(self, request):
+        # Maintained by ingestion
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(ManufacturerAlias)
+class ManufacturerAliasAdmin(admin.ModelAdmin):
+    list_display = ('alias', 'canonical', 'updated_at')
+    search_fields = ('alias', 'canonical')
+
+@admin.register(ComparisonJob)
+class ComparisonJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'master_bom', 'user', 'status', 'created_at', 'finished_at')
+    list_filter = ('status',)
+
+@admin.register(ImportedFile)
+class ImportedFileAdmin(admin.ModelAdmin):
+    list_display = ('name', 'source', 'bom_file', 'error', 'imported_at')
+    list_filter = ('source',)
+    search_fields = ('name', 'error')
@@ -0,0 +1,122 @@
+import difflib
+import hashlib
+import threading
+from collections import Counter, defaultdict
+
+from .keys import normalize_manufacturer
+
+
+def _ngrams(key, size):
+    padded = f' {key} '
+    return {padded[i:i + size] for i in range(len(padded) - size + 1)}
+
+
+class ManufacturerResolver:
+    """
+    Maps manufacturer names found in BOM files to canonical names, trying in turn an
+    exact alias, the normalized alias (see keys.normalize_manufacturer) and the closest
+    known name. Names nothing matches are returned unchanged.
+
+    Fuzzy matching looks up the names sharing the most trigrams with the name in an
+    inverted index, then accepts the best one whose difflib similarity reaches the
+    threshold. Trigram overlap alone over-matches names sharing a long word
+    ('ON Semiconductor' and 'NXP Semiconductors'), so it only selects what to compare.
+
+    Free of Django imports, so it can be handed to parser worker processes.
+    """
+    ngram_size = 3
+    # Number of known names compared with difflib per fuzzy lookup
+    max_candidates = 5
+    # Trigrams found in more than this share of the names (' SEMICONDUCTOR') say little
+    # about which name matches and would make every lookup touch most of the index
+    common_ngram_share = 0.05
+    # Distinct names whose resolution is remembered
+    memo_size = 10000
+
+    def __init__(self, aliases, threshold=0.9, version=''):
+        self.aliases = tuple(aliases)
+        self.threshold = threshold
+        self.version = version
+
+        self._exact = {}
+        self._normalized = {}
+        for alias, canonical in self.aliases:
+            self._exact[alias] = canonical
+            self._exact.setdefault(canonical, canonical)
+            self._normalized[normalize_manufacturer(alias)] = canonical
+            self._normalized.setdefault(normalize_manufacturer(canonical), canonical)
+
+        # Inverted trigram index over the normalized names, so a fuzzy lookup only
+        # scores the names sharing at least one trigram with the query
+        self._keys = list(self._normalized)
+        self._index = defaultdict(list)
+        for position, key in enumerate(self._keys):
+            for ngram in _ngrams(key, self.ngram_size):
+                self._index[ngram].append(position)
+
+        self._memo = {}
+        self._memo_lock = threading.Lock()
+
+    def __reduce__(self):
+        # Ship the alias table only; the indexes are rebuilt on the other side
+        return type(self), (self.aliases, self.threshold, self.version)
+
+    def resolve(self, name):
+        canonical = self._memo.get(name)
+        if canonical is None:
+            canonical = self._exact.get(name)
+            if canonical is None:
+                key = normalize_manufacturer(name)
+                canonical = self._normalized.get(key) or self._closest(key) or name
+            with self._memo_lock:
+                if len(self._memo) >= self.memo_size:
+                    self._memo.clear()
+                self._memo[name] = canonical
+        return canonical
+
+    def _closest(self, key):
+        """Canonical name of the known name most similar to key, if similar enough."""
+        postings = [self._index[ngram] for ngram in _ngrams(key, self.ngram_size) if ngram in self._index]
+        common = max(len(self._keys) * self.common_ngram_share, self.max_candidates)
+        distinctive = [positions for positions in postings if len(positions) <= common]
+
+        shared = Counter()
+        for positions in distinctive or postings:
+            shared.update(positions)
+
+        best, best_score = None, self.threshold
+        for position, _ in shared.most_common(self.max_candidates):
+            score = difflib.SequenceMatcher(None, key, self._keys[position], autojunk=False).ratio()
+            if score >= best_score:
+                best, best_score = position, score
+        return None if best is None else self._normalized[self._keys[best]]
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_manufacturer_resolver():
+    """
+    Returns the resolver for the current ManufacturerAlias table, or None when the
+    table is empty. The resolver is rebuilt only when the table has changed.
+    """
+    from django.conf import settings
+    from django.db.models import Count, Max
+
+    from .models import ManufacturerAlias
+
+    global _resolver
+    state = ManufacturerAlias.objects.aggregate(count=Count('pk'), updated=Max('updated_at'))
+    if not state['count']:
+        return None
+    version = hashlib.sha256(f"{state['count']}:{state['updated'].isoformat()}".encode('utf-8')).hexdigest()[:16]
+
+    with _resolver_lock:
+        if _resolver is None or _resolver.version != version:
+            _resolver = ManufacturerResolver(
+                ManufacturerAlias.objects.values_list('alias', 'canonical'),
+                threshold=getattr(settings, 'BOM_MANUFACTURER_FUZZY_THRESHOLD', 0.9),
+                version=version,
+            )
+        return _resolver
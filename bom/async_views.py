@@ -0,0 +1,168 @@
+"""
+Async variants of the views polled while comparisons run: the BOM viewer API, the job
+status endpoint and the comparison summary. Under ASGI a sync view holds a thread for
+the whole request, so a few long comparison uploads can starve the viewer; these wait
+on the database through the async ORM instead, and hand the parsing of a master BOM
+that has no entries yet to a process pool.
+
+urls.py routes to them instead of their sync counterparts in views.py when
+settings.BOM_ASYNC_VIEWS is on. Their responses are the same.
+"""
+import asyncio
+import multiprocessing
+import threading
+from calendar import timegm
+from concurrent.futures import ProcessPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, redirect, render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .aliases import get_manufacturer_resolver
+from .ingestion import bulk_ingest_entries
+from .instrumentation import span
+from .jobs import job_progress
+from .models import BOMEntry, BOMFile, ComparisonJob
+from .parser_factory import parse_file
+from .queries import InvalidQuery, abom_entries, aiter_bom_data_json, bom_entries_page
+from .views import (
+    BOM_DATA_MAX_PAGE_SIZE, BOM_DATA_PAGE_SIZE, _comparison_page, _paginated_comparison,
+)
+
+_parse_executor = None
+_parse_executor_lock = threading.Lock()
+
+
+def _get_parse_executor():
+    """The process pool masters are parsed in, started on first use and kept for the life of the process."""
+    global _parse_executor
+    with _parse_executor_lock:
+        if _parse_executor is None:
+            _parse_executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'BOM_PARSE_WORKERS', 1),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _parse_executor
+
+
+async def aparse_and_save(bom_file):
+    """parse_xlsx_and_save with the parsing done in the process pool, off the event loop."""
+    try:
+        resolver = await sync_to_async(get_manufacturer_resolver)()
+        with span('parse'):
+            entries = await asyncio.get_running_loop().run_in_executor(
+                _get_parse_executor(), parse_file, bom_file.file.path, bom_file.file.name, resolver,
+            )
+        await sync_to_async(bulk_ingest_entries)(bom_file, entries)
+        return (True, None)
+    except Exception as e:
+        return (False, f"An unexpected error occurred while parsing the file: {e}")
+
+
+async def _ahas_entries(bom_file):
+    return bool(bom_file.delta_depth) or await BOMEntry.objects.filter(bom_file=bom_file).aexists()
+
+
+@login_required
+async def get_bom_data(request, bom_file_id):
+    """views.get_bom_data, served without holding a thread."""
+    user = await request.auser()
+    bom_file = await aget_object_or_404(BOMFile, pk=bom_file_id, user=user)
+
+    # What @condition does for the sync view, from the row already fetched
+    etag = quote_etag(f'bom-{bom_file.pk}-v{bom_file.entries_version}')
+    last_modified = timegm((bom_file.entries_updated_at or bom_file.uploaded_at).utctimetuple())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    if not await _ahas_entries(bom_file):
+        success, error_message = await aparse_and_save(bom_file)
+        if not success:
+            return JsonResponse({'error': error_message}, status=500)
+
+    if not any(param in request.GET for param in ('q', 'sort', 'cursor', 'limit')):
+        response = StreamingHttpResponse(
+            aiter_bom_data_json(bom_file, abom_entries(bom_file)),
+            content_type='application/json',
+        )
+    else:
+        try:
+            limit = int(request.GET.get('limit', BOM_DATA_PAGE_SIZE))
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return JsonResponse({'error': 'limit must be a positive integer.'}, status=400)
+        try:
+            entries, next_cursor, total = await sync_to_async(bom_entries_page)(
+                bom_file,
+                search=request.GET.get('q', '').strip(),
+                sort=request.GET.get('sort', ''),
+                cursor=request.GET.get('cursor'),
+                limit=min(limit, BOM_DATA_MAX_PAGE_SIZE),
+            )
+        except InvalidQuery as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        response = JsonResponse({
+            'file_name': bom_file.name,
+            'total': total,
+            'next_cursor': next_cursor,
+            'entries': entries,
+        })
+
+    if request.method in ('GET', 'HEAD'):
+        if not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(last_modified)
+        response.headers.setdefault('ETag', etag)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+async def comparison_job_status(request, job_id):
+    user = await request.auser()
+    job = await aget_object_or_404(ComparisonJob, pk=job_id, user=user)
+    return JsonResponse(job_progress(job, [job_file async for job_file in job.files.all()]))
+
+
+@login_required
+async def comparison_summary(request, job_id=None):
+    """views.comparison_summary, served without holding a thread."""
+    user = await request.auser()
+    if job_id is None:
+        job_id = await request.session.aget('comparison_job_id', None)
+    job = await ComparisonJob.objects.filter(pk=job_id, user=user).select_related('master_bom').afirst() if job_id else None
+
+    if job is not None and job.status in (ComparisonJob.STATUS_RECEIVING, ComparisonJob.STATUS_PENDING, ComparisonJob.STATUS_RUNNING):
+        messages.info(request, "The comparison is still running. Please try again in a moment.")
+        return redirect('home')
+
+    if job is not None and job.status == ComparisonJob.STATUS_FAILED:
+        messages.error(request, f"The comparison failed: {job.error}")
+        return redirect('home')
+
+    if job is None:
+        # Reading the stored messages loads them from the session
+        current_messages = await sync_to_async(lambda: list(messages.get_messages(request)))()
+        if not current_messages:
+            messages.warning(request, "No comparison results found. Please perform a comparison first.")
+        return redirect('home')
+
+    all_comparison_results = []
+    async for result in job.results.all():
+        page, rows = _comparison_page(request, result, await result.rows.acount())
+        all_comparison_results.append(_paginated_comparison(request, result, page, [row async for row in rows]))
+
+    context = {
+        'master_bom_name': job.master_bom.name,
+        'all_comparison_results': all_comparison_results,
+        'global_parsing_errors': [job_file.error async for job_file in job.files.all() if job_file.error],
+    }
+    # The base template lists the pending messages, which reads the session
+    return await sync_to_async(render)(request, 'compare_results.html', context)
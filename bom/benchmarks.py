@@ -0,0 +1,241 @@
+"""
+Benchmark harness for the parsing, ingestion, data loading and comparison paths.
+Run it through `python manage.py benchmark_bom`; see that command for the options.
+"""
+import csv
+import os
+import platform
+import random
+import time
+import tracemalloc
+
+import django
+import openpyxl
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from docx import Document
+
+from .comparison import perform_comparison
+from .parser_factory import get_bom_parser
+from .parsers import BaseBOMParser
+from .records import bom_line
+
+HEADERS = BaseBOMParser.required_columns
+FORMATS = ('xlsx', 'csv', 'txt', 'docx', 'pdf')
+MANUFACTURERS = ('Murata', 'Vishay', 'Wurth Elektronik', 'Texas Instruments', 'Yageo', 'TDK', 'Kemet', 'Nexperia')
+DESIGNATOR_PREFIXES = ('C', 'R', 'L', 'D', 'U', 'Q', 'J')
+
+
+def synthetic_entries(count, seed=0):
+    """count BOM entries with distinct parts and realistic designator lists."""
+    rng = random.Random(seed)
+    next_designator = {prefix: 1 for prefix in DESIGNATOR_PREFIXES}
+    entries = []
+    for i in range(count):
+        prefix = rng.choice(DESIGNATOR_PREFIXES)
+        quantity = rng.choice((1, 1, 1, 2, 3, 4, 8))
+        start = next_designator[prefix]
+        next_designator[prefix] += quantity
+        entries.append(bom_line(
+            f'{prefix}{rng.randrange(16 ** 6):06X}-{i}',
+            rng.choice(MANUFACTURERS),
+            quantity,
+            ' '.join(f'{prefix}{n}' for n in range(start, start + quantity)),
+        ))
+    return entries
+
+
+def revised_entries(entries, change_ratio=0.05, seed=1):
+    """A copy of entries with about change_ratio of them changed, removed or added."""
+    rng = random.Random(seed)
+    revised = []
+    for entry in entries:
+        roll = rng.random()
+        if roll < change_ratio / 3:
+            continue
+        if roll < change_ratio * 2 / 3:
+            entry = entry._replace(quantity=entry.quantity + 1, designators=entry.designators + ' X1')
+        revised.append(entry)
+    revised.extend(synthetic_entries(int(len(entries) * change_ratio / 3), seed=seed + 1))
+    return revised
+
+
+def _table(entries):
+    yield HEADERS
+    for entry in entries:
+        yield [entry.designators, entry.quantity, entry.mpn, entry.manufacturer]
+
+
+def write_xlsx(path, entries):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in _table(entries):
+        sheet.append(row)
+    workbook.save(path)
+
+
+def write_csv(path, entries):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(_table(entries))
+
+
+def write_txt(path, entries):
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in _table(entries):
+            f.write('\t'.join(str(value) for value in row) + '\n')
+
+
+def write_docx(path, entries):
+    document = Document()
+    rows = list(_table(entries))
+    table = document.add_table(rows=len(rows), cols=len(HEADERS))
+    for table_row, row in zip(table.rows, rows):
+        for cell, value in zip(table_row.cells, row):
+            cell.text = str(value)
+    document.save(path)
+
+
+def _pdf_text(value):
+    return str(value).replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def write_pdf(path, entries, rows_per_page=45, repeat_header=True, cover_text=None):
+    """
+    Writes entries as a ruled table running over as many pages as needed, in a minimal
+    hand-built PDF (no PDF writing library is a dependency of this project). The header
+    is repeated on every page unless repeat_header is false; cover_text adds a leading
+    page with that line of text and no table.
+    """
+    column_width, row_height, top = 140, 16, 770
+    rows = list(_table(entries))[1:]
+    pages = [rows[i:i + rows_per_page] for i in range(0, len(rows), rows_per_page)] or [[]]
+    pages = [[HEADERS] + page_rows if repeat_header or number == 0 else page_rows for number, page_rows in enumerate(pages)]
+    if cover_text is not None:
+        pages.insert(0, None)
+
+    objects = [b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    pages_id = 2 + 2 * len(pages)
+    page_ids = []
+    for page_rows in pages:
+        operators = []
+        if page_rows is None:
+            operators.append(f'BT /F1 12 Tf 30 {top} Td ({_pdf_text(cover_text)}) Tj ET')
+        for r, row in enumerate(page_rows or ()):
+            y = top - (r + 1) * row_height
+            for c, value in enumerate(row):
+                x = 30 + c * column_width
+                operators.append(f'{x} {y} {column_width} {row_height} re S')
+                operators.append(f'BT /F1 7 Tf {x + 2} {y + 5} Td ({_pdf_text(value)}) Tj ET')
+        content = '\n'.join(operators).encode('latin-1', 'replace')
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content))
+        objects.append(
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] /Contents %d 0 R '
+            b'/Resources << /Font << /F1 1 0 R >> >> >>' % (pages_id, len(objects))
+        )
+        page_ids.append(len(objects))
+    objects.append(b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % page_id for page_id in page_ids), len(page_ids),
+    ))
+    objects.append(b'<< /Type /Catalog /Pages %d 0 R >>' % pages_id)
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    output += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    output += b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, len(objects), xref)
+    with open(path, 'wb') as f:
+        f.write(output)
+
+
+FORMAT_WRITERS = {
+    'xlsx': write_xlsx,
+    'csv': write_csv,
+    'txt': write_txt,
+    'docx': write_docx,
+    'pdf': write_pdf,
+}
+
+
+def measure(name, rows, func, trace_memory=True):
+    """Runs func once; returns (its result, a JSON-serializable measurement)."""
+    if trace_memory:
+        tracemalloc.start()
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        try:
+            result = func()
+        finally:
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+            if trace_memory:
+                tracemalloc.stop()
+    return result, {
+        'name': name,
+        'rows': rows,
+        'seconds': round(elapsed, 6),
+        'rows_per_second': round(rows / elapsed, 1) if elapsed > 0 else None,
+        'peak_memory_bytes': peak,
+        'queries': len(queries),
+    }
+
+
+def run_benchmarks(sizes, formats, work_dir, make_bom_file, get_bom_data, seed=0, trace_memory=True, log=None):
+    """
+    Benchmarks every size: parsing each format, parse_xlsx_and_save, get_bom_data and
+    perform_comparison. make_bom_file(path) must return a saved BOMFile for the
+    workbook at path, and get_bom_data(bom_file) must load it through the view; both
+    are supplied by the caller, which owns the database the benchmark writes to.
+    Returns the report as a JSON-serializable dict.
+    """
+    # Imported here so the generators above can be used without the view layer
+    from .views import parse_xlsx_and_save
+
+    results = []
+
+    def record(name, rows, func):
+        result, measurement = measure(name, rows, func, trace_memory)
+        results.append(dict(measurement, size=size))
+        if log:
+            log(measurement)
+        return result
+
+    for size in sizes:
+        entries = synthetic_entries(size, seed)
+        paths = {}
+        for fmt in formats:
+            paths[fmt] = os.path.join(work_dir, f'bom-{size}.{fmt}')
+            FORMAT_WRITERS[fmt](paths[fmt], entries)
+
+        for fmt, path in paths.items():
+            parser = get_bom_parser(path, os.path.basename(path))
+            parsed = record(f'parse:{fmt}', size, lambda: parser.parse(path))
+            if len(parsed) != size:
+                raise ValueError(f'{fmt} parser returned {len(parsed)} of {size} entries')
+
+        xlsx_path = paths.get('xlsx') or os.path.join(work_dir, f'bom-{size}.xlsx')
+        if 'xlsx' not in paths:
+            write_xlsx(xlsx_path, entries)
+        bom_file = make_bom_file(xlsx_path)
+        success, error = record('parse_xlsx_and_save', size, lambda: parse_xlsx_and_save(bom_file))
+        if not success:
+            raise ValueError(error)
+        record('get_bom_data', size, lambda: get_bom_data(bom_file))
+
+        target = revised_entries(entries, seed=seed + 1)
+        record('perform_comparison', size, lambda: perform_comparison(entries, target))
+
+    return {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+        'database': connection.vendor,
+        'sizes': list(sizes),
+        'formats': list(formats),
+        'memory_traced': trace_memory,
+        'results': results,
+    }
@@ -0,0 +1,203 @@
+"""
+Bulk import of master BOMs from a directory tree or zip archive (manage.py import_bom).
+
+Files are parsed in a pool of processes and stored in batches: one transaction per
+batch writes the BOMFiles, their entries and any new Parts, along with an ImportedFile
+checkpoint for every file of the batch, failed ones included. A rerun over the same
+source skips the checkpointed files, so an interrupted import resumes after its last
+committed batch.
+"""
+import itertools
+import multiprocessing
+import os
+import tempfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .aliases import get_manufacturer_resolver
+from .ingestion import bulk_ingest_files
+from .models import BOMFile, ImportedFile
+from .parser_factory import SUPPORTED_EXTENSIONS, parse_file
+
+FILES_PER_TRANSACTION = 50
+
+
+def _is_bom_file(name):
+    parts = name.split('/')
+    return (
+        os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS
+        # Hidden files and the resource forks macOS adds to archives
+        and not any(part.startswith('.') or part == '__MACOSX' for part in parts)
+    )
+
+
+class ImportSource:
+    """A directory tree or zip archive of BOM files, named by '/'-separated relative paths."""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        if os.path.isdir(self.path):
+            self.archive = None
+        elif zipfile.is_zipfile(self.path):
+            self.archive = zipfile.ZipFile(self.path)
+        else:
+            raise ValueError(f"'{path}' is neither a directory nor a zip archive.")
+
+    def names(self):
+        """The names of the BOM files in the source, sorted."""
+        if self.archive is not None:
+            names = [info.filename for info in self.archive.infolist() if not info.is_dir()]
+        else:
+            names = [
+                os.path.relpath(os.path.join(directory, file_name), self.path).replace(os.sep, '/')
+                for directory, _, file_names in os.walk(self.path)
+                for file_name in file_names
+            ]
+        return sorted(name for name in names if _is_bom_file(name))
+
+    def local_path(self, name, work_dir):
+        """A path the file can be parsed from. Archive members are extracted to work_dir."""
+        if self.archive is None:
+            return os.path.join(self.path, *name.split('/'))
+        return self.archive.extract(name, work_dir)
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+
+def iter_parsed_files(source, names, work_dir, max_workers, manufacturer_resolver=None):
+    """
+    Parses the named files of a source and yields (name, path, entries, error) as each
+    one finishes, so not necessarily in order. Files are handed to the pool a few per
+    worker at a time, so archives are extracted as the parsing progresses.
+    """
+    if max_workers <= 1:
+        for name in names:
+            path = source.local_path(name, work_dir)
+            try:
+                entries, error = parse_file(path, name, manufacturer_resolver), None
+            except (IOError, ValueError) as e:
+                entries, error = None, e
+            yield name, path, entries, error
+        return
+
+    names = iter(names)
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        running = {}
+        while True:
+            for name in itertools.islice(names, 2 * max_workers - len(running)):
+                path = source.local_path(name, work_dir)
+                running[executor.submit(parse_file, path, name, manufacturer_resolver)] = (name, path)
+            if not running:
+                return
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, path = running.pop(future)
+                try:
+                    entries, error = future.result(), None
+                except (IOError, ValueError) as e:
+                    entries, error = None, e
+                yield name, path, entries, error
+
+
+def import_batch(user, source, parsed):
+    """
+    Stores a batch of iter_parsed_files results in one transaction: a master BOMFile
+    with its entries for each file that parsed, and a checkpoint for every file.
+    Returns (entries stored, parts created, {name: error} of the failed files).
+    """
+    now = timezone.now()
+    failures = {}
+    files = []
+    try:
+        with transaction.atomic():
+            for name, path, entries, error in parsed:
+                if error is None and not entries:
+                    error = 'No valid BOM entries found.'
+                if error is not None:
+                    failures[name] = str(error)
+                    continue
+                bom_file = BOMFile(user=user, name=name[-255:], is_master=True, entries_updated_at=now)
+                with open(path, 'rb') as f:
+                    bom_file.file.save(os.path.basename(name), File(f), save=False)
+                files.append((name, bom_file, entries))
+
+            BOMFile.objects.bulk_create([bom_file for _, bom_file, _ in files])
+            rows, parts_created = bulk_ingest_files([(bom_file, entries) for _, bom_file, entries in files])
+            ImportedFile.objects.bulk_create(
+                [ImportedFile(source=source.path, name=name, bom_file=bom_file) for name, bom_file, _ in files]
+                + [ImportedFile(source=source.path, name=name, error=error) for name, error in failures.items()]
+            )
+    except Exception:
+        # Nothing of the batch was recorded, so neither should its copies be kept
+        for _, bom_file, _ in files:
+            bom_file.file.delete(save=False)
+        raise
+    return rows, parts_created, failures
+
+
+def run_import(path, user, files_per_transaction=FILES_PER_TRANSACTION, max_workers=None, retry_failed=False, log=None):
+    """
+    Imports the BOM files of a directory or zip archive as master BOMs of user, skipping
+    those an earlier run over the same source checkpointed (including failed ones, unless
+    retry_failed). Parses in up to settings.BOM_PARSE_WORKERS processes unless max_workers
+    is given. log, if given, is called with a progress line after every batch.
+    Returns a report of counts, throughput and failed files.
+    """
+    if max_workers is None:
+        max_workers = getattr(settings, 'BOM_PARSE_WORKERS', 1)
+
+    source = ImportSource(path)
+    try:
+        checkpoints = ImportedFile.objects.filter(source=source.path)
+        if retry_failed:
+            checkpoints.exclude(error='').delete()
+        done = set(checkpoints.values_list('name', flat=True))
+        names = [name for name in source.names() if name not in done]
+
+        report = {
+            'source': source.path,
+            'files': len(names),
+            'skipped': len(done),
+            'imported': 0,
+            'entries': 0,
+            'parts_created': 0,
+            'failures': {},
+        }
+        started = time.perf_counter()
+
+        with tempfile.TemporaryDirectory() as work_dir:
+            parsed = iter_parsed_files(source, names, work_dir, max_workers, get_manufacturer_resolver())
+            while batch := list(itertools.islice(parsed, files_per_transaction)):
+                rows, parts_created, failures = import_batch(user, source, batch)
+                if source.archive is not None:
+                    for _, extracted, _, _ in batch:
+                        os.remove(extracted)
+
+                report['imported'] += len(batch) - len(failures)
+                report['entries'] += rows
+                report['parts_created'] += parts_created
+                report['failures'].update(failures)
+                if log is not None:
+                    elapsed = time.perf_counter() - started
+                    processed = report['imported'] + len(report['failures'])
+                    log(
+                        f"{processed}/{len(names)} files ({len(report['failures'])} failed), "
+                        f"{report['entries']} entries, {processed / elapsed:.1f} files/s, "
+                        f"{report['entries'] / elapsed:.0f} entries/s"
+                    )
+    finally:
+        source.close()
+
+    elapsed = time.perf_counter() - started
+    report['elapsed_seconds'] = elapsed
+    report['files_per_second'] = (report['imported'] + len(report['failures'])) / elapsed if elapsed > 0 else 0.0
+    report['entries_per_second'] = report['entries'] / elapsed if elapsed > 0 else 0.0
+    return report
@@ -0,0 +1,176 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+
+from .aliases import get_manufacturer_resolver
+from .designators import canonical_designators, designator_changes
+from .instrumentation import is_enabled as instrumentation_enabled, record_span, span, timed
+from .parser_factory import get_bom_parser, parse_file, parse_file_timed
+from .parse_cache import get_cached_entries, store_entries
+from .records import BOMLine, ChangedPart, IdenticalPart, PartLine
+
+
+def iter_parsed_targets(targets, max_workers=None):
+    """
+    Parses target files given as (file_path, original_name, content_digest) tuples and
+    yields (index, entries, error) as each one finishes, so not necessarily in order.
+    error is the IOError/ValueError raised for that file, in which case entries is None.
+
+    Files already in the parse cache are served from it. The rest are parsed in a pool
+    of up to settings.BOM_PARSE_WORKERS processes, or inline when that is 1.
+    """
+    if max_workers is None:
+        max_workers = getattr(settings, 'BOM_PARSE_WORKERS', 1)
+
+    # Manufacturer names are canonicalized while parsing, so they match the master's
+    manufacturer_resolver = get_manufacturer_resolver()
+    pending = []
+    for index, (file_path, original_name, content_digest) in enumerate(targets):
+        try:
+            parser = get_bom_parser(file_path, original_name, manufacturer_resolver)
+        except ValueError as e:
+            yield index, None, e
+            continue
+
+        # Identical uploads (same bytes, same parser version) skip parsing entirely
+        entries = get_cached_entries(parser, content_digest)
+        if entries is not None:
+            yield index, entries, None
+        else:
+            pending.append((index, parser, file_path, original_name, content_digest))
+
+    if max_workers <= 1 or len(pending) <= 1:
+        for index, parser, file_path, _, content_digest in pending:
+            if hasattr(parser, 'page_workers'):
+                # Not nested inside the file pool, so the parser may use its own workers
+                parser.page_workers = getattr(settings, 'BOM_PDF_PAGE_WORKERS', 1)
+            try:
+                with span('parse'):
+                    entries = parser.parse(file_path)
+            except (IOError, ValueError) as e:
+                yield index, None, e
+                continue
+            store_entries(parser, content_digest, entries)
+            yield index, entries, None
+        return
+
+    # The parsers are CPU-bound pure Python, so threads wouldn't help. 'spawn' keeps the
+    # workers independent of the (possibly multi-threaded) web process state.
+    with ProcessPoolExecutor(
+        max_workers=min(max_workers, len(pending)),
+        mp_context=multiprocessing.get_context('spawn'),
+    ) as executor:
+        # Spans recorded in the workers would be lost, so they report their parse time back
+        timed_workers = instrumentation_enabled()
+        futures = {
+            executor.submit(parse_file_timed if timed_workers else parse_file, file_path, original_name, manufacturer_resolver): (index, parser, content_digest)
+            for index, parser, file_path, original_name, content_digest in pending
+        }
+        for future in as_completed(futures):
+            index, parser, content_digest = futures[future]
+            try:
+                entries = future.result()
+            except (IOError, ValueError) as e:
+                yield index, None, e
+                continue
+            if timed_workers:
+                entries, seconds = entries
+                record_span('parse', seconds)
+            store_entries(parser, content_digest, entries)
+            yield index, entries, None
+
+
+def build_parts_map(bom_entries):
+    """
+    Maps (mpn, manufacturer) to a PartLine of the quantity and designators of a BOM's
+    entries, along with the canonical designator set parts are compared on (see
+    designators.py).
+    """
+    parts_map = {}
+    for mpn, manufacturer, quantity, designators in bom_entries:
+        parts_map[(mpn, manufacturer)] = PartLine(quantity, designators, canonical_designators(designators))
+    return parts_map
+
+
+def _changed_part(mpn, manufacturer, master_quantity, target_quantity, master_designators, target_designators,
+                  master_designator_set, target_designator_set):
+    added, removed = designator_changes(master_designator_set, target_designator_set)
+    return ChangedPart(
+        mpn, manufacturer, master_quantity, target_quantity, master_designators, target_designators, added, removed,
+    )
+
+
+def lines_by_key(bom_entries):
+    """
+    Maps (mpn, manufacturer) to a BOM's BOMLines, the target side of a comparison.
+    Unlike build_parts_map no canonical designators are computed up front: they are only
+    needed for parts the master has too, and only when the designator text differs.
+    """
+    return {(line.mpn, line.manufacturer): line for line in bom_entries}
+
+
+@timed('comparison')
+def perform_comparison(master_bom_entries, target_bom_entries):
+    """
+    Compares two BOMs and returns categorized differences along with summary counts.
+    Matching parts are IdenticalParts and ChangedParts; added and removed parts are BOMLines.
+    """
+    return compare_parts_maps(build_parts_map(master_bom_entries), lines_by_key(target_bom_entries))
+
+
+def compare_parts_maps(master_parts_map, target_lines):
+    """
+    perform_comparison for a master already turned into a parts map by build_parts_map,
+    and a target turned into a map by lines_by_key.
+    """
+    matching_parts = []
+    added_parts = []
+    removed_parts = []
+
+    perfectly_matching_count = 0
+    partially_matching_count = 0
+    totally_different_count = 0 # This will be sum of added_parts + removed_parts
+
+    # Check for matching and removed parts
+    for master_key, master_data in master_parts_map.items():
+        if master_key in target_lines:
+            target_data = target_lines[master_key]
+            # Designators are compared as sets: 'C3 C1' and 'C1 C3', or 'R1-R4' and
+            # 'R1 R2 R3 R4', have the same canonical string
+            if master_data.quantity == target_data.quantity and (
+                master_data.designators == target_data.designators
+                or master_data.designator_set == canonical_designators(target_data.designators)
+            ):
+                perfectly_matching_count += 1
+                matching_parts.append(IdenticalPart(
+                    master_key[0], master_key[1], master_data.quantity, master_data.designators,
+                ))
+            else:
+                partially_matching_count += 1
+                matching_parts.append(_changed_part(
+                    master_key[0], master_key[1],
+                    master_data.quantity, target_data.quantity,
+                    master_data.designators, target_data.designators,
+                    master_data.designator_set, canonical_designators(target_data.designators),
+                ))
+        else:
+            totally_different_count += 1 # Part removed from master
+            removed_parts.append(BOMLine(master_key[0], master_key[1], master_data.quantity, master_data.designators))
+    
+    # Check for added parts
+    for target_key, target_data in target_lines.items():
+        if target_key not in master_parts_map:
+            totally_different_count += 1 # Part added to target
+            added_parts.append(target_data)
+    
+    return {
+        'matching_parts': matching_parts,
+        'added_parts': added_parts,
+        'removed_parts': removed_parts,
+        'summary': {
+            'perfectly_matching': perfectly_matching_count,
+            'partially_matching': partially_matching_count,
+            'totally_different': totally_different_count,
+        }
+    }
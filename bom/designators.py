@@ -0,0 +1,83 @@
+import re
+from functools import lru_cache
+
+# Largest range expanded ('R1-R10000'); anything wider is kept as a literal token
+MAX_RANGE_SIZE = 10000
+
+_SEPARATORS = re.compile(r'[\s,;]+')
+_RANGE_DASHES = re.compile(r'\s*[-–]\s*')
+_RANGE = re.compile(r'^([A-Z]+)([1-9]\d*|0)-(?:\1)?([1-9]\d*|0)$')
+_NUMBERED = re.compile(r'^([A-Z]+)([1-9]\d*|0)$')
+
+
+def parse_designators(text):
+    """
+    Returns the set of reference designators in a designator string, e.g.
+    'R1-R3, c7 R2' -> {'R1', 'R2', 'R3', 'C7'}. Ranges ('R1-R3', 'R1-3') are expanded
+    and designators are uppercased; tokens that aren't designators are kept as they are.
+    """
+    designators = set()
+    for token in _SEPARATORS.split(_RANGE_DASHES.sub('-', str(text).upper().strip())):
+        if not token:
+            continue
+        match = _RANGE.match(token)
+        if match:
+            prefix, start, end = match.group(1), int(match.group(2)), int(match.group(3))
+            if start <= end and end - start < MAX_RANGE_SIZE:
+                designators.update(f'{prefix}{number}' for number in range(start, end + 1))
+                continue
+        designators.add(token)
+    return designators
+
+
+def _sort_key(designator):
+    match = _NUMBERED.match(designator)
+    if match:
+        return (match.group(1), 0, int(match.group(2)))
+    return (designator, 1, 0)
+
+
+def compress_designators(designators):
+    """
+    Canonical string of a designator set: naturally sorted, runs of three or more
+    consecutive numbers written as ranges, e.g. {'R3', 'R1', 'R2', 'C7'} -> 'C7 R1-R3'.
+    """
+    tokens = []
+    run = []  # [prefix, first, last] of the current run of numbered designators
+
+    def flush():
+        if run:
+            prefix, first, last = run
+            if last - first >= 2:
+                tokens.append(f'{prefix}{first}-{prefix}{last}')
+            else:
+                tokens.extend(f'{prefix}{number}' for number in range(first, last + 1))
+            run.clear()
+
+    for designator in sorted(designators, key=_sort_key):
+        match = _NUMBERED.match(designator)
+        if match is None:
+            flush()
+            tokens.append(designator)
+            continue
+        prefix, number = match.group(1), int(match.group(2))
+        if run and run[0] == prefix and run[2] + 1 == number:
+            run[2] = number
+        else:
+            flush()
+            run.extend((prefix, number, number))
+    flush()
+    return ' '.join(tokens)
+
+
+@lru_cache(maxsize=65536)
+def canonical_designators(text):
+    """compress_designators(parse_designators(text)): equal for equal designator sets."""
+    return compress_designators(parse_designators(text))
+
+
+def designator_changes(master_canonical, target_canonical):
+    """(added, removed) designators between two canonical strings, each as a canonical string."""
+    master = parse_designators(master_canonical)
+    target = parse_designators(target_canonical)
+    return compress_designators(target - master), compress_designators(master - target)
@@ -1,17 +1,30 @@
 from django import forms
 from .models import BOMFile
+from .aliases import get_manufacturer_resolver
+from .instrumentation import span
+from .parsers import XLSXParser
 import os
-import openpyxl
 
 class BOMUploadForm(forms.ModelForm):
+    parsed_entries = None
+
     class Meta:
         model = BOMFile
-        fields = ['name', 'file']
+        fields = ['name', 'file', 'previous_revision']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control'}),
             'file': forms.FileInput(attrs={'class': 'form-control', 'accept': '.xlsx'}),
+            'previous_revision': forms.Select(attrs={'class': 'form-select'}),
         }
 
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # A new revision can only follow one of the user's own master BOMs
+        self.fields['previous_revision'].queryset = BOMFile.objects.filter(
+            user=user, is_master=True,
+        ).order_by('-uploaded_at')
+        self.fields['previous_revision'].empty_label = 'None (new master BOM)'
+
     def clean_file(self):
         file = self.cleaned_data.get('file', False)
         if not file:
@@ -22,42 +35,34 @@ class BOMUploadForm(forms.ModelForm):
         if not ext.lower() == '.xlsx':
             raise forms.ValidationError('Only .xlsx files are allowed.')
 
-        required_columns = [
-            'Reference designators', 
-            'Quantity', 
-            'Identified MPN', 
-            'Identified manufacturer'
-        ]
+        parser = XLSXParser()
+        parser.manufacturer_resolver = get_manufacturer_resolver()
 
         try:
-            # Use a temporary in-memory file to avoid saving before validation
+            # Stream the in-memory upload once; the parsed entries are kept on the
+            # form so the view can ingest them without opening the workbook again.
             file.seek(0)
-            workbook = openpyxl.load_workbook(file)
-            sheet = workbook.active
+            rows = parser.iter_rows(file)
+            headers = next(rows, None)
             
             # Check if sheet is empty
-            if sheet.max_row < 1:
+            if headers is None:
                 raise forms.ValidationError("The uploaded file is empty.")
 
-            headers = [cell.value for cell in sheet[1]]
-            
-            missing_columns = [col for col in required_columns if col not in headers]
+            headers = list(headers)
+            missing_columns = [col for col in parser.required_columns if col not in headers]
 
             if missing_columns:
                 # User-specified error message for missing columns
                 raise forms.ValidationError(
-                    f"The file does not have one of the required columns ({', '.join(required_columns)})."
+                    f"The file does not have one of the required columns ({', '.join(parser.required_columns)})."
                 )
             
             # 3. Check for at least one data row
-            has_data_row = False
-            for row_index in range(2, sheet.max_row + 1):
-                row_data = [cell.value for cell in sheet[row_index]]
-                if any(cell is not None for cell in row_data): # Check if row is not entirely empty
-                    has_data_row = True
-                    break
+            with span('parse'):
+                self.parsed_entries = parser._extract_bom_data(headers, rows)
             
-            if not has_data_row:
+            if not self.parsed_entries:
                 raise forms.ValidationError("The uploaded file contains no valid BOM entries after the header row.")
 
         except forms.ValidationError as e:
@@ -0,0 +1,255 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .designators import canonical_designators
+from .instrumentation import span, timed
+from .master_index import build_master_index, invalidate_master_index
+from .models import BOMEntry, BOMEntryDelta, Part, PartUsage
+from .queries import bom_entry_rows
+from .where_used import part_usages, refresh_part_usage, store_part_usage
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT / per key lookup. Kept well below SQLite's bound-parameter limit.
+INGEST_BATCH_SIZE = 500
+
+
+def _chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _resolve_parts(keys, batch_size):
+    """
+    Returns a dict mapping (mpn, manufacturer) -> Part id for every key,
+    creating the parts that don't exist yet.
+    """
+    part_ids = {}
+    mpns = sorted({mpn for mpn, _ in keys})
+    for mpn_batch in _chunked(mpns, batch_size):
+        for part_id, mpn, manufacturer in Part.objects.filter(mpn__in=mpn_batch).values_list('id', 'mpn', 'manufacturer'):
+            if (mpn, manufacturer) in keys:
+                part_ids[(mpn, manufacturer)] = part_id
+
+    missing = [key for key in keys if key not in part_ids]
+    if missing:
+        Part.objects.bulk_create(
+            [Part(mpn=mpn, manufacturer=manufacturer).set_keys() for mpn, manufacturer in missing],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        # ignore_conflicts=True doesn't populate primary keys, so read them back.
+        missing_mpns = sorted({mpn for mpn, _ in missing})
+        for mpn_batch in _chunked(missing_mpns, batch_size):
+            for part_id, mpn, manufacturer in Part.objects.filter(mpn__in=mpn_batch).values_list('id', 'mpn', 'manufacturer'):
+                if (mpn, manufacturer) in keys:
+                    part_ids[(mpn, manufacturer)] = part_id
+    return part_ids, len(missing)
+
+
+def _entry_rows(entries):
+    return [
+        (str(mpn), str(manufacturer), quantity, designators)
+        for mpn, manufacturer, quantity, designators in entries
+    ]
+
+
+def _store_full(bom_file_instance, rows, batch_size):
+    """Stores rows as the BOMEntry rows of a file. Returns the number of parts created."""
+    keys = {(mpn, manufacturer) for mpn, manufacturer, _, _ in rows}
+    part_ids, parts_created = _resolve_parts(keys, batch_size)
+    BOMEntry.objects.bulk_create(
+        [
+            BOMEntry(
+                bom_file=bom_file_instance,
+                part_id=part_ids[(mpn, manufacturer)],
+                quantity=quantity,
+                reference_designators=designators,
+                designator_set=canonical_designators(designators),
+            )
+            for mpn, manufacturer, quantity, designators in rows
+        ],
+        batch_size=batch_size,
+    )
+    store_part_usage(bom_file_instance.pk, ((part_ids[(mpn, manufacturer)], quantity) for mpn, manufacturer, quantity, _ in rows))
+    return parts_created
+
+
+def _ingestion_stats(bom_file_instance, rows, parts_created, started, stored_rows):
+    elapsed = time.perf_counter() - started
+    stats = {
+        'rows': len(rows),
+        'stored_rows': stored_rows,
+        'parts_created': parts_created,
+        'elapsed_seconds': elapsed,
+        'rows_per_second': len(rows) / elapsed if elapsed > 0 else float(len(rows)),
+    }
+    logger.info(
+        "Ingested %d BOM entries into '%s' as %d stored rows (%d new parts) in %.3fs (%.0f rows/s)",
+        stats['rows'], bom_file_instance.name, stored_rows, parts_created, elapsed, stats['rows_per_second'],
+    )
+    return stats
+
+
+@timed('ingestion')
+def bulk_ingest_entries(bom_file_instance, entries, batch_size=INGEST_BATCH_SIZE):
+    """
+    Saves parsed BOM entries (records.BOMLine or (mpn, manufacturer, quantity,
+    designators) tuples) for a BOMFile using batched queries inside one transaction.
+    Returns a dict of ingestion statistics.
+    """
+    started = time.perf_counter()
+    rows = _entry_rows(entries)
+
+    with transaction.atomic():
+        parts_created = _store_full(bom_file_instance, rows, batch_size)
+        # bulk_create doesn't send signals, so refresh the comparison index explicitly
+        invalidate_master_index([bom_file_instance.pk])
+        build_master_index(bom_file_instance)
+
+    return _ingestion_stats(bom_file_instance, rows, parts_created, started, len(rows))
+
+
+@timed('ingestion')
+def bulk_ingest_files(files, batch_size=INGEST_BATCH_SIZE):
+    """
+    bulk_ingest_entries for many (bom_file, entries) pairs in one go: the parts of all
+    files are resolved together and their entries inserted in shared batches. Master
+    indexes are left to be built on first use. Returns (rows, parts created).
+    """
+    rows_by_file = [(bom_file, _entry_rows(entries)) for bom_file, entries in files]
+    keys = {(mpn, manufacturer) for _, rows in rows_by_file for mpn, manufacturer, _, _ in rows}
+
+    with transaction.atomic():
+        part_ids, parts_created = _resolve_parts(keys, batch_size)
+        BOMEntry.objects.bulk_create(
+            [
+                BOMEntry(
+                    bom_file=bom_file,
+                    part_id=part_ids[(mpn, manufacturer)],
+                    quantity=quantity,
+                    reference_designators=designators,
+                    designator_set=canonical_designators(designators),
+                )
+                for bom_file, rows in rows_by_file
+                for mpn, manufacturer, quantity, designators in rows
+            ],
+            batch_size=batch_size,
+        )
+        PartUsage.objects.bulk_create(
+            [
+                usage
+                for bom_file, rows in rows_by_file
+                for usage in part_usages(bom_file.pk, ((part_ids[(mpn, manufacturer)], quantity) for mpn, manufacturer, quantity, _ in rows))
+            ],
+            batch_size=batch_size,
+        )
+    return sum(len(rows) for _, rows in rows_by_file), parts_created
+
+
+def _revision_delta(previous_rows, rows):
+    """
+    Returns the (op, mpn, manufacturer, quantity, designators) deltas turning previous_rows
+    into rows, or None when either side repeats an (mpn, manufacturer) key, which a delta
+    keyed on parts can't represent.
+    """
+    previous = {(mpn, manufacturer): (quantity, designators) for mpn, manufacturer, quantity, designators in previous_rows}
+    current = {(mpn, manufacturer): (quantity, designators) for mpn, manufacturer, quantity, designators in rows}
+    if len(previous) != len(previous_rows) or len(current) != len(rows):
+        return None
+
+    deltas = [(BOMEntryDelta.OP_REMOVE, mpn, manufacturer, None, '') for mpn, manufacturer in previous.keys() - current.keys()]
+    for key, value in current.items():
+        if key not in previous:
+            deltas.append((BOMEntryDelta.OP_ADD,) + key + value)
+        elif previous[key] != value:
+            deltas.append((BOMEntryDelta.OP_CHANGE,) + key + value)
+    return deltas
+
+
+def ingest_revision(bom_file_instance, entries, batch_size=INGEST_BATCH_SIZE):
+    """
+    Saves parsed entries for a BOMFile that may be a new revision of another one.
+    A revision is stored as the lines that differ from its predecessor, unless the chain
+    of deltas behind it has reached settings.BOM_REVISION_MAX_DELTAS or the delta isn't
+    smaller than settings.BOM_REVISION_MAX_DELTA_RATIO of the file; then it is stored in
+    full, which also bounds the cost of materializing it.
+    """
+    previous = bom_file_instance.previous_revision
+    if previous is None:
+        return bulk_ingest_entries(bom_file_instance, entries, batch_size)
+    with span('ingestion'):
+        return _ingest_delta_revision(bom_file_instance, previous, entries, batch_size)
+
+
+def _ingest_delta_revision(bom_file_instance, previous, entries, batch_size):
+    started = time.perf_counter()
+    rows = _entry_rows(entries)
+    bom_file_instance.revision = previous.revision + 1
+
+    deltas = None
+    if previous.delta_depth < getattr(settings, 'BOM_REVISION_MAX_DELTAS', 10):
+        deltas = _revision_delta(list(bom_entry_rows(previous)), rows)
+        if deltas is not None and len(deltas) > len(rows) * getattr(settings, 'BOM_REVISION_MAX_DELTA_RATIO', 0.5):
+            deltas = None
+
+    with transaction.atomic():
+        if deltas is None:
+            bom_file_instance.delta_depth = 0
+            bom_file_instance.save(update_fields=['revision', 'delta_depth'])
+            parts_created = _store_full(bom_file_instance, rows, batch_size)
+            stored_rows = len(rows)
+        else:
+            bom_file_instance.delta_depth = previous.delta_depth + 1
+            bom_file_instance.save(update_fields=['revision', 'delta_depth'])
+            part_ids, parts_created = _resolve_parts({(mpn, manufacturer) for _, mpn, manufacturer, _, _ in deltas}, batch_size)
+            BOMEntryDelta.objects.bulk_create(
+                [
+                    BOMEntryDelta(
+                        bom_file=bom_file_instance,
+                        op=op,
+                        part_id=part_ids[(mpn, manufacturer)],
+                        quantity=quantity,
+                        reference_designators=designators,
+                        designator_set=canonical_designators(designators),
+                    )
+                    for op, mpn, manufacturer, quantity, designators in deltas
+                ],
+                batch_size=batch_size,
+            )
+            stored_rows = len(deltas)
+            refresh_part_usage([bom_file_instance])
+        invalidate_master_index([bom_file_instance.pk])
+        build_master_index(bom_file_instance)
+
+    return _ingestion_stats(bom_file_instance, rows, parts_created, started, stored_rows)
+
+
+def _renumber_delta_depths(bom_file):
+    """Recomputes delta_depth of the revisions stored as deltas on top of bom_file."""
+    pending = [bom_file]
+    while pending:
+        parent = pending.pop()
+        for child in parent.next_revisions.filter(delta_depth__gt=0):
+            child.delta_depth = parent.delta_depth + 1
+            child.save(update_fields=['delta_depth'])
+            pending.append(child)
+
+
+@transaction.atomic
+def compact_revision(bom_file, batch_size=INGEST_BATCH_SIZE):
+    """
+    Stores a revision kept as deltas in full, so it no longer depends on its predecessors.
+    Its entries, and therefore its index and later revisions, are unchanged.
+    """
+    if not bom_file.delta_depth:
+        return
+    rows = list(bom_entry_rows(bom_file))
+    _store_full(bom_file, rows, batch_size)
+    bom_file.entry_deltas.all().delete()
+    bom_file.delta_depth = 0
+    bom_file.save(update_fields=['delta_depth'])
+    _renumber_delta_depths(bom_file)
@@ -0,0 +1,178 @@
+import contextlib
+import contextvars
+import cProfile
+import functools
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Spans of the request being handled, or None outside an instrumented request
+_request_spans = contextvars.ContextVar('bom_request_spans', default=None)
+
+# Process-wide aggregates, reported by metrics()
+_metrics_lock = threading.Lock()
+_spans = {}
+_requests = {'count': 0, 'seconds': 0.0, 'sql_queries': 0, 'sql_seconds': 0.0, 'profiled': 0}
+
+
+def is_enabled():
+    return getattr(settings, 'BOM_INSTRUMENTATION', False)
+
+
+def record_span(name, seconds):
+    """Adds a measured duration to the current request and to the process-wide metrics."""
+    request_spans = _request_spans.get()
+    if request_spans is not None:
+        request_spans[name] = request_spans.get(name, 0.0) + seconds
+    with _metrics_lock:
+        span = _spans.setdefault(name, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+        span['count'] += 1
+        span['seconds'] += seconds
+        span['max_seconds'] = max(span['max_seconds'], seconds)
+
+
+@contextlib.contextmanager
+def _timed_span(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - started)
+
+
+_disabled_span = contextlib.nullcontext()
+
+
+def span(name):
+    """
+    Context manager timing its block as the named span. When instrumentation is
+    disabled it is a shared no-op context, so instrumented code pays one settings lookup.
+    """
+    if not is_enabled():
+        return _disabled_span
+    return _timed_span(name)
+
+
+def timed(name):
+    """Decorator timing every call of a function as the named span."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not is_enabled():
+                return func(*args, **kwargs)
+            with _timed_span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def metrics():
+    """JSON-serializable snapshot of the process-wide metrics."""
+    with _metrics_lock:
+        return {
+            'enabled': is_enabled(),
+            'pid': os.getpid(),
+            'requests': dict(_requests),
+            'spans': {name: dict(values) for name, values in _spans.items()},
+        }
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _spans.clear()
+        _requests.update(count=0, seconds=0.0, sql_queries=0, sql_seconds=0.0, profiled=0)
+
+
+class ProfilingMiddleware:
+    """
+    Times each request with its SQL queries and the spans recorded while handling it
+    (parsing, comparison, ingestion, session save), logs one line per request and adds a
+    Server-Timing header. With settings.BOM_PROFILE_THRESHOLD_MS set, requests are also
+    run under cProfile and the profile of those slower than the threshold is dumped to
+    settings.BOM_PROFILE_DIR.
+
+    Removed from the middleware chain at startup unless settings.BOM_INSTRUMENTATION is on.
+    """
+    def __init__(self, get_response):
+        if not is_enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.profile_threshold = getattr(settings, 'BOM_PROFILE_THRESHOLD_MS', None)
+
+    def __call__(self, request):
+        request_spans = {}
+        token = _request_spans.set(request_spans)
+        sql = {'queries': 0, 'seconds': 0.0}
+
+        def count_query(execute, sql_text, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql_text, params, many, context)
+            finally:
+                sql['queries'] += 1
+                sql['seconds'] += time.perf_counter() - started
+
+        profiler = cProfile.Profile() if self.profile_threshold is not None else None
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(count_query):
+                if profiler is not None:
+                    profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+        finally:
+            _request_spans.reset(token)
+        elapsed = time.perf_counter() - started
+
+        profile_path = None
+        if profiler is not None and elapsed * 1000 >= self.profile_threshold:
+            profile_path = self._dump_profile(profiler, request)
+
+        with _metrics_lock:
+            _requests['count'] += 1
+            _requests['seconds'] += elapsed
+            _requests['sql_queries'] += sql['queries']
+            _requests['sql_seconds'] += sql['seconds']
+            _requests['profiled'] += profile_path is not None
+
+        timings = [('total', elapsed), ('sql', sql['seconds'])] + sorted(request_spans.items())
+        response['Server-Timing'] = ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings)
+        logger.info(
+            "%s %s %s %.1fms sql=%d/%.1fms%s%s",
+            request.method, request.path, response.status_code, elapsed * 1000, sql['queries'], sql['seconds'] * 1000,
+            ''.join(f' {name}={seconds * 1000:.1f}ms' for name, seconds in sorted(request_spans.items())),
+            f' profile={profile_path}' if profile_path else '',
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # The session is saved by SessionMiddleware on the way out; time that write too
+        session = getattr(request, 'session', None)
+        if session is not None and 'save' not in vars(session):
+            save = session.save
+
+            def timed_save(*args, **kwargs):
+                with _timed_span('session_save'):
+                    return save(*args, **kwargs)
+            session.save = timed_save
+        return None
+
+    def _dump_profile(self, profiler, request):
+        profile_dir = getattr(settings, 'BOM_PROFILE_DIR', None)
+        if not profile_dir:
+            return None
+        os.makedirs(profile_dir, exist_ok=True)
+        slug = request.path.strip('/').replace('/', '_') or 'root'
+        path = os.path.join(profile_dir, f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-{slug}.prof')
+        profiler.dump_stats(path)
+        return path
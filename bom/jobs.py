@@ -0,0 +1,236 @@
+import hashlib
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .comparison import compare_parts_maps, iter_parsed_targets, lines_by_key
+from .instrumentation import span
+from .master_index import get_master_parts_map
+from .ingestion import INGEST_BATCH_SIZE
+from .models import ComparisonJob, ComparisonJobFile, ComparisonResult, ComparisonResultRow
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_comparison(user, master_bom, uploaded_files):
+    """
+    Stores the uploaded target files and queues a comparison job for them.
+    The job is picked up by a worker thread or `manage.py run_comparison_worker`,
+    depending on settings.BOM_COMPARISON_WORKER.
+    """
+    with transaction.atomic():
+        job = ComparisonJob.objects.create(user=user, master_bom=master_bom)
+        for position, uploaded_file in enumerate(uploaded_files):
+            content_hash = hashlib.sha256()
+            for chunk in uploaded_file.chunks():
+                content_hash.update(chunk)
+            job_file = ComparisonJobFile(
+                job=job,
+                position=position,
+                original_name=uploaded_file.name,
+                content_hash=content_hash.hexdigest(),
+            )
+            job_file.file.save(uploaded_file.name, uploaded_file, save=False)
+            job_file.save()
+
+        if getattr(settings, 'BOM_COMPARISON_WORKER', 'thread') == 'thread':
+            transaction.on_commit(start_worker_thread)
+    return job
+
+
+def _claimable_jobs():
+    """Pending jobs, and running jobs whose worker hasn't been heard from for BOM_JOB_STALE_TIMEOUT seconds."""
+    stale_before = timezone.now() - timedelta(seconds=getattr(settings, 'BOM_JOB_STALE_TIMEOUT', 1800))
+    return ComparisonJob.objects.filter(
+        Q(status=ComparisonJob.STATUS_PENDING)
+        | Q(status=ComparisonJob.STATUS_RUNNING, heartbeat_at__lt=stale_before)
+        | Q(status=ComparisonJob.STATUS_RUNNING, heartbeat_at__isnull=True, started_at__lt=stale_before)
+    )
+
+
+def claim_next_job():
+    """
+    Atomically moves the oldest pending job to running. A job left running by a worker
+    that died (see _claimable_jobs) is claimed again. Returns None when the queue is empty.
+    """
+    while True:
+        job = _claimable_jobs().order_by('created_at', 'pk').first()
+        if job is None:
+            return None
+        now = timezone.now()
+        # Only if no other worker claimed it, or touched it, since it was read
+        claimed = ComparisonJob.objects.filter(pk=job.pk, status=job.status, heartbeat_at=job.heartbeat_at).update(
+            status=ComparisonJob.STATUS_RUNNING,
+            started_at=now,
+            heartbeat_at=now,
+        )
+        if claimed:
+            if job.status == ComparisonJob.STATUS_RUNNING:
+                logger.warning("Comparison job %s was left running by a worker that stopped; running it again", job.pk)
+            job.refresh_from_db()
+            return job
+        # Another worker got there first, try the next one
+
+
+def run_job(job):
+    """
+    Parses and compares every file of a claimed job, recording per-file progress.
+    Results are stored with their upload position, so they read back in upload order
+    even when files are parsed in parallel.
+    """
+    # Files a previous run of the job got through keep their results
+    job_files = [
+        job_file for job_file in job.files.all()
+        if job_file.status not in (ComparisonJob.STATUS_DONE, ComparisonJob.STATUS_FAILED)
+    ]
+
+    try:
+        # The master's index is built at ingestion and reused for every target of the job
+        master_parts_map = get_master_parts_map(job.master_bom)
+
+        job.results.filter(position__in=[job_file.position for job_file in job_files]).delete()
+        job.files.filter(pk__in=[job_file.pk for job_file in job_files]).update(status=ComparisonJob.STATUS_RUNNING)
+        targets = [
+            (job_file.file.path, job_file.original_name, job_file.content_hash)
+            for job_file in job_files
+        ]
+        for index, target_parsed_data, error in iter_parsed_targets(targets):
+            job_file = job_files[index]
+            if error is not None:
+                job_file.error = f"Error parsing '{job_file.original_name}': {error}"
+                job_file.status = ComparisonJob.STATUS_FAILED
+            elif not target_parsed_data:
+                job_file.error = f"No valid BOM entries found in '{job_file.original_name}'."
+                job_file.status = ComparisonJob.STATUS_DONE
+            else:
+                with span('comparison'):
+                    comparison_result = compare_parts_maps(master_parts_map, lines_by_key(target_parsed_data))
+                save_comparison_result(job, job_file.position, job_file.original_name, comparison_result)
+                job_file.status = ComparisonJob.STATUS_DONE
+
+            # The upload is only needed until it has been parsed
+            job_file.file.delete(save=False)
+            job_file.save(update_fields=['status', 'error', 'file'])
+            ComparisonJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now())
+
+        job.status = ComparisonJob.STATUS_DONE
+    except Exception as e:
+        logger.exception("Comparison job %s failed", job.pk)
+        job.error = str(e)
+        job.status = ComparisonJob.STATUS_FAILED
+        # Files not yet compared won't be
+        for job_file in job_files:
+            if job_file.file:
+                job_file.file.delete(save=False)
+                job_file.status = ComparisonJob.STATUS_FAILED
+                job_file.save(update_fields=['status', 'file'])
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    return job
+
+
+@transaction.atomic
+def save_comparison_result(job, position, target_file_name, comparison_result):
+    """Stores the output of perform_comparison for one target file."""
+    summary = comparison_result['summary']
+    result = ComparisonResult.objects.create(
+        job=job,
+        position=position,
+        target_file_name=target_file_name,
+        perfectly_matching=summary['perfectly_matching'],
+        partially_matching=summary['partially_matching'],
+        added=len(comparison_result['added_parts']),
+        removed=len(comparison_result['removed_parts']),
+    )
+
+    rows = []
+    for part in comparison_result['matching_parts']:
+        rows.append(ComparisonResultRow(
+            result=result,
+            category=ComparisonResultRow.CATEGORY_MATCHING,
+            status=part.status,
+            mpn=part.mpn,
+            manufacturer=part.manufacturer,
+            master_quantity=part.master_quantity,
+            target_quantity=part.target_quantity,
+            master_designators=part.master_designators,
+            target_designators=part.target_designators,
+            added_designators=part.added_designators,
+            removed_designators=part.removed_designators,
+        ))
+    for part in comparison_result['added_parts']:
+        rows.append(ComparisonResultRow(
+            result=result,
+            category=ComparisonResultRow.CATEGORY_ADDED,
+            mpn=part.mpn,
+            manufacturer=part.manufacturer,
+            target_quantity=part.quantity,
+            target_designators=part.designators,
+        ))
+    for part in comparison_result['removed_parts']:
+        rows.append(ComparisonResultRow(
+            result=result,
+            category=ComparisonResultRow.CATEGORY_REMOVED,
+            mpn=part.mpn,
+            manufacturer=part.manufacturer,
+            master_quantity=part.quantity,
+            master_designators=part.designators,
+        ))
+    ComparisonResultRow.objects.bulk_create(rows, batch_size=INGEST_BATCH_SIZE)
+    return result
+
+
+def run_pending_jobs():
+    """Runs queued jobs until the queue is empty. Returns the number of jobs processed."""
+    processed = 0
+    while True:
+        job = claim_next_job()
+        if job is None:
+            return processed
+        run_job(job)
+        processed += 1
+
+
+def _worker_thread_main():
+    try:
+        run_pending_jobs()
+    finally:
+        # Each thread gets its own connection; don't leak it
+        connection.close()
+
+
+def start_worker_thread():
+    """Drains the job queue in a background thread of the current process."""
+    thread = threading.Thread(target=_worker_thread_main, name='bom-comparison-worker', daemon=True)
+    thread.start()
+    return thread
+
+
+def job_progress(job, job_files=None):
+    """JSON-serializable progress report for a job, given its files if they are already loaded."""
+    if job_files is None:
+        job_files = job.files.all()
+    files = [
+        {
+            'name': job_file.original_name,
+            'status': job_file.status,
+            'error': job_file.error,
+            'size': job_file.size,
+            'received': job_file.received,
+        }
+        for job_file in job_files
+    ]
+    return {
+        'id': job.pk,
+        'status': job.status,
+        'error': job.error,
+        'total': len(files),
+        'completed': sum(1 for f in files if f['status'] in (ComparisonJob.STATUS_DONE, ComparisonJob.STATUS_FAILED)),
+        'files': files,
+    }
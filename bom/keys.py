@@ -0,0 +1,33 @@
+import re
+
+# Legal-form suffixes that don't distinguish one manufacturer from another
+MANUFACTURER_SUFFIXES = frozenset({
+    'AB', 'AG', 'BV', 'CO', 'CORP', 'CORPORATION', 'GMBH', 'INC', 'INCORPORATED',
+    'LLC', 'LTD', 'LIMITED', 'PLC', 'SA',
+})
+
+_PUNCTUATION = re.compile(r'[^\w&]+')
+
+
+def normalize_mpn(mpn):
+    """Lookup key of a part number: uppercased, without whitespace."""
+    return ''.join(str(mpn).upper().split())
+
+
+def normalize_manufacturer(manufacturer):
+    """
+    Lookup key of a manufacturer name: uppercased words without punctuation or
+    trailing legal-form suffixes, e.g. 'Texas Instruments, Inc.' -> 'TEXAS INSTRUMENTS'.
+    """
+    words = _PUNCTUATION.sub(' ', str(manufacturer).upper()).split()
+    while len(words) > 1 and words[-1] in MANUFACTURER_SUFFIXES:
+        words.pop()
+    return ' '.join(words)
+
+
+def prefix_range(field, prefix):
+    """
+    Filter kwargs matching values of field that start with prefix, written as a range
+    so any database can answer it from an index on the field.
+    """
+    return {f'{field}__gte': prefix, f'{field}__lt': prefix + '\U0010ffff'}
@@ -0,0 +1,64 @@
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from bom.benchmarks import FORMATS, run_benchmarks
+from bom.models import BOMFile
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks BOM parsing, ingestion, get_bom_data and comparison on synthetic BOMs and '
+        'prints the measurements as JSON. Runs against a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000], help='BOM line counts to benchmark.')
+        parser.add_argument('--formats', nargs='+', choices=FORMATS, default=list(FORMATS), help='File formats to parse.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic BOM generator.')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout.')
+        parser.add_argument('--no-memory', action='store_true', help="Don't trace peak memory (tracing slows Python code down).")
+
+    def handle(self, *args, **options):
+        if any(size < 1 for size in options['sizes']):
+            raise CommandError('Sizes must be positive.')
+
+        def log(measurement):
+            self.stderr.write(f"{measurement['name']:<28} {measurement['rows']:>8} rows  {measurement['seconds']:>9.3f}s  {measurement['queries']:>6} queries")
+
+        setup_test_environment()
+        old_database_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as work_dir, override_settings(MEDIA_ROOT=work_dir):
+                user = User.objects.create_user(username='benchmark')
+                client = Client()
+                client.force_login(user)
+
+                def make_bom_file(path):
+                    return BOMFile.objects.create(user=user, name=os.path.basename(path), file=os.path.relpath(path, work_dir), is_master=True)
+
+                def get_bom_data(bom_file):
+                    response = client.get(reverse('get_bom_data', args=[bom_file.pk]))
+                    return b''.join(response.streaming_content)
+
+                report = run_benchmarks(
+                    options['sizes'], options['formats'], work_dir, make_bom_file, get_bom_data,
+                    seed=options['seed'], trace_memory=not options['no_memory'], log=log,
+                )
+        finally:
+            connection.creation.destroy_test_db(old_database_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
@@ -1,54 +1,49 @@
-from django.core.management.base import BaseCommand
-from bom.models import BOMItem
-import re
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from bom.bulk_import import FILES_PER_TRANSACTION, run_import
+
 
 class Command(BaseCommand):
-    help = 'Imports a BOM file'
+    help = (
+        'Imports every BOM file (.xlsx, .csv, .docx, .pdf, .txt) of a directory tree or zip archive '
+        'as master BOMs. Rerunning it over the same source resumes an interrupted import.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Directory or zip archive to import.')
+        parser.add_argument('--user', required=True, help='Username the imported master BOMs belong to.')
+        parser.add_argument('--workers', type=int, help='Parser processes (default: BOM_PARSE_WORKERS).')
+        parser.add_argument(
+            '--files-per-transaction', type=int, default=FILES_PER_TRANSACTION,
+            help='Files stored, and checkpointed, per transaction.',
+        )
+        parser.add_argument('--retry-failed', action='store_true', help='Retry the files that failed in earlier runs.')
 
     def handle(self, *args, **options):
-        # For now, we are using the OCR text from the bom.pdf.
-        # In the future, this can be extended to parse different file formats.
-        ocr_text = """
-Reference designators,Quantity,Identified MPN,Identified manufacturer
-A1,1,PRO-OB-440,Proant AB
-C1 C3 C9,3,GRM188R60J475KE19D,Murata
-C2,1,8.75116E+11,WVorth Elektronik
-C4,1,GRM188R61E105KA12D,Murata
-C5 C11 C13 C19 C20 C21 C22 C23 C24 C25 C26 C27 C28,13,GCJ188R71C104KA01D,"Murata Electronics North America"
-C14 C15 C29 C30,4,GCM1885C1H101JA16D,Murata
-C17 C18,2,GPC0402101,Generic part
-C31,1,GCM188R72A102KA37D,Murata
-C32 C33 C34,3,GPC0603101,Generic part
-D1 D2 D3 D4 D14,5,CRS08,Toshiba
-D5 D6 D7 D8 D9 D10 D11 D12 D13,9,sk6812MINI,"Shenzhen Fedy Technology"
-J1,1,"SDDC 1,5/ 2-PV-3,5",Phoenix Contact
-J2 J3,2,79578211,Wurth
-J4,1,M40-3100545R,Harwin
-L1,1,74438335068,"WVorth Elektronik"
-L2,1,744784115A,Wurth
-L3,1,74479777310A,"Wurth Elektronik"
-L4,1,GPR040210K,Generic part
-LDR1,1,NSL-19M51,Luna
-Q1 Q2,2,NSVBC850CLT1G,"ON Semiconductor"
-R1 R3 R11,3,MCWR06X4991FTL,Multicomp
-R2 R8 R9,3,CRCW060310KOFKTABC,Vishay
-R4 R5 R10,3,GPR06033M3,Generic part
-R6 R7,2,CRCW0603100KFKTABC,Vishay
-S1,1,SQ-MIN-200,SignalQuest
-SW1 SW2 SW3,3,KSC621JLFS,C&K
-U1,1,TPS61025DRCR,"Texas Instrument"
-U2,1,nRF52832-QFAA-R7,"Nordic Semiconductor"
-U3,1,AL-61SP05SA,Ekulit
-"""
-        lines = ocr_text.strip().split('\n')
-        for line in lines[1:]:
-            # Simple CSV parsing, might need to be more robust
-            parts = line.split(',')
-            if len(parts) == 4:
-                BOMItem.objects.create(
-                    reference_designators=parts[0],
-                    quantity=int(parts[1]),
-                    identified_mpn=parts[2],
-                    identified_manufacturer=parts[3],
-                )
-        self.stdout.write(self.style.SUCCESS('Successfully imported BOM data.'))
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named '{options['user']}'.")
+        if options['files_per_transaction'] < 1:
+            raise CommandError('--files-per-transaction must be positive.')
+
+        try:
+            report = run_import(
+                options['source'], user,
+                files_per_transaction=options['files_per_transaction'],
+                max_workers=options['workers'],
+                retry_failed=options['retry_failed'],
+                log=self.stderr.write,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for name, error in sorted(report['failures'].items()):
+            self.stderr.write(self.style.ERROR(f'{name}: {error}'))
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {report['imported']} of {report['files']} files ({report['skipped']} done in earlier runs, "
+            f"{len(report['failures'])} failed): {report['entries']} entries, {report['parts_created']} new parts "
+            f"in {report['elapsed_seconds']:.1f}s ({report['files_per_second']:.1f} files/s, "
+            f"{report['entries_per_second']:.0f} entries/s)."
+        ))
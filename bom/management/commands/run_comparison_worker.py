@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bom.jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Runs queued BOM comparison jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait between queue polls.')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = run_pending_jobs()
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f'Processed {processed} comparison job(s).'))
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
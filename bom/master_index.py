@@ -0,0 +1,111 @@
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from sys import intern
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .aliases import get_manufacturer_resolver
+from .models import BOMFile, MasterIndex
+from .designators import canonical_designators
+from .queries import INDEX_ROW_FIELDS, bom_entry_rows
+from .records import PartLine
+
+# bom_file_id -> (entries_version, resolver version, parts_map), least recently used first
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def _serialize(parts_map):
+    rows = [key + part for key, part in parts_map.items()]
+    return zlib.compress(json.dumps(rows, separators=(',', ':')).encode('utf-8'))
+
+
+def _deserialize(data):
+    parts_map = {}
+    for mpn, manufacturer, quantity, designators, *designator_set in json.loads(zlib.decompress(bytes(data)).decode('utf-8')):
+        # Indexes stored before designator sets existed have four columns
+        parts_map[(intern(mpn), intern(manufacturer))] = PartLine(
+            quantity, intern(designators), designator_set[0] if designator_set else canonical_designators(designators),
+        )
+    return parts_map
+
+
+def resolve_manufacturers(parts_map, resolver):
+    """
+    The parts map with its manufacturers mapped to canonical names by resolver (see
+    aliases.py), as target files are when parsed. Stored entries keep the names of their
+    file, so aliases added since a master was ingested apply to it too. Where two names
+    of a part resolve to the same one, the later line wins, as in build_parts_map.
+    """
+    if resolver is None:
+        return parts_map
+    return {
+        (mpn, intern(resolver.resolve(manufacturer))): part
+        for (mpn, manufacturer), part in parts_map.items()
+    }
+
+
+def _remember(bom_file_id, entries_version, resolver_version, parts_map):
+    with _memo_lock:
+        _memo[bom_file_id] = (entries_version, resolver_version, parts_map)
+        _memo.move_to_end(bom_file_id)
+        while len(_memo) > getattr(settings, 'BOM_MASTER_INDEX_MEMO_SIZE', 32):
+            _memo.popitem(last=False)
+
+
+def build_master_index(bom_file):
+    """
+    Builds and stores the parts map of a BOM file from its entries.
+    Same result as comparison.build_parts_map over the file's entries, in entry order,
+    with the manufacturer names as stored.
+    """
+    entries_version = BOMFile.objects.filter(pk=bom_file.pk).values_list('entries_version', flat=True).get()
+    parts_map = {}
+    for mpn, manufacturer, quantity, designators, designator_set in bom_entry_rows(bom_file, INDEX_ROW_FIELDS):
+        parts_map[(intern(mpn), intern(manufacturer))] = PartLine(quantity, intern(designators), designator_set)
+
+    MasterIndex.objects.update_or_create(
+        bom_file_id=bom_file.pk,
+        defaults={'entries_version': entries_version, 'data': _serialize(parts_map)},
+    )
+    return parts_map
+
+
+def get_master_parts_map(bom_file, resolver=None):
+    """
+    Returns the (mpn, manufacturer) -> PartLine map of a BOM file with manufacturers
+    resolved by resolver (by default the one for the current alias table), from the
+    in-process memo, the stored index, or by rebuilding it, in that order.
+    Callers must not modify the returned map; it is shared.
+    """
+    if resolver is None:
+        resolver = get_manufacturer_resolver()
+    resolver_version = resolver.version if resolver is not None else ''
+    entries_version = BOMFile.objects.filter(pk=bom_file.pk).values_list('entries_version', flat=True).get()
+
+    with _memo_lock:
+        memoized = _memo.get(bom_file.pk)
+        if memoized is not None and memoized[:2] == (entries_version, resolver_version):
+            _memo.move_to_end(bom_file.pk)
+            return memoized[2]
+
+    stored = MasterIndex.objects.filter(bom_file_id=bom_file.pk, entries_version=entries_version).first()
+    parts_map = build_master_index(bom_file) if stored is None else _deserialize(stored.data)
+    parts_map = resolve_manufacturers(parts_map, resolver)
+    _remember(bom_file.pk, entries_version, resolver_version, parts_map)
+    return parts_map
+
+
+def invalidate_master_index(bom_file_ids):
+    """Marks the indexes of the given BOM files as stale."""
+    BOMFile.objects.filter(pk__in=bom_file_ids).update(
+        entries_version=F('entries_version') + 1,
+        entries_updated_at=timezone.now(),
+    )
+    with _memo_lock:
+        for bom_file_id in bom_file_ids:
+            _memo.pop(bom_file_id, None)
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .aliases import get_manufacturer_resolver
+from .comparison import build_parts_map, iter_parsed_targets
+from .master_index import get_master_parts_map
+from .models import BOMFile
+
+# (bom_file_id, entries_version, resolver version) -> (part key hashes, line hashes), least recently used first
+_key_sets = OrderedDict()
+_key_sets_lock = threading.Lock()
+
+
+def key_sets(parts_map):
+    """
+    Hashes of a BOM's (mpn, manufacturer) keys, and of its full lines (key, quantity and
+    canonical designators), as sets of ints so similarity is plain set arithmetic.
+    """
+    keys = frozenset(hash(key) for key in parts_map)
+    lines = frozenset(hash((key, part.quantity, part.designator_set)) for key, part in parts_map.items())
+    return keys, lines
+
+
+def master_key_sets(bom_files):
+    """key_sets of each master BOM file, reusing the sets of masters that haven't changed."""
+    versions = dict(BOMFile.objects.filter(pk__in=[bom_file.pk for bom_file in bom_files]).values_list('pk', 'entries_version'))
+    # Masters are compared with their manufacturers resolved, like the targets
+    resolver = get_manufacturer_resolver()
+    resolver_version = resolver.version if resolver is not None else ''
+    result = []
+    for bom_file in bom_files:
+        memo_key = (bom_file.pk, versions[bom_file.pk], resolver_version)
+        with _key_sets_lock:
+            sets = _key_sets.get(memo_key)
+            if sets is not None:
+                _key_sets.move_to_end(memo_key)
+        if sets is None:
+            sets = key_sets(get_master_parts_map(bom_file, resolver))
+            with _key_sets_lock:
+                _key_sets[memo_key] = sets
+                while len(_key_sets) > getattr(settings, 'BOM_MASTER_INDEX_MEMO_SIZE', 32):
+                    _key_sets.popitem(last=False)
+        result.append(sets)
+    return result
+
+
+def jaccard(a, b):
+    shared = len(a & b)
+    union = len(a) + len(b) - shared
+    return shared / union if union else 1.0
+
+
+def rank_masters(target_sets, masters):
+    """
+    Scores a target against (bom_file, key_sets) pairs and returns them most similar
+    first: by Jaccard similarity of the part keys, then of the full lines.
+    """
+    target_keys, target_lines = target_sets
+    ranking = []
+    for bom_file, (master_keys, master_lines) in masters:
+        shared = len(master_keys & target_keys)
+        ranking.append({
+            'master_id': bom_file.pk,
+            'master_name': bom_file.name,
+            'similarity': jaccard(master_keys, target_keys),
+            'line_similarity': jaccard(master_lines, target_lines),
+            'shared_parts': shared,
+            'only_in_master': len(master_keys) - shared,
+            'only_in_target': len(target_keys) - shared,
+        })
+    ranking.sort(key=lambda score: (score['similarity'], score['line_similarity']), reverse=True)
+    return ranking
+
+
+def spool_uploads(uploaded_files, directory):
+    """
+    Writes uploads to directory so parser processes can open them. Returns the
+    (file_path, original_name, content_digest) targets iter_parsed_targets expects.
+    """
+    targets = []
+    for position, uploaded_file in enumerate(uploaded_files):
+        path = os.path.join(directory, f'{position}-{os.path.basename(uploaded_file.name)}')
+        content_hash = hashlib.sha256()
+        with open(path, 'wb') as f:
+            for chunk in uploaded_file.chunks():
+                content_hash.update(chunk)
+                f.write(chunk)
+        targets.append((path, uploaded_file.name, content_hash.hexdigest()))
+    return targets
+
+
+def comparison_matrix(master_bom_files, targets):
+    """
+    Ranks every master against every target, given as iter_parsed_targets tuples. The
+    master key sets are loaded once; targets are parsed in parallel and scored as each
+    one finishes. Returns one row per target, in target order.
+    """
+    masters = list(zip(master_bom_files, master_key_sets(master_bom_files)))
+    rows = [None] * len(targets)
+    for index, entries, error in iter_parsed_targets(targets):
+        row = {'name': targets[index][1], 'error': None, 'entries': 0, 'ranking': []}
+        if error is not None:
+            row['error'] = f"Error parsing '{row['name']}': {error}"
+        elif not entries:
+            row['error'] = f"No valid BOM entries found in '{row['name']}'."
+        else:
+            row['entries'] = len(entries)
+            row['ranking'] = rank_masters(key_sets(build_parts_map(entries)), masters)
+        rows[index] = row
+    return rows
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bom', '0002_comparison_jobs'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='comparisonjob',
+            name='results',
+        ),
+        migrations.CreateModel(
+            name='ComparisonResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('target_file_name', models.CharField(max_length=255)),
+                ('perfectly_matching', models.PositiveIntegerField(default=0)),
+                ('partially_matching', models.PositiveIntegerField(default=0)),
+                ('added', models.PositiveIntegerField(default=0)),
+                ('removed', models.PositiveIntegerField(default=0)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='results', to='bom.comparisonjob')),
+            ],
+            options={
+                'ordering': ['position'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ComparisonResultRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('matching', 'Matching'), ('added', 'Added'), ('removed', 'Removed')], max_length=16)),
+                ('status', models.CharField(blank=True, max_length=64)),
+                ('mpn', models.CharField(max_length=255)),
+                ('manufacturer', models.CharField(max_length=255)),
+                ('master_quantity', models.IntegerField(blank=True, null=True)),
+                ('target_quantity', models.IntegerField(blank=True, null=True)),
+                ('master_designators', models.TextField(blank=True)),
+                ('target_designators', models.TextField(blank=True)),
+                ('result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='bom.comparisonresult')),
+            ],
+            options={
+                'ordering': ['pk'],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bom', '0003_comparison_results'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bomfile',
+            name='entries_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='MasterIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entries_version', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('built_at', models.DateTimeField(auto_now=True)),
+                ('bom_file', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='master_index', to='bom.bomfile')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bom', '0004_master_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bomfile',
+            name='entries_updated_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bom', '0005_bomfile_entries_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bomfile',
+            name='delta_depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='bomfile',
+            name='previous_revision',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='next_revisions', to='bom.bomfile'),
+        ),
+        migrations.AddField(
+            model_name='bomfile',
+            name='revision',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.CreateModel(
+            name='BOMEntryDelta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('op', models.CharField(choices=[('add', 'Added'), ('remove', 'Removed'), ('change', 'Changed')], max_length=8)),
+                ('quantity', models.IntegerField(null=True)),
+                ('reference_designators', models.CharField(blank=True, max_length=1000)),
+                ('bom_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entry_deltas', to='bom.bomfile')),
+                ('part', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='bom.part')),
+            ],
+            options={
+                'ordering': ['pk'],
+            },
+        ),
+    ]
@@ -0,0 +1,75 @@
+import re
+
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 2000
+
+# Frozen copies of bom.keys as of this migration
+MANUFACTURER_SUFFIXES = frozenset({
+    'AB', 'AG', 'BV', 'CO', 'CORP', 'CORPORATION', 'GMBH', 'INC', 'INCORPORATED',
+    'LLC', 'LTD', 'LIMITED', 'PLC', 'SA',
+})
+PUNCTUATION = re.compile(r'[^\w&]+')
+
+
+def normalize_mpn(mpn):
+    return ''.join(str(mpn).upper().split())
+
+
+def normalize_manufacturer(manufacturer):
+    words = PUNCTUATION.sub(' ', str(manufacturer).upper()).split()
+    while len(words) > 1 and words[-1] in MANUFACTURER_SUFFIXES:
+        words.pop()
+    return ' '.join(words)
+
+
+def backfill_part_keys(apps, schema_editor):
+    # Walk the table in primary key ranges so memory and transaction size stay bounded
+    Part = apps.get_model('bom', 'Part')
+    last_pk = 0
+    while True:
+        parts = list(Part.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'mpn', 'manufacturer')[:BACKFILL_BATCH_SIZE])
+        if not parts:
+            return
+        for part in parts:
+            part.mpn_key = normalize_mpn(part.mpn)
+            part.manufacturer_key = normalize_manufacturer(part.manufacturer)
+        Part.objects.bulk_update(parts, ['mpn_key', 'manufacturer_key'])
+        last_pk = parts[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bom', '0006_bom_revisions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='part',
+            name='mpn_key',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='part',
+            name='manufacturer_key',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_part_keys, migrations.RunPython.noop),
+        # Indexes are created after the backfill so it doesn't pay for index maintenance
+        migrations.AlterField(
+            model_name='part',
+            name='manufacturer_key',
+            field=models.CharField(db_index=True, editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='part',
+            index=models.Index(fields=['mpn_key', 'manufacturer_key'], name='bom_part_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bomentry',
+            index=models.Index(fields=['bom_file', 'part'], name='bom_entry_file_part_idx'),
+        ),
+    ]
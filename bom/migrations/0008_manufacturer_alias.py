@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bom', '0007_part_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ManufacturerAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=255, unique=True)),
+                ('canonical', models.CharField(db_index=True, max_length=255)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'manufacturer aliases',
+            },
+        ),
+    ]
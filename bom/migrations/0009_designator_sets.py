@@ -0,0 +1,109 @@
+import re
+
+from django.db import migrations, models
+
+BACKFILL_BATCH_SIZE = 2000
+
+# Frozen copy of bom.designators as of this migration
+MAX_RANGE_SIZE = 10000
+SEPARATORS = re.compile(r'[\s,;]+')
+RANGE_DASHES = re.compile(r'\s*[-–]\s*')
+RANGE = re.compile(r'^([A-Z]+)([1-9]\d*|0)-(?:\1)?([1-9]\d*|0)$')
+NUMBERED = re.compile(r'^([A-Z]+)([1-9]\d*|0)$')
+
+
+def parse_designators(text):
+    designators = set()
+    for token in SEPARATORS.split(RANGE_DASHES.sub('-', str(text).upper().strip())):
+        if not token:
+            continue
+        match = RANGE.match(token)
+        if match:
+            prefix, start, end = match.group(1), int(match.group(2)), int(match.group(3))
+            if start <= end and end - start < MAX_RANGE_SIZE:
+                designators.update(f'{prefix}{number}' for number in range(start, end + 1))
+                continue
+        designators.add(token)
+    return designators
+
+
+def sort_key(designator):
+    match = NUMBERED.match(designator)
+    if match:
+        return (match.group(1), 0, int(match.group(2)))
+    return (designator, 1, 0)
+
+
+def compress_designators(designators):
+    tokens = []
+    run = []
+
+    def flush():
+        if run:
+            prefix, first, last = run
+            if last - first >= 2:
+                tokens.append(f'{prefix}{first}-{prefix}{last}')
+            else:
+                tokens.extend(f'{prefix}{number}' for number in range(first, last + 1))
+            run.clear()
+
+    for designator in sorted(designators, key=sort_key):
+        match = NUMBERED.match(designator)
+        if match is None:
+            flush()
+            tokens.append(designator)
+            continue
+        prefix, number = match.group(1), int(match.group(2))
+        if run and run[0] == prefix and run[2] + 1 == number:
+            run[2] = number
+        else:
+            flush()
+            run.extend((prefix, number, number))
+    flush()
+    return ' '.join(tokens)
+
+
+def backfill_designator_sets(apps, schema_editor):
+    # Walk each table in primary key ranges so memory and transaction size stay bounded
+    for model_name in ('BOMEntry', 'BOMEntryDelta'):
+        model = apps.get_model('bom', model_name)
+        last_pk = 0
+        while True:
+            rows = list(model.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', 'reference_designators')[:BACKFILL_BATCH_SIZE])
+            if not rows:
+                break
+            for row in rows:
+                row.designator_set = compress_designators(parse_designators(row.reference_designators))
+            model.objects.bulk_update(rows, ['designator_set'])
+            last_pk = rows[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bom', '0008_manufacturer_alias'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bomentry',
+            name='designator_set',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='bomentrydelta',
+            name='designator_set',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comparisonresultrow',
+            name='added_designators',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='comparisonresultrow',
+            name='removed_designators',
+            field=models.TextField(blank=True),
+        ),
+        migrations.RunPython(backfill_designator_sets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bom', '0009_designator_sets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comparisonjobfile',
+            name='received',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comparisonjobfile',
+            name='size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='comparisonjob',
+            name='status',
+            field=models.CharField(choices=[('receiving', 'Receiving'), ('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=16),
+        ),
+        migrations.AlterField(
+            model_name='comparisonjobfile',
+            name='status',
+            field=models.CharField(choices=[('receiving', 'Receiving'), ('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=16),
+        ),
+    ]
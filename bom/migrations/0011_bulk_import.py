@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bom', '0010_chunked_uploads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=1024)),
+                ('name', models.CharField(max_length=1024)),
+                ('error', models.TextField(blank=True)),
+                ('imported_at', models.DateTimeField(auto_now_add=True)),
+                ('bom_file', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='bom.bomfile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('source', 'name'), name='imported_file_source_name_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:31
+
+import django.db.models.deletion
+from django.db import OperationalError, migrations, models
+from django.db.models import Sum
+
+BACKFILL_BATCH_SIZE = 2000
+
+# Trigram index of Part.mpn_key for wildcard part number search on SQLite (3.34+,
+# with FTS5). Triggers keep it in sync with bom_part, bulk inserts included.
+MPN_SEARCH_TABLE = 'bom_part_mpn_fts'
+CREATE_MPN_SEARCH_INDEX = [
+    f"CREATE VIRTUAL TABLE {MPN_SEARCH_TABLE} USING fts5("
+    f"mpn_key, tokenize='trigram', detail='none', content='bom_part', content_rowid='id')",
+    f"CREATE TRIGGER {MPN_SEARCH_TABLE}_insert AFTER INSERT ON bom_part BEGIN "
+    f"INSERT INTO {MPN_SEARCH_TABLE}(rowid, mpn_key) VALUES (new.id, new.mpn_key); END",
+    f"CREATE TRIGGER {MPN_SEARCH_TABLE}_delete AFTER DELETE ON bom_part BEGIN "
+    f"INSERT INTO {MPN_SEARCH_TABLE}({MPN_SEARCH_TABLE}, rowid, mpn_key) VALUES ('delete', old.id, old.mpn_key); END",
+    f"CREATE TRIGGER {MPN_SEARCH_TABLE}_update AFTER UPDATE OF mpn_key ON bom_part BEGIN "
+    f"INSERT INTO {MPN_SEARCH_TABLE}({MPN_SEARCH_TABLE}, rowid, mpn_key) VALUES ('delete', old.id, old.mpn_key); "
+    f"INSERT INTO {MPN_SEARCH_TABLE}(rowid, mpn_key) VALUES (new.id, new.mpn_key); END",
+    f"INSERT INTO {MPN_SEARCH_TABLE}({MPN_SEARCH_TABLE}) VALUES ('rebuild')",
+]
+
+
+def create_mpn_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(CREATE_MPN_SEARCH_INDEX[0])
+    except OperationalError:
+        # No FTS5 or no trigram tokenizer: wildcard search scans the part keys instead
+        return
+    for statement in CREATE_MPN_SEARCH_INDEX[1:]:
+        schema_editor.execute(statement)
+
+
+def drop_mpn_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for trigger in ('insert', 'delete', 'update'):
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {MPN_SEARCH_TABLE}_{trigger}")
+    schema_editor.execute(f"DROP TABLE IF EXISTS {MPN_SEARCH_TABLE}")
+
+
+def backfill_part_usage(apps, schema_editor):
+    BOMFile = apps.get_model('bom', 'BOMFile')
+    BOMEntry = apps.get_model('bom', 'BOMEntry')
+    BOMEntryDelta = apps.get_model('bom', 'BOMEntryDelta')
+    PartUsage = apps.get_model('bom', 'PartUsage')
+
+    # Files stored in full: their entries summed per part
+    totals = (
+        BOMEntry.objects.values_list('bom_file_id', 'part_id').annotate(total=Sum('quantity')).order_by()
+        .iterator(chunk_size=BACKFILL_BATCH_SIZE)
+    )
+    batch = []
+    for bom_file_id, part_id, quantity in totals:
+        batch.append(PartUsage(bom_file_id=bom_file_id, part_id=part_id, quantity=quantity))
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            PartUsage.objects.bulk_create(batch)
+            batch = []
+    PartUsage.objects.bulk_create(batch)
+
+    # Revisions stored as deltas: their predecessor's usage with the deltas applied,
+    # predecessors first. Delta revisions never repeat a part.
+    for revision in BOMFile.objects.filter(delta_depth__gt=0).order_by('delta_depth', 'pk'):
+        quantities = dict(PartUsage.objects.filter(bom_file_id=revision.previous_revision_id).values_list('part_id', 'quantity'))
+        for op, part_id, quantity in BOMEntryDelta.objects.filter(bom_file=revision).order_by('pk').values_list('op', 'part_id', 'quantity'):
+            if op == 'remove':
+                quantities.pop(part_id, None)
+            else:
+                quantities[part_id] = quantity
+        PartUsage.objects.bulk_create(
+            [PartUsage(bom_file=revision, part_id=part_id, quantity=quantity) for part_id, quantity in quantities.items()],
+            batch_size=BACKFILL_BATCH_SIZE,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bom', '0011_bulk_import'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('bom_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='part_usages', to='bom.bomfile')),
+                ('part', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usages', to='bom.part')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('part', 'bom_file'), name='part_usage_part_file_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_part_usage, migrations.RunPython.noop),
+        migrations.RunPython(create_mpn_search_index, drop_mpn_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bom', '0012_where_used'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comparisonjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
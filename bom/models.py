@@ -1,22 +1,64 @@
 from django.db import models
 from django.contrib.auth.models import User
 
+from .designators import canonical_designators
+from .keys import normalize_manufacturer, normalize_mpn
+
 class Part(models.Model):
     mpn = models.CharField(max_length=255)
     manufacturer = models.CharField(max_length=255)
+    # Case- and whitespace-insensitive lookup keys, see keys.py
+    mpn_key = models.CharField(max_length=255, editable=False)
+    manufacturer_key = models.CharField(max_length=255, editable=False, db_index=True)
 
     class Meta:
         unique_together = ('mpn', 'manufacturer')
+        indexes = [
+            models.Index(fields=['mpn_key', 'manufacturer_key'], name='bom_part_key_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.set_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'mpn_key', 'manufacturer_key'}
+        super().save(*args, **kwargs)
+
+    def set_keys(self):
+        """Fills the lookup keys from mpn and manufacturer; bulk_create callers must call this."""
+        self.mpn_key = normalize_mpn(self.mpn)
+        self.manufacturer_key = normalize_manufacturer(self.manufacturer)
+        return self
 
     def __str__(self):
         return f"{self.manufacturer} - {self.mpn}"
 
+class ManufacturerAlias(models.Model):
+    """A manufacturer name as written in BOM files and the canonical name parsing maps it to."""
+    alias = models.CharField(max_length=255, unique=True)
+    canonical = models.CharField(max_length=255, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'manufacturer aliases'
+
+    def __str__(self):
+        return f"{self.alias} -> {self.canonical}"
+
 class BOMFile(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
     file = models.FileField(upload_to='boms/')
     is_master = models.BooleanField(default=False)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever the file's entries change; invalidates its MasterIndex
+    entries_version = models.PositiveIntegerField(default=0, editable=False)
+    entries_updated_at = models.DateTimeField(null=True, editable=False)
+    # Revisions of a master BOM. A revision with delta_depth > 0 has no BOMEntry rows of
+    # its own: its entries are its predecessor's with its BOMEntryDelta rows applied.
+    previous_revision = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='next_revisions')
+    revision = models.PositiveIntegerField(default=1, editable=False)
+    delta_depth = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.name
@@ -26,6 +68,215 @@ class BOMEntry(models.Model):
     part = models.ForeignKey(Part, on_delete=models.CASCADE)
     quantity = models.IntegerField()
     reference_designators = models.CharField(max_length=1000)
+    # designators.canonical_designators(reference_designators), computed at ingestion
+    designator_set = models.TextField(blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['bom_file', 'part'], name='bom_entry_file_part_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.designator_set = canonical_designators(self.reference_designators)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'designator_set'}
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.part} in {self.bom_file.name}"
+
+class BOMEntryDelta(models.Model):
+    """One added, removed or changed (mpn, manufacturer) line of a revision relative to its predecessor."""
+    OP_ADD = 'add'
+    OP_REMOVE = 'remove'
+    OP_CHANGE = 'change'
+    OP_CHOICES = [
+        (OP_ADD, 'Added'),
+        (OP_REMOVE, 'Removed'),
+        (OP_CHANGE, 'Changed'),
+    ]
+
+    bom_file = models.ForeignKey(BOMFile, on_delete=models.CASCADE, related_name='entry_deltas')
+    op = models.CharField(max_length=8, choices=OP_CHOICES)
+    part = models.ForeignKey(Part, on_delete=models.CASCADE)
+    quantity = models.IntegerField(null=True)
+    reference_designators = models.CharField(max_length=1000, blank=True)
+    designator_set = models.TextField(blank=True, editable=False)
+
+    class Meta:
+        ordering = ['pk']
+
+    def __str__(self):
+        return f"{self.get_op_display()}: {self.part} in {self.bom_file.name}"
+
+class MasterIndex(models.Model):
+    """Serialized (mpn, manufacturer) -> quantity/designators map of a BOM file's entries."""
+    bom_file = models.OneToOneField(BOMFile, on_delete=models.CASCADE, related_name='master_index')
+    entries_version = models.PositiveIntegerField()
+    data = models.BinaryField()
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Index of {self.bom_file.name} (v{self.entries_version})"
+
+class PartUsage(models.Model):
+    """
+    Where-used index: the total quantity of a part in a BOM file, revisions stored as
+    deltas included. Rebuilt whenever the file's entries change; see where_used.py.
+    """
+    part = models.ForeignKey(Part, on_delete=models.CASCADE, related_name='usages')
+    bom_file = models.ForeignKey(BOMFile, on_delete=models.CASCADE, related_name='part_usages')
+    quantity = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['part', 'bom_file'], name='part_usage_part_file_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.part} in {self.bom_file.name}"
+
+class ImportedFile(models.Model):
+    """
+    Checkpoint of `manage.py import_bom`: one file of an imported directory or zip archive,
+    written in the same transaction as its BOMFile, so an interrupted import resumes
+    after the last committed batch.
+    """
+    source = models.CharField(max_length=1024)
+    name = models.CharField(max_length=1024)
+    bom_file = models.ForeignKey(BOMFile, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    error = models.TextField(blank=True)
+    imported_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'name'], name='imported_file_source_name_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} from {self.source}"
+
+class ComparisonJob(models.Model):
+    # Chunked uploads still arriving; the job is queued once every file is in and hashed
+    STATUS_RECEIVING = 'receiving'
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_RECEIVING, 'Receiving'),
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    master_bom = models.ForeignKey(BOMFile, on_delete=models.CASCADE, related_name='comparison_jobs')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Touched by the worker running the job as it goes, so a job whose worker died is rerun
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Comparison #{self.pk} against {self.master_bom.name} ({self.status})"
+
+class ComparisonJobFile(models.Model):
+    job = models.ForeignKey(ComparisonJob, on_delete=models.CASCADE, related_name='files')
+    position = models.PositiveIntegerField()
+    original_name = models.CharField(max_length=255)
+    file = models.FileField(upload_to='comparison_jobs/')
+    content_hash = models.CharField(max_length=64)
+    # Declared and received bytes of a chunked upload; size is None for regular uploads
+    size = models.BigIntegerField(null=True, blank=True)
+    received = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=16, choices=ComparisonJob.STATUS_CHOICES, default=ComparisonJob.STATUS_PENDING)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['position']
+
+    def __str__(self):
+        return f"{self.original_name} ({self.status})"
+
+
+class ComparisonResult(models.Model):
+    """Outcome of comparing one target file of a job against the master BOM."""
+    job = models.ForeignKey(ComparisonJob, on_delete=models.CASCADE, related_name='results')
+    position = models.PositiveIntegerField()
+    target_file_name = models.CharField(max_length=255)
+    perfectly_matching = models.PositiveIntegerField(default=0)
+    partially_matching = models.PositiveIntegerField(default=0)
+    added = models.PositiveIntegerField(default=0)
+    removed = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['position']
+
+    @property
+    def totally_different(self):
+        return self.added + self.removed
+
+    def summary(self):
+        return {
+            'perfectly_matching': self.perfectly_matching,
+            'partially_matching': self.partially_matching,
+            'totally_different': self.totally_different,
+        }
+
+    def __str__(self):
+        return f"{self.target_file_name} vs {self.job.master_bom.name}"
+
+class ComparisonResultRow(models.Model):
+    CATEGORY_MATCHING = 'matching'
+    CATEGORY_ADDED = 'added'
+    CATEGORY_REMOVED = 'removed'
+    CATEGORY_CHOICES = [
+        (CATEGORY_MATCHING, 'Matching'),
+        (CATEGORY_ADDED, 'Added'),
+        (CATEGORY_REMOVED, 'Removed'),
+    ]
+
+    result = models.ForeignKey(ComparisonResult, on_delete=models.CASCADE, related_name='rows')
+    category = models.CharField(max_length=16, choices=CATEGORY_CHOICES)
+    status = models.CharField(max_length=64, blank=True)
+    mpn = models.CharField(max_length=255)
+    manufacturer = models.CharField(max_length=255)
+    master_quantity = models.IntegerField(null=True, blank=True)
+    target_quantity = models.IntegerField(null=True, blank=True)
+    master_designators = models.TextField(blank=True)
+    target_designators = models.TextField(blank=True)
+    # For changed parts, the designators only the target / only the master has
+    added_designators = models.TextField(blank=True)
+    removed_designators = models.TextField(blank=True)
+
+    class Meta:
+        # Rows are bulk-inserted in the order the comparison produced them
+        ordering = ['pk']
+
+    def as_dict(self):
+        """The row as the as_dict() of the record comparison.perform_comparison produced for it."""
+        part = {'mpn': self.mpn, 'manufacturer': self.manufacturer}
+        if self.category == self.CATEGORY_ADDED:
+            part.update(quantity=self.target_quantity, designators=self.target_designators)
+        elif self.category == self.CATEGORY_REMOVED or self.status == 'Identical':
+            part.update(quantity=self.master_quantity, designators=self.master_designators)
+        else:
+            part.update(
+                master_quantity=self.master_quantity,
+                target_quantity=self.target_quantity,
+                master_designators=self.master_designators,
+                target_designators=self.target_designators,
+                added_designators=self.added_designators,
+                removed_designators=self.removed_designators,
+            )
+        if self.category == self.CATEGORY_MATCHING:
+            part['status'] = self.status
+        return part
 
     def __str__(self):
-        return f"{self.part} in {self.bom_file.name}"
\ No newline at end of file
+        return f"{self.get_category_display()}: {self.manufacturer} - {self.mpn}"
@@ -0,0 +1,83 @@
+import json
+import logging
+import zlib
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .records import bom_lines
+
+logger = logging.getLogger(__name__)
+
+HITS_KEY = 'bom-parse:stats:hits'
+MISSES_KEY = 'bom-parse:stats:misses'
+
+
+def _get_cache():
+    return caches[getattr(settings, 'BOM_PARSE_CACHE_ALIAS', 'default')]
+
+
+def cache_key(parser, content_digest):
+    """
+    Key for a file's parsed entries: parser class and version, the version of the
+    manufacturer alias table applied, if any, and the SHA-256 of the upload.
+    """
+    resolver = parser.manufacturer_resolver
+    aliases = f":m{resolver.version}" if resolver is not None else ''
+    return f"bom-parse:{type(parser).__name__}:v{parser.version}{aliases}:{content_digest}"
+
+
+def _serialize(entries):
+    # BOMLines are tuples, so they are written as positional rows, which compress far
+    # better than repeating the four field names per entry.
+    return zlib.compress(json.dumps(entries, separators=(',', ':')).encode('utf-8'))
+
+
+def _deserialize(payload):
+    return bom_lines(json.loads(zlib.decompress(payload).decode('utf-8')))
+
+
+def _increment(key):
+    cache = _get_cache()
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # The counter was evicted between add() and incr()
+            cache.set(key, 1, timeout=None)
+
+
+def get_cached_entries(parser, content_digest):
+    """Returns the cached entries for this parser and content, or None on a miss."""
+    cache = _get_cache()
+    key = cache_key(parser, content_digest)
+    payload = cache.get(key)
+    if payload is not None:
+        try:
+            entries = _deserialize(payload)
+        except (ValueError, zlib.error):
+            logger.warning("Discarding unreadable parse cache entry %s", key)
+            cache.delete(key)
+        else:
+            _increment(HITS_KEY)
+            return entries
+
+    _increment(MISSES_KEY)
+    return None
+
+
+def store_entries(parser, content_digest, entries):
+    _get_cache().set(cache_key(parser, content_digest), _serialize(entries))
+
+
+def parse_cache_stats():
+    """Returns the hit/miss counters shared by all workers using the parse cache."""
+    cache = _get_cache()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / lookups if lookups else 0.0,
+    }
@@ -1,12 +1,28 @@
 import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import openpyxl
+import codecs
 import csv
+import io
+import zipfile
+import xml.etree.ElementTree as ET
 from docx import Document
 # from PyPDF2 import PdfReader # No longer used
 import pdfplumber
+from .records import bom_line
+
+def _cell_text(value):
+    # Blank spreadsheet and PDF cells come back as None, not ''
+    return '' if value is None else str(value).strip()
+
 
 class BaseBOMParser:
     """Base class for all BOM parsers."""
+    # Bump when a parser's output changes so cached parses of old files are not reused.
+    version = 2
+    # Optional aliases.ManufacturerResolver applied to every parsed manufacturer name
+    manufacturer_resolver = None
     required_columns = [
         'Reference designators', 
         'Quantity', 
@@ -16,7 +32,7 @@ class BaseBOMParser:
 
     def parse(self, file_path):
         """
-        Parses the BOM file and returns a list of dictionaries, 
+        Parses the BOM file and returns a list of records.BOMLine, 
         each representing a BOM entry.
         """
         raise NotImplementedError("Subclasses must implement the parse method.")
@@ -38,8 +54,8 @@ class BaseBOMParser:
                 continue
 
             try:
-                mpn = str(row_data[column_map['Identified MPN']]).strip()
-                manufacturer = str(row_data[column_map['Identified manufacturer']]).strip()
+                mpn = _cell_text(row_data[column_map['Identified MPN']])
+                manufacturer = _cell_text(row_data[column_map['Identified manufacturer']])
                 
                 # Try converting quantity, handle potential errors
                 try:
@@ -49,17 +65,15 @@ class BaseBOMParser:
                     # print(f"Skipping malformed row (invalid quantity): {row_data}")
                     # continue
 
-                designators = str(row_data[column_map['Reference designators']]).strip()
+                designators = _cell_text(row_data[column_map['Reference designators']])
+
+                if manufacturer and self.manufacturer_resolver is not None:
+                    manufacturer = self.manufacturer_resolver.resolve(manufacturer)
 
                 if not mpn or not manufacturer or quantity <= 0: # Skip if essential data is missing or quantity is invalid
                     continue
 
-                parsed_entries.append({
-                    'mpn': mpn,
-                    'manufacturer': manufacturer,
-                    'quantity': quantity,
-                    'designators': designators,
-                })
+                parsed_entries.append(bom_line(mpn, manufacturer, quantity, designators))
             except (ValueError, IndexError, TypeError) as e:
                 # Log or handle rows that can't be parsed
                 print(f"Skipping malformed row: {row_data} - Error: {e}")
@@ -68,87 +82,411 @@ class BaseBOMParser:
 
 
 class XLSXParser(BaseBOMParser):
-    """Parser for XLSX files."""
-    def parse(self, file_path):
+    """
+    Parser for XLSX files. The workbook is opened in read-only mode and rows are
+    streamed as plain values, so memory stays flat regardless of sheet size.
+    """
+    def iter_rows(self, file):
+        """
+        Yields the rows of the active sheet as tuples of cell values, header row first.
+        Accepts a path or a file-like object.
+        """
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
         try:
-            workbook = openpyxl.load_workbook(file_path)
             sheet = workbook.active
-            
-            if sheet.max_row < 1:
+            for row in sheet.iter_rows(values_only=True):
+                yield row
+        finally:
+            workbook.close()
+
+    def parse(self, file_path):
+        try:
+            rows = self.iter_rows(file_path)
+            headers = next(rows, None)
+            if headers is None:
                 return [] # Empty sheet
 
-            headers = [cell.value for cell in sheet[1]]
-            rows_data = []
-            for row_index in range(2, sheet.max_row + 1):
-                rows_data.append([cell.value for cell in sheet[row_index]])
-            
-            return self._extract_bom_data(headers, rows_data)
+            return self._extract_bom_data(list(headers), rows)
         except Exception as e:
             raise IOError(f"Error parsing XLSX file {file_path}: {e}")
 
 
-class CSVParser(BaseBOMParser):
-    """Parser for CSV files."""
+# Byte order marks, longest first: the UTF-32 LE mark starts with the UTF-16 LE one
+_BYTE_ORDER_MARKS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+def _decode_as_cp1252(error):
+    # Bytes cp1252 leaves undefined map to the same code points, as in latin-1
+    text = ''.join(
+        bytes([byte]).decode('cp1252', errors='ignore') or chr(byte)
+        for byte in error.object[error.start:error.end]
+    )
+    return text, error.end
+
+
+# Error handler for text guessed to be UTF-8 from its prefix only: bytes further on that
+# aren't UTF-8 are read as cp1252, so a Windows export whose first accented character
+# comes after the prefix still parses
+UTF8_FALLBACK_ERRORS = 'bom-cp1252-fallback'
+codecs.register_error(UTF8_FALLBACK_ERRORS, _decode_as_cp1252)
+
+
+def detect_encoding(prefix):
+    """
+    Guesses the encoding of a text export from its first bytes: a byte order mark,
+    UTF-16 without one (a NUL in every other byte of ASCII text), UTF-8, or else
+    cp1252, which Excel and Altium write on Western Windows systems.
+    """
+    for mark, encoding in _BYTE_ORDER_MARKS:
+        if prefix.startswith(mark):
+            return encoding
+
+    sample = prefix[:4096]
+    if sample.count(0) > len(sample) // 4:
+        return 'utf-16-le' if sample[1::2].count(0) > sample[0::2].count(0) else 'utf-16-be'
+
+    try:
+        # Incremental, so a character cut in half at the end of the prefix isn't an error
+        codecs.getincrementaldecoder('utf-8')().decode(prefix, final=False)
+    except UnicodeDecodeError:
+        return 'cp1252'
+    return 'utf-8'
+
+
+def _dialect(delimiter, quotechar='"', skipinitialspace=False):
+    # Excel's quoting rules (doubled quotes inside quoted fields) with the detected
+    # delimiter; csv.Sniffer's own guess of doublequote is unreliable.
+    return type('BOMDialect', (csv.excel,), {
+        'delimiter': delimiter,
+        'quotechar': quotechar or '"',
+        'skipinitialspace': skipinitialspace,
+    })
+
+
+class DelimitedTextParser(BaseBOMParser):
+    """
+    Base class for delimited text exports. Rows are streamed from the file straight
+    into _extract_bom_data, so memory doesn't grow with the size of the export. The
+    encoding and dialect are detected from the first sniff_size bytes, which are peeked
+    from the read buffer rather than read twice.
+    """
+    version = 2
+    format_name = 'text'
+    sniff_size = 64 * 1024
+    delimiters = ',\t;|'
+
     def parse(self, file_path):
         try:
-            with open(file_path, 'r', newline='', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                headers = next(reader) # First row is headers
-                rows_data = [list(row) for row in reader]
-            
-            return self._extract_bom_data(headers, rows_data)
+            with open(file_path, 'rb', buffering=self.sniff_size) as raw:
+                return self.parse_stream(raw)
         except Exception as e:
-            raise IOError(f"Error parsing CSV file {file_path}: {e}")
+            raise IOError(f"Error parsing {self.format_name} file {file_path}: {e}")
+
+    def parse_stream(self, raw):
+        """
+        Parses a binary stream with peek(), such as an io.BufferedReader whose buffer
+        holds at least sniff_size bytes. The stream is read once, front to back.
+        """
+        prefix = raw.peek(self.sniff_size)[:self.sniff_size]
+        if not prefix:
+            return []
+        encoding = detect_encoding(prefix)
+        dialect = self.sniff_dialect(self._sample(prefix, encoding))
+
+        errors = UTF8_FALLBACK_ERRORS if encoding == 'utf-8' else 'strict'
+        text = io.TextIOWrapper(raw, encoding=encoding, errors=errors, newline='')
+        try:
+            reader = csv.reader(text, dialect)
+            headers = next(reader, None)
+            if headers is None:
+                return []
+            return self._extract_bom_data([header.strip() for header in headers], reader)
+        finally:
+            # Leave the stream to the caller, which may need to read past a parse error
+            text.detach()
+
+    def _sample(self, prefix, encoding):
+        """The complete lines of the decoded prefix."""
+        complete = len(prefix) < self.sniff_size
+        sample = codecs.getincrementaldecoder(encoding)().decode(prefix, final=complete)
+        if not complete and '\n' in sample:
+            sample = sample[:sample.rindex('\n') + 1]
+        return sample
+
+    def sniff_dialect(self, sample):
+        """
+        The csv dialect of a sample. csv.Sniffer's guess is kept when it splits the header
+        into the required columns; otherwise the first delimiter that does is used.
+        """
+        header_line = sample.splitlines()[0] if sample else ''
+        try:
+            sniffed = csv.Sniffer().sniff(sample, delimiters=self.delimiters)
+        except csv.Error:
+            sniffed = None
+        else:
+            dialect = _dialect(sniffed.delimiter, sniffed.quotechar, sniffed.skipinitialspace)
+            if self._has_required_columns(header_line, dialect):
+                return dialect
+
+        for delimiter in self.delimiters:
+            dialect = _dialect(delimiter)
+            if self._has_required_columns(header_line, dialect):
+                return dialect
+        # Let _extract_bom_data report the missing columns
+        return _dialect(sniffed.delimiter if sniffed else ',')
+
+    def _has_required_columns(self, header_line, dialect):
+        headers = {header.strip() for header in next(csv.reader([header_line], dialect), [])}
+        return all(column in headers for column in self.required_columns)
+
+
+class CSVParser(DelimitedTextParser):
+    """Parser for CSV files."""
+    format_name = 'CSV'
+
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_OFFICE_DOCUMENT = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+# Run content that python-docx renders as text, besides w:t
+_RUN_TEXT = {_W + 'tab': '\t', _W + 'ptab': '\t', _W + 'br': '\n', _W + 'cr': '\n', _W + 'noBreakHyphen': '-'}
+# Table markup whose cells python-docx resolves through the grid (merged, spanned or
+# skipped cells), or whose content it doesn't see as plain cell paragraphs
+_GRID_MARKUP = {_W + tag for tag in ('gridSpan', 'vMerge', 'hMerge', 'gridBefore', 'gridAfter', 'sdt', 'customXml', 'tbl')}
+
+
+class UnsupportedTableLayout(Exception):
+    """Raised by iter_docx_table_rows for tables it cannot read without python-docx."""
+
+
+def _main_document_part(archive):
+    """Name of the main document part of a DOCX archive, usually word/document.xml."""
+    try:
+        rels = ET.fromstring(archive.read('_rels/.rels'))
+    except KeyError:
+        return 'word/document.xml'
+    for rel in rels:
+        if rel.get('Type') == _OFFICE_DOCUMENT:
+            return rel.get('Target', '').lstrip('/')
+    return 'word/document.xml'
+
+
+def _paragraph_text(paragraph):
+    return ''.join(
+        (node.text or '') if node.tag == _W + 't' else _RUN_TEXT.get(node.tag, '')
+        for node in paragraph.iter()
+    )
+
+
+def iter_docx_table_rows(file_path, required_columns):
+    """
+    Streams the first top-level table of a DOCX file whose first row contains all
+    required_columns, yielding each row as a list of cell texts, header row first. Text
+    is read the way python-docx reads it, but straight from the document XML with
+    iterparse, without building the document's object graph. Raises
+    UnsupportedTableLayout for merged or spanned cells, nested tables and content
+    controls, and when no table matches.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        with archive.open(_main_document_part(archive)) as xml:
+            path = []  # tags of the open elements
+            table = None  # state of the top-level table being read
+            found_table = False
+            for event, element in ET.iterparse(xml, events=('start', 'end')):
+                if event == 'start':
+                    path.append(element.tag)
+                    if table is not None and element.tag in _GRID_MARKUP:
+                        raise UnsupportedTableLayout(f"Table uses {element.tag[len(_W):]}")
+                    if element.tag == _W + 'tbl' and path[-2:-1] == [_W + 'body']:
+                        found_table = True
+                        table = {'header': None, 'row': None, 'cell': None}
+                    elif table is not None and element.tag == _W + 'tr':
+                        table['row'] = []
+                    elif table is not None and element.tag == _W + 'tc':
+                        table['cell'] = []
+                    continue
+
+                path.pop()
+                if table is None:
+                    # Drop finished top-level content so memory stays flat
+                    if len(path) == 2:
+                        element.clear()
+                    continue
+
+                if element.tag == _W + 'p' and path[-1] == _W + 'tc':
+                    table['cell'].append(_paragraph_text(element))
+                    element.clear()
+                elif element.tag == _W + 'tc':
+                    table['row'].append('\n'.join(table['cell']))
+                elif element.tag == _W + 'tr':
+                    row = [text.strip() for text in table['row']]
+                    element.clear()
+                    if table['header'] is None:
+                        table['header'] = row
+                        if not all(column in row for column in required_columns):
+                            table = None  # Not the BOM table; its remaining rows are skipped
+                            continue
+                    yield row
+                elif element.tag == _W + 'tbl':
+                    if table['header'] is not None:
+                        return
+                    table = None
+            raise UnsupportedTableLayout("No table with the required columns" if found_table else "No tables")
 
 
 class DOCXParser(BaseBOMParser):
-    """Parser for DOCX files. Assumes BOM data is in the first table."""
+    """
+    Parser for DOCX files. Reads the first table with the required columns by streaming
+    the document XML; tables with merged cells and other layouts only python-docx
+    resolves are read with python-docx instead.
+    """
     def parse(self, file_path):
         try:
-            document = Document(file_path)
-            
-            if not document.tables:
-                raise ValueError("No tables found in DOCX file.")
-            
-            # Assuming BOM data is in the first table
-            table = document.tables[0]
-            
-            headers = [cell.text.strip() for cell in table.rows[0].cells]
-            rows_data = []
-            for i, row in enumerate(table.rows):
-                if i == 0: continue # Skip header row
-                rows_data.append([cell.text.strip() for cell in row.cells])
-            
-            return self._extract_bom_data(headers, rows_data)
+            rows = iter_docx_table_rows(file_path, self.required_columns)
+            try:
+                return self._extract_bom_data(next(rows), rows)
+            except UnsupportedTableLayout:
+                pass
+            finally:
+                rows.close()
+            return self._parse_document(file_path)
         except Exception as e:
             raise IOError(f"Error parsing DOCX file {file_path}: {e}")
 
+    def _parse_document(self, file_path):
+        document = Document(file_path)
+        
+        if not document.tables:
+            raise ValueError("No tables found in DOCX file.")
+        
+        # The first table with the required columns, else the first table
+        for table in document.tables:
+            headers = [cell.text.strip() for cell in table.rows[0].cells] if table.rows else []
+            if all(column in headers for column in self.required_columns):
+                break
+        else:
+            table = document.tables[0]
+            headers = [cell.text.strip() for cell in table.rows[0].cells]
+
+        rows_data = []
+        for i, row in enumerate(table.rows):
+            if i == 0: continue # Skip header row
+            rows_data.append([cell.text.strip() for cell in row.cells])
+        
+        return self._extract_bom_data(headers, rows_data)
+
+
+def _page_tables(page):
+    """Returns (page_height, [(bbox, rows), ...]) for the tables pdfplumber finds on a page."""
+    return page.height, [(table.bbox, table.extract()) for table in page.find_tables()]
+
+
+def _extract_pages_tables(file_path, page_numbers):
+    """Process pool worker: opens the PDF once and extracts the tables of the given pages."""
+    with pdfplumber.open(file_path) as pdf:
+        return {page_number: _page_tables(pdf.pages[page_number]) for page_number in page_numbers}
+
 
 class PDFParser(BaseBOMParser):
     """
     Parser for PDF files using pdfplumber. Attempts to extract tables first, then text.
+
+    Pages are first screened by their raw characters, which pdfplumber reads without
+    any layout analysis; only pages containing every header word are searched for
+    tables. A BOM table running off the bottom of its page is stitched together with
+    the tables continuing at the top of the following pages.
     """
+    # Processes used to extract tables from candidate pages; 1 extracts them in-process
+    page_workers = 1
+    # Fewer candidate pages aren't worth the cost of starting worker processes
+    parallel_min_pages = 8
+    # Fraction of the page height a table must reach (from the bottom, or from the top
+    # on the next page) to be considered part of a table spanning pages
+    stitch_margin = 0.2
+
+    def _header_words(self):
+        return {word for col in self.required_columns for word in col.split()}
+
+    def _page_may_have_header(self, page_chars, header_words):
+        return all(word in page_chars for word in header_words)
+
+    def _candidate_tables(self, pdf, file_path, candidates, page_tables):
+        """
+        Yields (page_number, page_height, tables) for candidate pages, in page order.
+        Extracted pages are recorded in page_tables so stitching doesn't redo them.
+        """
+        if self.page_workers > 1 and len(candidates) >= self.parallel_min_pages:
+            workers = min(self.page_workers, len(candidates))
+            chunks = [candidates[i::workers] for i in range(workers)]
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+                for result in executor.map(_extract_pages_tables, [file_path] * workers, chunks):
+                    page_tables.update(result)
+        for page_number in candidates:
+            # In-process, pages are extracted lazily so parsing stops at the first matching table
+            if page_number not in page_tables:
+                page_tables[page_number] = _page_tables(pdf.pages[page_number])
+            yield (page_number,) + page_tables[page_number]
+
+    def _stitch_continuation(self, pdf, page_number, page_height, bbox, headers, page_tables):
+        """Collects rows of a table continuing past page_number on the following pages."""
+        rows = []
+        while bbox[3] >= page_height * (1 - self.stitch_margin) and page_number + 1 < len(pdf.pages):
+            page_number += 1
+            if page_number not in page_tables:
+                page_tables[page_number] = _page_tables(pdf.pages[page_number])
+            page_height, tables = page_tables[page_number]
+            if not tables:
+                break
+            bbox, table = tables[0]
+            if bbox[1] > page_height * self.stitch_margin or not table or len(table[0]) != len(headers):
+                break
+            first_row = [str(h).strip() if h is not None else '' for h in table[0]]
+            # Continuation pages often repeat the header row
+            rows.extend(table[1:] if first_row == headers else table)
+            if len(tables) > 1:
+                break
+        return rows
+
     def parse(self, file_path):
         try:
             with pdfplumber.open(file_path) as pdf:
-                all_text_lines = []
-                for page in pdf.pages:
-                    # Try to extract tables first
-                    tables = page.extract_tables()
-                    for table in tables:
+                header_words = self._header_words()
+                candidates = []
+                has_text = False
+                for page_number, page in enumerate(pdf.pages):
+                    page_chars = ''.join(char['text'] for char in page.chars)
+                    has_text = has_text or bool(page_chars.strip())
+                    if self._page_may_have_header(page_chars, header_words):
+                        candidates.append(page_number)
+
+                if not candidates:
+                    if has_text:
+                        raise ValueError("Could not reliably detect headers in PDF text after trying tables.")
+                    return [] # No data found
+
+                page_tables = {}
+                for page_number, page_height, tables in self._candidate_tables(pdf, file_path, candidates, page_tables):
+                    for bbox, table in tables:
                         if table and len(table) > 1: # Ensure there's a header and at least one data row
                             headers = [str(h).strip() if h is not None else '' for h in table[0]]
-                            try:
-                                return self._extract_bom_data(headers, table[1:])
-                            except ValueError:
+                            if not all(col in headers for col in self.required_columns):
                                 # Table headers don't match required, try next table or text
-                                pass
-                    
-                    # If no suitable table found, extract text
+                                continue
+                            rows_data = table[1:] + self._stitch_continuation(pdf, page_number, page_height, bbox, headers, page_tables)
+                            return self._extract_bom_data(headers, rows_data)
+
+                # Text before the first page with a header can't hold BOM lines
+                all_text_lines = []
+                for page in pdf.pages[candidates[0]:]:
                     text_content = page.extract_text()
                     if text_content:
                         all_text_lines.extend(text_content.splitlines())
-                
+
                 # Fallback to text parsing if no tables matched
                 if all_text_lines:
                     # Attempt to find headers from text (similar to TXTParser)
@@ -191,30 +529,8 @@ class PDFParser(BaseBOMParser):
             raise IOError(f"Error parsing PDF file {file_path}: {e}. Ensure it contains extractable text or tables.")
 
 
-class TXTParser(BaseBOMParser):
+class TXTParser(DelimitedTextParser):
     """
     Parser for TXT files. Assumes a delimited format (e.g., CSV-like with comma or tab).
     """
-    def parse(self, file_path):
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            
-            if not lines:
-                return []
-            
-            # Attempt to detect delimiter (tab or comma)
-            first_line = lines[0]
-            delimiter = ',' if ',' in first_line else ('\t' if '\t' in first_line else None)
-
-            if not delimiter:
-                raise ValueError("Could not detect a clear delimiter (comma or tab) in TXT file.")
-            
-            headers = [h.strip() for h in first_line.split(delimiter)]
-            rows_data = []
-            for line in lines[1:]:
-                rows_data.append([d.strip() for d in line.split(delimiter)])
-            
-            return self._extract_bom_data(headers, rows_data)
-        except Exception as e:
-            raise IOError(f"Error parsing TXT file {file_path}: {e}")
\ No newline at end of file
+    format_name = 'TXT'
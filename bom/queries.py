@@ -0,0 +1,227 @@
+import base64
+import itertools
+import json
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q
+
+from .models import BOMEntry, BOMEntryDelta, BOMFile
+from .records import BOMLine
+
+ENTRY_ROW_FIELDS = ('part__mpn', 'part__manufacturer', 'quantity', 'reference_designators')
+# Entry rows plus the precomputed canonical designator set, for the comparison index
+INDEX_ROW_FIELDS = ENTRY_ROW_FIELDS + ('designator_set',)
+ENTRY_ITERATOR_CHUNK_SIZE = 2000
+
+
+def stored_entry_rows(bom_file_id, fields=ENTRY_ROW_FIELDS):
+    """
+    Streams the (mpn, manufacturer, quantity, designators) tuples stored as BOMEntry rows
+    for a BOM file, in entry order. The part columns are joined in the same query, so the
+    cost is one query regardless of the number of entries.
+    """
+    return (
+        BOMEntry.objects.filter(bom_file_id=bom_file_id)
+        .order_by('pk')
+        .values_list(*fields)
+        .iterator(chunk_size=ENTRY_ITERATOR_CHUNK_SIZE)
+    )
+
+
+def materialize_revision(bom_file, fields=ENTRY_ROW_FIELDS):
+    """
+    Returns the entry rows of a revision stored as deltas: the rows of the closest
+    predecessor stored in full, with the deltas of every later revision applied.
+    Changed lines keep their position and added lines are appended.
+    """
+    chain = [bom_file]
+    while chain[-1].delta_depth:
+        chain.append(BOMFile.objects.only('pk', 'delta_depth', 'previous_revision').get(pk=chain[-1].previous_revision_id))
+
+    # Rows are keyed on (mpn, manufacturer); BOMEntryDelta has the same columns as BOMEntry
+    rows = {row[:2]: row[2:] for row in stored_entry_rows(chain[-1].pk, fields)}
+    deltas = BOMEntryDelta.objects.filter(bom_file_id__in=[revision.pk for revision in chain[:-1]]).values_list('bom_file_id', 'op', *fields)
+    deltas_by_file = {}
+    for bom_file_id, *delta in deltas.order_by('pk'):
+        deltas_by_file.setdefault(bom_file_id, []).append(delta)
+
+    for revision in reversed(chain[:-1]):
+        for op, *row in deltas_by_file.get(revision.pk, ()):
+            if op == BOMEntryDelta.OP_REMOVE:
+                rows.pop(tuple(row[:2]), None)
+            else:
+                rows[tuple(row[:2])] = tuple(row[2:])
+    return [key + values for key, values in rows.items()]
+
+
+def bom_entry_rows(bom_file, fields=ENTRY_ROW_FIELDS):
+    """(mpn, manufacturer, quantity, designators) tuples of a BOM file, whichever way it is stored."""
+    if bom_file.delta_depth:
+        return iter(materialize_revision(bom_file, fields))
+    return stored_entry_rows(bom_file.pk, fields)
+
+
+def has_entries(bom_file):
+    """False for a BOM file whose upload hasn't been parsed into entries yet."""
+    return bool(bom_file.delta_depth) or BOMEntry.objects.filter(bom_file=bom_file).exists()
+
+
+def bom_entries(bom_file):
+    """bom_entry_rows as the BOMLines the parsers produce."""
+    return map(BOMLine._make, bom_entry_rows(bom_file))
+
+
+async def abom_entries(bom_file):
+    """
+    bom_entries as an async iterator, for async views. Stored entries are fetched a chunk
+    at a time in the thread the ORM runs in, like QuerySet.aiterator() (which can't
+    iterate values_list querysets on the Django versions this supports).
+    """
+    if bom_file.delta_depth:
+        for row in await sync_to_async(materialize_revision)(bom_file):
+            yield BOMLine._make(row)
+        return
+    rows = stored_entry_rows(bom_file.pk)
+    next_chunk = sync_to_async(lambda: list(itertools.islice(rows, ENTRY_ITERATOR_CHUNK_SIZE)))
+    while chunk := await next_chunk():
+        for row in chunk:
+            yield BOMLine._make(row)
+
+
+async def aiter_bom_data_json(bom_file, entries):
+    """
+    iter_bom_data_json over an async iterator of entries. Entries are sent in batches
+    rather than one by one, since every part yielded becomes an ASGI message.
+    """
+    parts = ['{"file_name": %s, "entries": [' % json.dumps(bom_file.name)]
+    separator = ''
+    async for entry in entries:
+        parts.append(separator + json.dumps(entry.as_dict()))
+        separator = ', '
+        if len(parts) >= ENTRY_ITERATOR_CHUNK_SIZE:
+            yield ''.join(parts)
+            parts = []
+    parts.append(']}')
+    yield ''.join(parts)
+
+
+def iter_bom_data_json(bom_file, entries):
+    """
+    Yields the JSON document served by get_bom_data piece by piece, so large BOMs
+    never have to be held in memory as one payload.
+    """
+    yield '{"file_name": %s, "entries": [' % json.dumps(bom_file.name)
+    separator = ''
+    for entry in entries:
+        yield separator + json.dumps(entry.as_dict())
+        separator = ', '
+    yield ']}'
+
+
+# Sort keys accepted by the BOM data API and the columns they map to
+SORT_FIELDS = {
+    'position': 'pk',
+    'mpn': 'part__mpn',
+    'manufacturer': 'part__manufacturer',
+    'quantity': 'quantity',
+    'designators': 'reference_designators',
+}
+
+INTEGER_SORT_KEYS = {'position', 'quantity'}
+
+
+class InvalidQuery(ValueError):
+    """Raised for malformed search, sort or cursor parameters."""
+
+
+def encode_cursor(sort_value, pk):
+    return base64.urlsafe_b64encode(json.dumps([sort_value, pk]).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, sort_key):
+    """The (sort value, pk) of a cursor, checked against the type of the sort_key field."""
+    try:
+        sort_value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        raise InvalidQuery("Invalid cursor.")
+    expected_type = int if sort_key in INTEGER_SORT_KEYS else str
+    # bool is an int too, but never a value of these fields
+    if type(pk) is not int or type(sort_value) is not expected_type:
+        raise InvalidQuery("Invalid cursor.")
+    return sort_value, pk
+
+
+def _materialized_entries_page(bom_file, search, sort_key, descending, cursor, limit):
+    """bom_entries_page for revisions stored as deltas; the row position stands in for the pk."""
+    rows = [(position,) + row for position, row in enumerate(materialize_revision(bom_file), start=1)]
+    if search:
+        needle = search.casefold()
+        rows = [row for row in rows if any(needle in str(row[i]).casefold() for i in (1, 2, 4))]
+    total = len(rows)
+
+    # Row tuples are laid out in SORT_FIELDS order
+    sort_index = list(SORT_FIELDS).index(sort_key)
+    rows.sort(key=lambda row: (row[sort_index], row[0]), reverse=descending)
+    if cursor:
+        last = tuple(decode_cursor(cursor, sort_key))
+        if descending:
+            rows = [row for row in rows if (row[sort_index], row[0]) < last]
+        else:
+            rows = [row for row in rows if (row[sort_index], row[0]) > last]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][sort_index], rows[-1][0])
+
+    return [
+        {'mpn': mpn, 'manufacturer': manufacturer, 'quantity': quantity, 'designators': designators}
+        for _, mpn, manufacturer, quantity, designators in rows
+    ], next_cursor, total
+
+
+def bom_entries_page(bom_file, search='', sort='', cursor=None, limit=500):
+    """
+    Returns one page of a BOM file's entries as (entries, next_cursor, total).
+    Pages are keyset-based: the cursor carries the sort value and primary key of the
+    last entry returned, so fetching page N costs the same as fetching page 1.
+    """
+    descending = sort.startswith('-')
+    sort_key = sort.lstrip('-') or 'position'
+    if sort_key not in SORT_FIELDS:
+        raise InvalidQuery(f"Unsupported sort field: {sort_key}")
+    sort_field = SORT_FIELDS[sort_key]
+
+    if bom_file.delta_depth:
+        return _materialized_entries_page(bom_file, search, sort_key, descending, cursor, limit)
+
+    entries = BOMEntry.objects.filter(bom_file_id=bom_file.pk)
+    if search:
+        entries = entries.filter(
+            Q(part__mpn__icontains=search)
+            | Q(part__manufacturer__icontains=search)
+            | Q(reference_designators__icontains=search)
+        )
+    total = entries.count()
+
+    if cursor:
+        sort_value, last_pk = decode_cursor(cursor, sort_key)
+        if descending:
+            entries = entries.filter(Q(**{f'{sort_field}__lt': sort_value}) | Q(**{sort_field: sort_value, 'pk__lt': last_pk}))
+        else:
+            entries = entries.filter(Q(**{f'{sort_field}__gt': sort_value}) | Q(**{sort_field: sort_value, 'pk__gt': last_pk}))
+
+    order = [f'-{sort_field}', '-pk'] if descending else [sort_field, 'pk']
+    fields = ('pk',) + ENTRY_ROW_FIELDS
+    rows = list(entries.order_by(*order).values_list(*fields)[:limit + 1])
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[fields.index(sort_field)], last[0])
+
+    return [
+        {'mpn': mpn, 'manufacturer': manufacturer, 'quantity': quantity, 'designators': designators}
+        for _, mpn, manufacturer, quantity, designators in rows
+    ], next_cursor, total
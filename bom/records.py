@@ -0,0 +1,63 @@
+"""
+Compact records for BOM lines as they flow from the parsers through comparison.
+
+A BOM with tens of thousands of lines used to exist as several lists of dicts at once
+(parsed entries, two parts maps, the comparison output). These records are tuples with
+no per-instance __dict__, and their strings are interned, so a target shares the MPN,
+manufacturer and designator strings it has in common with the master, and the
+comparison output shares them with both. They are turned into dicts only where they
+leave Python: JSON responses and templates.
+"""
+from collections import namedtuple
+from sys import intern
+
+IDENTICAL = 'Identical'
+CHANGED = 'Quantity/Designator Changed'
+
+
+class BOMLine(namedtuple('BOMLine', 'mpn manufacturer quantity designators')):
+    """One parsed BOM entry."""
+    __slots__ = ()
+
+    def as_dict(self):
+        return self._asdict()
+
+
+class PartLine(namedtuple('PartLine', 'quantity designators designator_set')):
+    """The value of a parts map entry, keyed by (mpn, manufacturer); see comparison.build_parts_map."""
+    __slots__ = ()
+
+
+class IdenticalPart(namedtuple('IdenticalPart', 'mpn manufacturer quantity designators')):
+    """A part with the same quantity and designators in the master and a target."""
+    __slots__ = ()
+    status = IDENTICAL
+    added_designators = removed_designators = ''
+
+    master_quantity = target_quantity = property(lambda self: self.quantity)
+    master_designators = target_designators = property(lambda self: self.designators)
+
+    def as_dict(self):
+        return dict(self._asdict(), status=self.status)
+
+
+class ChangedPart(namedtuple('ChangedPart', (
+    'mpn manufacturer master_quantity target_quantity master_designators target_designators '
+    'added_designators removed_designators'
+))):
+    """A part whose quantity or designators differ between the master and a target."""
+    __slots__ = ()
+    status = CHANGED
+
+    def as_dict(self):
+        return dict(self._asdict(), status=self.status)
+
+
+def bom_line(mpn, manufacturer, quantity, designators):
+    """A BOMLine with its strings interned."""
+    return BOMLine(intern(mpn), intern(manufacturer), quantity, intern(designators))
+
+
+def bom_lines(rows):
+    """BOMLines from (mpn, manufacturer, quantity, designators) rows, e.g. deserialized ones."""
+    return [bom_line(*row) for row in rows]
@@ -0,0 +1,69 @@
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .ingestion import compact_revision
+from .master_index import invalidate_master_index
+from .models import BOMEntry, BOMEntryDelta, BOMFile, Part
+from .where_used import refresh_part_usage
+
+
+def _with_delta_revisions(bom_file_ids):
+    """The given BOM files plus every later revision stored as deltas on top of them."""
+    result = set(bom_file_ids)
+    pending = result
+    while pending:
+        pending = set(
+            BOMFile.objects.filter(previous_revision_id__in=pending, delta_depth__gt=0)
+            .values_list('pk', flat=True)
+        ) - result
+        result |= pending
+    return list(result)
+
+
+@receiver(pre_save, sender=BOMEntry)
+@receiver(pre_delete, sender=BOMEntry)
+def compact_revisions_on_entry_change(sender, instance, origin=None, **kwargs):
+    # Later revisions stored as deltas are rebuilt from this file's entries; store them
+    # in full first, so editing an entry of one revision doesn't rewrite the next ones
+    if isinstance(origin, BOMFile):
+        return
+    for revision in BOMFile.objects.filter(previous_revision_id=instance.bom_file_id, delta_depth__gt=0):
+        compact_revision(revision)
+
+
+@receiver(post_save, sender=BOMEntry)
+@receiver(post_delete, sender=BOMEntry)
+def invalidate_index_on_entry_change(sender, instance, origin=None, **kwargs):
+    # Entries removed because their BOM file is being deleted don't need an index anymore
+    if isinstance(origin, BOMFile):
+        return
+    bom_file_ids = _with_delta_revisions([instance.bom_file_id])
+    invalidate_master_index(bom_file_ids)
+    refresh_part_usage(BOMFile.objects.filter(pk__in=bom_file_ids))
+
+
+@receiver(post_save, sender=Part)
+def invalidate_index_on_part_change(sender, instance, created, **kwargs):
+    if created:
+        return
+    bom_file_ids = set(BOMEntry.objects.filter(part=instance).values_list('bom_file_id', flat=True).distinct())
+    bom_file_ids.update(BOMEntryDelta.objects.filter(part=instance).values_list('bom_file_id', flat=True).distinct())
+    invalidate_master_index(_with_delta_revisions(bom_file_ids))
+
+
+def _deleted_along(revision, origin):
+    if isinstance(origin, QuerySet):
+        return origin.filter(pk=revision.pk).exists()
+    if isinstance(origin, User):
+        return revision.user_id == origin.pk
+    return False
+
+
+@receiver(pre_delete, sender=BOMFile)
+def compact_revisions_on_delete(sender, instance, origin=None, **kwargs):
+    # Later revisions stored as deltas need this file's entries; store them in full first
+    for revision in instance.next_revisions.filter(delta_depth__gt=0):
+        if not _deleted_along(revision, origin):
+            compact_revision(revision)
@@ -1,3 +1,1030 @@
-from django.test import TestCase
+import hashlib
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+import zipfile
+from datetime import timedelta
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from bom_compare import urls as root_urls
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+import openpyxl
+from docx import Document
+
+from .comparison import build_parts_map, compare_parts_maps, iter_parsed_targets, lines_by_key, perform_comparison
+from .designators import canonical_designators, parse_designators
+from .admin import part_key_search
+from .aliases import ManufacturerResolver, get_manufacturer_resolver
+from .benchmarks import run_benchmarks, synthetic_entries, write_pdf
+from .bulk_import import run_import
+from .instrumentation import metrics, reset_metrics, span
+from .ingestion import bulk_ingest_entries, ingest_revision
+from .keys import normalize_manufacturer, normalize_mpn
+from .master_index import build_master_index, get_master_parts_map
+from .matrix import jaccard, key_sets, master_key_sets
+from . import async_views, urls as bom_urls
+from .models import (
+    BOMEntry, BOMEntryDelta, BOMFile, ComparisonJob, ComparisonResult, ComparisonResultRow, ImportedFile,
+    ManufacturerAlias, Part,
+)
+from .parse_cache import cache_key, get_cached_entries, parse_cache_stats, store_entries
+from .parser_factory import get_bom_parser
+from . import parsers
+from .parsers import CSVParser, DOCXParser, PDFParser, TXTParser, UnsupportedTableLayout, iter_docx_table_rows
+from .records import BOMLine
+from .queries import bom_entries, bom_entries_page, encode_cursor, iter_bom_data_json
+from .jobs import claim_next_job, run_pending_jobs
+from .uploads import SpoolReader, UploadError, fcntl, parse_spooled_file, write_chunk
+from .where_used import find_parts, has_mpn_search_index
+
+
+class EntryRecordTests(SimpleTestCase):
+    def test_parsed_entries_are_interned_records(self):
+        parser = CSVParser()
+        entries = parser._extract_bom_data(parser.required_columns, [['C1 C2', '2', ' GRM188 ', 'Murata']])
+        self.assertEqual(entries, [BOMLine('GRM188', 'Murata', 2, 'C1 C2')])
+        self.assertIs(entries[0].mpn, sys.intern('GRM188'))
+
+    def test_comparison_output_converts_to_dicts(self):
+        result = perform_comparison(
+            [BOMLine('A', 'X', 2, 'C1 C2'), BOMLine('B', 'X', 1, 'R1')],
+            [BOMLine('A', 'X', 2, 'C2 C1'), BOMLine('B', 'X', 2, 'R1 R2')],
+        )
+        identical, changed = result['matching_parts']
+        self.assertEqual(identical.as_dict(), {
+            'mpn': 'A', 'manufacturer': 'X', 'quantity': 2, 'designators': 'C1 C2', 'status': 'Identical',
+        })
+        self.assertEqual(changed.as_dict(), {
+            'mpn': 'B', 'manufacturer': 'X', 'master_quantity': 1, 'target_quantity': 2,
+            'master_designators': 'R1', 'target_designators': 'R1 R2',
+            'added_designators': 'R2', 'removed_designators': '', 'status': 'Quantity/Designator Changed',
+        })
+
+
+class DelimitedTextParserTests(SimpleTestCase):
+    HEADER = 'Reference designators\tQuantity\tIdentified MPN\tIdentified manufacturer'
+    ROWS = ['X1\t1\t"SDDC 1,5/ 2-PV-3,5"\tPhoenix Contact', '"R1, R2"\t2\tRC0603\tWürth']
+    EXPECTED = [BOMLine('SDDC 1,5/ 2-PV-3,5', 'Phoenix Contact', 1, 'X1'), BOMLine('RC0603', 'Würth', 2, 'R1, R2')]
+
+    def _parse(self, parser, text, encoding):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bom')
+            with open(path, 'wb') as f:
+                f.write(text.encode(encoding))
+            return parser.parse(path)
+
+    def test_encodings_are_detected(self):
+        text = '\r\n'.join([self.HEADER] + self.ROWS) + '\r\n'
+        for encoding in ('utf-8', 'utf-8-sig', 'utf-16', 'utf-16-le', 'cp1252'):
+            with self.subTest(encoding=encoding):
+                self.assertEqual(self._parse(TXTParser(), text, encoding), self.EXPECTED)
+
+    def test_delimiter_is_sniffed(self):
+        for delimiter in (',', ';', '|'):
+            text = '\n'.join([self.HEADER] + self.ROWS).replace('\t', delimiter) + '\n'
+            with self.subTest(delimiter=delimiter):
+                self.assertEqual(self._parse(CSVParser(), text, 'utf-8'), self.EXPECTED)
+
+    def test_rows_beyond_the_sniffed_prefix(self):
+        parser = CSVParser()
+        parser.sniff_size = 128
+        rows = [f'C{i},1,MPN-{i},Würth' for i in range(200)]
+        entries = self._parse(parser, '\n'.join([self.HEADER.replace('\t', ',')] + rows), 'cp1252')
+        self.assertEqual(len(entries), 200)
+        self.assertEqual(entries[-1], BOMLine('MPN-199', 'Würth', 1, 'C199'))
+
+    def test_cp1252_past_the_sniffed_prefix(self):
+        parser = CSVParser()
+        parser.sniff_size = 128
+        rows = [f'C{i},1,MPN-{i},Murata' for i in range(50)] + ['C50,1,10µF ±10%,Würth']
+        entries = self._parse(parser, '\n'.join([self.HEADER.replace('\t', ',')] + rows), 'cp1252')
+        self.assertEqual(len(entries), 51)
+        self.assertEqual(entries[-1], BOMLine('10µF ±10%', 'Würth', 1, 'C50'))
+
+
+class ParseCacheTests(TestCase):
+    HEADER = 'Reference designators,Quantity,Identified MPN,Identified manufacturer'
+
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.enterContext(override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'bom_parse': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': os.path.join(cache_dir.name, 'parse'),
+                'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2},
+            },
+        }, BOM_PARSE_WORKERS=1))
+        self.directory = cache_dir.name
+
+    def _target(self, name, rows):
+        content = '\n'.join([self.HEADER] + rows).encode()
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path, name, hashlib.sha256(content).hexdigest()
+
+    def _parse(self, *targets):
+        with mock.patch.object(CSVParser, 'parse', autospec=True, side_effect=CSVParser.parse) as parse:
+            results = sorted(iter_parsed_targets(list(targets)))
+        return [entries for _, entries, _ in results], parse.call_count
+
+    def test_identical_content_is_parsed_once(self):
+        first = self._target('first.csv', ['C1,1,GRM188,Murata'])
+        # Same bytes under another name
+        renamed = (first[0], 'renamed.csv', first[2])
+        other = self._target('other.csv', ['C1,2,GRM188,Murata'])
+
+        self.assertEqual(self._parse(first), ([[BOMLine('GRM188', 'Murata', 1, 'C1')]], 1))
+        self.assertEqual(self._parse(renamed), ([[BOMLine('GRM188', 'Murata', 1, 'C1')]], 0))
+        self.assertEqual(self._parse(other), ([[BOMLine('GRM188', 'Murata', 2, 'C1')]], 1))
+        self.assertEqual(parse_cache_stats(), {'hits': 1, 'misses': 2, 'hit_ratio': 1 / 3})
+
+        # A new alias table changes what parsing yields, so earlier parses no longer apply
+        ManufacturerAlias.objects.create(alias='Murata', canonical='Murata Manufacturing')
+        self.assertEqual(self._parse(first), ([[BOMLine('GRM188', 'Murata Manufacturing', 1, 'C1')]], 1))
+
+    def test_cache_is_bounded(self):
+        parser = CSVParser()
+        for i in range(20):
+            store_entries(parser, f'{i:064x}', [BOMLine(f'MPN-{i}', 'TDK', 1, 'C1')])
+        # Looked up directly: counting hits would write to, and cull, the cache
+        cache = caches['bom_parse']
+        cached = [i for i in range(20) if cache.has_key(cache_key(parser, f'{i:064x}'))]
+        self.assertLessEqual(len(cached), 4)
+        self.assertIn(19, cached)
+
+
+class PDFParserTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'bom.pdf')
+        self.entries = synthetic_entries(100)
+
+    def _parse(self, parser=None):
+        """Parses the PDF, returning its entries and the (1-based) numbers of the pages extracted in-process."""
+        extracted = []
+        page_tables = parsers._page_tables
+
+        def record_page(page):
+            extracted.append(page.page_number)
+            return page_tables(page)
+
+        with mock.patch('bom.parsers._page_tables', side_effect=record_page):
+            return (parser or PDFParser()).parse(self.path), extracted
+
+    def test_table_spanning_pages(self):
+        write_pdf(self.path, self.entries, rows_per_page=40, repeat_header=False, cover_text='Bill of materials, MPN list')
+        with mock.patch.object(PDFParser, '_extract_bom_data', autospec=True, side_effect=PDFParser._extract_bom_data) as extract:
+            entries, extracted = self._parse()
+        self.assertEqual(entries, self.entries)
+        # The cover page has no header, so it isn't searched for tables
+        self.assertEqual(extracted, [2, 3, 4])
+        self.assertEqual(len(extract.call_args.args[2]), 100)
+
+    def test_repeated_headers_are_dropped(self):
+        write_pdf(self.path, self.entries, rows_per_page=40)
+        with mock.patch.object(PDFParser, '_extract_bom_data', autospec=True, side_effect=PDFParser._extract_bom_data) as extract:
+            entries, _ = self._parse()
+        self.assertEqual(entries, self.entries)
+        _, headers, rows = extract.call_args.args
+        self.assertEqual(len(rows), 100)
+        self.assertNotIn(headers, [[str(cell) for cell in row] for row in rows])
+
+    def test_parallel_extraction_matches_serial(self):
+        write_pdf(self.path, self.entries)
+        parser = PDFParser()
+        parser.page_workers = 2
+        parser.parallel_min_pages = 2
+        entries, extracted = self._parse(parser)
+        self.assertEqual(entries, self.entries)
+        # Every page has the header, so all were extracted by the pool
+        self.assertEqual(extracted, [])
+        self.assertEqual(self._parse()[0], entries)
+
+
+class DOCXParserTests(SimpleTestCase):
+    def _document(self, path, rows):
+        document = Document()
+        document.add_paragraph('Bill of materials')
+        document.add_table(rows=1, cols=2).cell(0, 0).text = 'Revision'
+        table = document.add_table(rows=len(rows), cols=len(rows[0]))
+        for table_row, row in zip(table.rows, rows):
+            for cell, value in zip(table_row.cells, row):
+                cell.text = value
+        document.save(path)
+        return table
+
+    def test_streamed_table_matches_python_docx(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bom.docx')
+            self._document(path, [CSVParser.required_columns, ['C1 C2', '2', 'GRM188', 'Murata'], ['R1', '1', 'RC0603', 'Yageo']])
+            self.assertEqual(len(list(iter_docx_table_rows(path, CSVParser.required_columns))), 3)
+            parser = DOCXParser()
+            self.assertEqual(parser.parse(path), [BOMLine('GRM188', 'Murata', 2, 'C1 C2'), BOMLine('RC0603', 'Yageo', 1, 'R1')])
+            self.assertEqual(parser.parse(path), parser._parse_document(path))
+
+    def test_merged_cells_fall_back_to_python_docx(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bom.docx')
+            table = self._document(path, [CSVParser.required_columns, ['C1', '1', 'GRM188', 'Murata'], ['C2', '1', 'X', 'Y']])
+            table.cell(2, 2).merge(table.cell(2, 3))
+            table.part.document.save(path)
+            with self.assertRaises(UnsupportedTableLayout):
+                list(iter_docx_table_rows(path, CSVParser.required_columns))
+            self.assertEqual(DOCXParser().parse(path)[0], BOMLine('GRM188', 'Murata', 1, 'C1'))
+
+
+class DesignatorTests(SimpleTestCase):
+    def test_ranges_are_expanded(self):
+        self.assertEqual(parse_designators('R1-R3, c7;R5 - 6'), {'R1', 'R2', 'R3', 'C7', 'R5', 'R6'})
+        # Not a range of the same prefix, so kept as written
+        self.assertEqual(parse_designators('R1-C3 U1A'), {'R1-C3', 'U1A'})
+
+    def test_canonical_form(self):
+        self.assertEqual(canonical_designators('C9 C1 C3'), 'C1 C3 C9')
+        self.assertEqual(canonical_designators('R4 R2 R1 R3 R10'), 'R1-R4 R10')
+        self.assertEqual(canonical_designators('R1-R4'), canonical_designators('R1 R2 R3 R4'))
+
+    def test_comparison_reports_designator_changes(self):
+        master = [
+            BOMLine('A', 'X', 3, 'C1 C3 C9'),
+            BOMLine('B', 'X', 4, 'R1-R4'),
+        ]
+        target = [
+            BOMLine('A', 'X', 3, 'C9 C1 C3'),
+            BOMLine('B', 'X', 4, 'R1 R2 R3 R5'),
+        ]
+        result = perform_comparison(master, target)
+        self.assertEqual(result['summary']['perfectly_matching'], 1)
+        changed = result['matching_parts'][1]
+        self.assertEqual((changed.added_designators, changed.removed_designators), ('R5', 'R4'))
+
+
+class BOMDataTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='engineer', password='secret')
+        self.client.force_login(self.user)
+
+    def _create_bom(self, entry_count):
+        bom_file = BOMFile.objects.create(user=self.user, name=f'{entry_count} lines', file='boms/bom.xlsx', is_master=True)
+        parts = Part.objects.bulk_create(
+            [Part(mpn=f'MPN-{entry_count}-{i}', manufacturer='Murata').set_keys() for i in range(entry_count)]
+        )
+        BOMEntry.objects.bulk_create(
+            [BOMEntry(bom_file=bom_file, part=part, quantity=1, reference_designators=f'C{i}') for i, part in enumerate(parts)]
+        )
+        return bom_file
+
+    def _get_bom_data(self, bom_file):
+        response = self.client.get(reverse('get_bom_data', args=[bom_file.pk]))
+        return json.loads(b''.join(response.streaming_content))
+
+
+class BOMDataQueryCountTests(BOMDataTestCase):
+    """Loading a BOM must not issue a query per entry."""
+
+    def test_query_count_is_constant(self):
+        small = self._create_bom(3)
+        large = self._create_bom(300)
+        # Session, user, ETag and Last-Modified lookups, BOM file lookup, entries
+        # existence check and the entries query
+        with self.assertNumQueries(7):
+            data = self._get_bom_data(small)
+        self.assertEqual(len(data['entries']), 3)
+        with self.assertNumQueries(7):
+            data = self._get_bom_data(large)
+        self.assertEqual(len(data['entries']), 300)
+        self.assertEqual(data['file_name'], '300 lines')
+        self.assertEqual(
+            data['entries'][0],
+            {'mpn': 'MPN-300-0', 'manufacturer': 'Murata', 'quantity': 1, 'designators': 'C0'},
+        )
+
+    def test_master_index_query_count_is_constant(self):
+        query_counts = []
+        for bom_file in (self._create_bom(3), self._create_bom(300)):
+            with CaptureQueriesContext(connection) as queries:
+                parts_map = build_master_index(bom_file)
+            query_counts.append(len(queries))
+            self.assertEqual(len(parts_map), bom_file.entries.count())
+        self.assertEqual(query_counts[0], query_counts[1])
+
+
+class BOMDataAPITests(BOMDataTestCase):
+    def _get_page(self, bom_file, **params):
+        response = self.client.get(reverse('get_bom_data', args=[bom_file.pk]), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_cursor_pagination_visits_every_entry_once(self):
+        bom_file = self._create_bom(25)
+        seen = []
+        params = {'limit': 10, 'sort': '-designators'}
+        while True:
+            page = self._get_page(bom_file, **params)
+            self.assertEqual(page['total'], 25)
+            seen.extend(entry['designators'] for entry in page['entries'])
+            if not page['next_cursor']:
+                break
+            params['cursor'] = page['next_cursor']
+        self.assertEqual(seen, sorted((f'C{i}' for i in range(25)), reverse=True))
+
+    def test_default_order_is_file_order(self):
+        bom_file = self._create_bom(12)
+        page = self._get_page(bom_file, limit=5)
+        page = self._get_page(bom_file, limit=5, cursor=page['next_cursor'])
+        self.assertEqual([entry['designators'] for entry in page['entries']], ['C5', 'C6', 'C7', 'C8', 'C9'])
+
+    def test_search(self):
+        bom_file = self._create_bom(25)
+        page = self._get_page(bom_file, q='mpn-25-2')
+        self.assertEqual(page['total'], 6)  # MPN-25-2 and MPN-25-20 to MPN-25-24
+        self.assertEqual(self._get_page(bom_file, q='C13')['entries'][0]['mpn'], 'MPN-25-13')
+
+    def test_invalid_parameters(self):
+        bom_file = self._create_bom(3)
+        url = reverse('get_bom_data', args=[bom_file.pk])
+        self.assertEqual(self.client.get(url, {'sort': 'price'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'cursor': 'not-a-cursor'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'limit': '0'}).status_code, 400)
+
+    def test_cursor_must_match_sort(self):
+        bom_file = self._create_bom(3)
+        url = reverse('get_bom_data', args=[bom_file.pk])
+        mpn_cursor = self.client.get(url, {'sort': 'mpn', 'limit': 1}).json()['next_cursor']
+        for cursor in (encode_cursor({'a': 1}, 1), encode_cursor('abc', 1), mpn_cursor):
+            response = self.client.get(url, {'sort': 'quantity', 'cursor': cursor})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['error'], 'Invalid cursor.')
+        response = self.client.get(url, {'sort': 'mpn', 'cursor': encode_cursor(True, 1)})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unchanged_bom_returns_not_modified(self):
+        bom_file = self._create_bom(3)
+        url = reverse('get_bom_data', args=[bom_file.pk])
+        etag = self.client.get(url, {'limit': 10})['ETag']
+        self.assertEqual(self.client.get(url, {'limit': 10}, headers={'if-none-match': etag}).status_code, 304)
+
+        entry = bom_file.entries.first()
+        entry.quantity = 5
+        entry.save()
+        self.assertEqual(self.client.get(url, {'limit': 10}, headers={'if-none-match': etag}).status_code, 200)
+
+
+class MasterUploadTests(BOMDataTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+
+    def _workbook(self, rows):
+        workbook = openpyxl.Workbook()
+        sheet = workbook.active
+        for row in rows:
+            sheet.append(row)
+        content = io.BytesIO()
+        workbook.save(content)
+        return SimpleUploadedFile('board.xlsx', content.getvalue())
+
+    def _upload(self, rows):
+        return self.client.post(reverse('upload_master_bom'), {'name': 'Board', 'file': self._workbook(rows)})
+
+    def test_upload_round_trip(self):
+        response = self._upload([
+            ['Reference designators', 'Quantity', 'Identified MPN', 'Identified manufacturer'],
+            ['C1, C2', 2, 'GRM188R61A106', 'Murata'],
+            ['R1', 1, None, 'Yageo'],
+            ['R2', 1, 'RC0603FR-0710K', None],
+            [None, 1, 'LM358', 'TI'],
+        ])
+        self.assertRedirects(response, reverse('home'))
+
+        bom_file = BOMFile.objects.get(name='Board')
+        self.assertEqual(self._get_bom_data(bom_file)['entries'], [
+            {'mpn': 'GRM188R61A106', 'manufacturer': 'Murata', 'quantity': 2, 'designators': 'C1, C2'},
+            {'mpn': 'LM358', 'manufacturer': 'TI', 'quantity': 1, 'designators': ''},
+        ])
+        self.assertFalse(Part.objects.filter(Q(mpn='None') | Q(manufacturer='None')).exists())
+
+    def test_missing_columns_are_rejected(self):
+        response = self._upload([['Designator', 'Qty', 'MPN'], ['C1', 1, 'GRM188R61A106']])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('required columns', str(response.context['form'].errors['file']))
+        self.assertFalse(BOMFile.objects.exists())
+
+
+class MasterRevisionTests(BOMDataTestCase):
+    def _entries(self, count, changed=()):
+        return [
+            BOMLine(f'MPN-{i}', 'TDK', 2 if i in changed else 1, f'C{i}')
+            for i in range(count)
+        ]
+
+    def _upload(self, entries, previous=None):
+        bom_file = BOMFile.objects.create(
+            user=self.user, name='Board', file='boms/bom.xlsx', is_master=True, previous_revision=previous,
+        )
+        ingest_revision(bom_file, entries)
+        return bom_file
+
+    def test_revision_is_stored_as_delta(self):
+        first = self._upload(self._entries(100))
+        entries = self._entries(100, changed={3})[:-1] + [BOMLine('NEW', 'TDK', 1, 'U1')]
+        second = self._upload(entries, previous=first)
+
+        self.assertEqual((second.revision, second.delta_depth), (2, 1))
+        self.assertFalse(second.entries.exists())
+        self.assertEqual(second.entry_deltas.count(), 3)
+        self.assertEqual(list(bom_entries(second)), entries)
+        self.assertEqual(get_master_parts_map(second), build_parts_map(entries))
+
+        data = self._get_bom_data(second)
+        self.assertEqual(data['entries'], [entry.as_dict() for entry in entries])
+        page = self.client.get(reverse('get_bom_data', args=[second.pk]), {'q': 'new'}).json()
+        self.assertEqual(page['entries'], [entries[-1].as_dict()])
+
+    def test_chain_is_compacted_after_max_deltas(self):
+        revision = self._upload(self._entries(50))
+        with self.settings(BOM_REVISION_MAX_DELTAS=2):
+            for changed in range(3):
+                revision = self._upload(self._entries(50, changed={changed}), previous=revision)
+        self.assertEqual(revision.delta_depth, 0)
+        self.assertEqual(revision.entries.count(), 50)
+
+    def test_large_changes_are_stored_in_full(self):
+        first = self._upload(self._entries(10))
+        second = self._upload(self._entries(10, changed=set(range(8))), previous=first)
+        self.assertEqual(second.delta_depth, 0)
+        self.assertFalse(BOMEntryDelta.objects.exists())
+
+    def test_deleting_predecessor_keeps_later_revisions(self):
+        first = self._upload(self._entries(20))
+        second = self._upload(self._entries(20, changed={1}), previous=first)
+        third = self._upload(self._entries(20, changed={1, 2}), previous=second)
+        first.delete()
+
+        second.refresh_from_db()
+        third.refresh_from_db()
+        self.assertEqual((second.delta_depth, third.delta_depth), (0, 1))
+        self.assertEqual(list(bom_entries(third)), self._entries(20, changed={1, 2}))
+
+    def test_editing_predecessor_keeps_later_revisions(self):
+        first = self._upload(self._entries(20))
+        second = self._upload(self._entries(20, changed={1}), previous=first)
+        third = self._upload(self._entries(20, changed={1, 2}), previous=second)
+        entry = first.entries.get(part__mpn='MPN-0')
+        entry.quantity = 7
+        entry.save()
+        first.entries.get(part__mpn='MPN-5').delete()
+
+        second.refresh_from_db()
+        third.refresh_from_db()
+        self.assertEqual((second.delta_depth, third.delta_depth), (0, 1))
+        self.assertEqual(list(bom_entries(second)), self._entries(20, changed={1}))
+        self.assertEqual(list(bom_entries(third)), self._entries(20, changed={1, 2}))
+        self.assertEqual(first.entries.get(part__mpn='MPN-0').quantity, 7)
+
+
+class PartKeyTests(BOMDataTestCase):
+    def test_normalization(self):
+        self.assertEqual(normalize_mpn(' grm188 r60j '), 'GRM188R60J')
+        self.assertEqual(normalize_manufacturer('Texas Instruments, Inc.'), 'TEXAS INSTRUMENTS')
+        self.assertEqual(normalize_manufacturer('C&K'), 'C&K')
+        self.assertEqual(normalize_manufacturer('Ltd'), 'LTD')
+
+    def test_ingested_parts_are_searchable_by_key(self):
+        bom_file = BOMFile.objects.create(user=self.user, name='Board', file='boms/bom.xlsx', is_master=True)
+        ingest_revision(bom_file, [
+            BOMLine('GRM188R60J475KE19D', 'Murata Manufacturing Co., Ltd.', 1, 'C1'),
+            BOMLine('TPS61025DRCR', 'Texas Instruments', 1, 'U1'),
+        ])
+        self.assertEqual(Part.objects.get(mpn='GRM188R60J475KE19D').manufacturer_key, 'MURATA MANUFACTURING')
+        self.assertEqual([part.mpn for part in part_key_search(Part.objects.all(), 'grm 188')], ['GRM188R60J475KE19D'])
+        self.assertEqual([part.mpn for part in part_key_search(Part.objects.all(), 'texas')], ['TPS61025DRCR'])
+
+
+class ManufacturerResolverTests(SimpleTestCase):
+    def setUp(self):
+        self.resolver = ManufacturerResolver([
+            ('Wurth', 'Würth Elektronik'),
+            ('ON Semiconductor', 'onsemi'),
+            ('NXP Semiconductors', 'NXP'),
+            ('Texas Instruments', 'Texas Instruments'),
+        ])
+
+    def test_exact_and_normalized_aliases(self):
+        self.assertEqual(self.resolver.resolve('Wurth'), 'Würth Elektronik')
+        self.assertEqual(self.resolver.resolve('WURTH.'), 'Würth Elektronik')
+        self.assertEqual(self.resolver.resolve('Texas Instruments, Inc.'), 'Texas Instruments')
+
+    def test_fuzzy_matches(self):
+        self.assertEqual(self.resolver.resolve('WVorth Elektronik'), 'Würth Elektronik')
+        self.assertEqual(self.resolver.resolve('Texas Instrument'), 'Texas Instruments')
+        self.assertEqual(self.resolver.resolve('ON Semiconductors'), 'onsemi')
+
+    def test_unrelated_names_are_kept(self):
+        # Shares most trigrams with two aliases but is a different vendor
+        self.assertEqual(self.resolver.resolve('Nordic Semiconductor'), 'Nordic Semiconductor')
+        self.assertEqual(self.resolver.resolve('Generic part'), 'Generic part')
+
+    def test_applied_while_parsing(self):
+        parser = CSVParser()
+        parser.manufacturer_resolver = self.resolver
+        entries = parser._extract_bom_data(
+            parser.required_columns,
+            [['C1', '1', 'GRM188', 'Wurth'], ['C2', '1', '744784115A', 'WVorth Elektronik']],
+        )
+        self.assertEqual({entry.manufacturer for entry in entries}, {'Würth Elektronik'})
+
+
+class ManufacturerAliasTableTests(TestCase):
+    def test_resolver_follows_alias_table(self):
+        self.assertIsNone(get_manufacturer_resolver())
+        ManufacturerAlias.objects.create(alias='Wurth', canonical='Würth Elektronik')
+        resolver = get_manufacturer_resolver()
+        self.assertIs(get_manufacturer_resolver(), resolver)
+        ManufacturerAlias.objects.create(alias='TI', canonical='Texas Instruments')
+        self.assertEqual(get_manufacturer_resolver().resolve('TI'), 'Texas Instruments')
+
+    def test_alias_added_after_master_was_ingested(self):
+        user = User.objects.create_user(username='engineer')
+        master = BOMFile.objects.create(user=user, name='Board', file='boms/bom.xlsx', is_master=True)
+        ingest_revision(master, [BOMLine('LM358', 'TI', 1, 'U1'), BOMLine('GRM188', 'Murata', 2, 'C1, C2')])
+        self.assertIn(('LM358', 'TI'), get_master_parts_map(master))
+
+        ManufacturerAlias.objects.create(alias='TI', canonical='Texas Instruments')
+        target = [BOMLine('LM358', 'Texas Instruments', 1, 'U1'), BOMLine('GRM188', 'Murata', 2, 'C1, C2')]
+        parts_map = get_master_parts_map(master)
+        self.assertEqual(parts_map, build_parts_map(target))
+        result = compare_parts_maps(parts_map, lines_by_key(target))
+        self.assertEqual((result['summary']['perfectly_matching'], result['added_parts'], result['removed_parts']), (2, [], []))
+        self.assertEqual(master_key_sets([master]), [key_sets(build_parts_map(target))])
+
+
+class BenchmarkHarnessTests(BOMDataTestCase):
+    def test_report(self):
+        with tempfile.TemporaryDirectory() as work_dir, override_settings(MEDIA_ROOT=work_dir):
+            report = run_benchmarks(
+                [30], ['csv', 'txt'], work_dir,
+                make_bom_file=lambda path: BOMFile.objects.create(user=self.user, name='bench', file=os.path.basename(path), is_master=True),
+                get_bom_data=self._get_bom_data,
+                trace_memory=False,
+            )
+        names = [result['name'] for result in report['results']]
+        self.assertEqual(names[:4], ['parse:csv', 'parse:txt', 'parse_xlsx_and_save', 'get_bom_data'])
+        self.assertIn('perform_comparison', names)
+        self.assertTrue(all(result['rows'] == 30 and result['seconds'] >= 0 for result in report['results']))
+        json.dumps(report)
+
+
+@override_settings(BOM_PARSE_WORKERS=1)
+class ComparisonMatrixTests(BOMDataTestCase):
+    def _master(self, name, mpns):
+        bom_file = BOMFile.objects.create(user=self.user, name=name, file='boms/bom.xlsx', is_master=True)
+        bulk_ingest_entries(bom_file, [
+            BOMLine(mpn, 'TDK', 1, f'C{i}') for i, mpn in enumerate(mpns)
+        ])
+        return bom_file
+
+    def test_masters_are_ranked_per_target(self):
+        self.assertEqual(jaccard(frozenset({1, 2}), frozenset({2, 3})), 1 / 3)
+        far = self._master('Far', ['A', 'B', 'X', 'Y'])
+        near = self._master('Near', ['A', 'B', 'C'])
+        lines = ['Reference designators,Quantity,Identified MPN,Identified manufacturer']
+        lines += [f'C{i},1,{mpn},TDK' for i, mpn in enumerate(['A', 'B', 'C', 'D'])]
+
+        response = self.client.post(reverse('compare_matrix'), {
+            'master_bom_ids': [far.pk, near.pk],
+            'target_files': [
+                SimpleUploadedFile('target.csv', '\n'.join(lines).encode()),
+                SimpleUploadedFile('notes.md', b'not a bom'),
+            ],
+        })
+        self.assertEqual(response.status_code, 200)
+        good, bad = response.json()['targets']
+        self.assertEqual([score['master_name'] for score in good['ranking']], ['Near', 'Far'])
+        self.assertEqual(good['ranking'][0]['similarity'], 3 / 4)
+        self.assertEqual(good['ranking'][0]['line_similarity'], 3 / 4)
+        self.assertEqual(good['ranking'][1]['only_in_master'], 2)
+        self.assertEqual(bad['ranking'], [])
+        self.assertIsNotNone(bad['error'])
+
+    def test_requires_own_masters(self):
+        other = User.objects.create_user(username='other', password='secret')
+        bom_file = BOMFile.objects.create(user=other, name='Theirs', file='boms/bom.xlsx', is_master=True)
+        response = self.client.post(reverse('compare_matrix'), {
+            'master_bom_ids': [bom_file.pk], 'target_files': [SimpleUploadedFile('t.csv', b'x')],
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_master_ids(self):
+        response = self.client.post(reverse('compare_matrix'), {
+            'master_bom_ids': ['abc'], 'target_files': [SimpleUploadedFile('t.csv', b'x')],
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Select at least one master BOM.')
+
+
+@override_settings(BOM_COMPARISON_WORKER='external')
+@override_settings(BOM_COMPARISON_WORKER='external', BOM_PARSE_WORKERS=1)
+class ComparisonJobTests(BOMDataTestCase):
+    HEADER = 'Reference designators,Quantity,Identified MPN,Identified manufacturer'
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+        self.master = self._create_bom(3)
+
+    def _target(self, name, rows):
+        return SimpleUploadedFile(name, '\n'.join([self.HEADER] + rows).encode())
+
+    def _enqueue(self, *files):
+        response = self.client.post(reverse('compare_boms', args=[self.master.pk]), {'target_files': list(files)})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status_url'], reverse('comparison_job_status', args=[response.json()['job_id']]))
+        return ComparisonJob.objects.get(pk=response.json()['job_id'])
+
+    def test_failed_file_does_not_fail_the_job(self):
+        job = self._enqueue(
+            self._target('good.csv', [f'C{i},1,MPN-3-{i},Murata' for i in range(3)]),
+            SimpleUploadedFile('bad.csv', b'Part,Qty\nX,1\n'),
+        )
+        self.assertEqual(run_pending_jobs(), 1)
+
+        status = self.client.get(reverse('comparison_job_status', args=[job.pk])).json()
+        self.assertEqual((status['status'], status['completed'], status['total']), (ComparisonJob.STATUS_DONE, 2, 2))
+        self.assertEqual([f['status'] for f in status['files']], [ComparisonJob.STATUS_DONE, ComparisonJob.STATUS_FAILED])
+        self.assertIn('bad.csv', status['files'][1]['error'])
+        result = job.results.get()
+        self.assertEqual((result.position, result.perfectly_matching), (0, 3))
+        self.assertFalse(any(job_file.file for job_file in job.files.all()))
+
+    def test_job_failure(self):
+        job = self._enqueue(self._target('good.csv', ['C0,1,MPN-3-0,Murata']))
+        with mock.patch('bom.jobs.get_master_parts_map', side_effect=RuntimeError('index unavailable')), \
+                self.assertLogs('bom.jobs', 'ERROR'):
+            run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (ComparisonJob.STATUS_FAILED, 'index unavailable'))
+        job_file = job.files.get()
+        self.assertEqual((job_file.status, job_file.file.name), (ComparisonJob.STATUS_FAILED, ''))
+        self.assertIsNone(claim_next_job())
+
+    def test_job_is_claimed_once(self):
+        job = self._enqueue(self._target('good.csv', ['C0,1,MPN-3-0,Murata']))
+        stale = ComparisonJob.objects.get(pk=job.pk)
+        self.assertEqual(claim_next_job(), job)
+        # A worker that read the job as pending before it was claimed must not claim it too
+        with mock.patch('bom.jobs._claimable_jobs') as claimable:
+            claimable.return_value.order_by.return_value.first.side_effect = [stale, None]
+            self.assertIsNone(claim_next_job())
+        self.assertIsNone(claim_next_job())
+
+    def test_job_of_dead_worker_is_run_again(self):
+        job = self._enqueue(
+            self._target('first.csv', ['C0,1,MPN-3-0,Murata']),
+            self._target('second.csv', ['C1,1,MPN-3-1,Murata']),
+        )
+        # The worker finished the first file and died while saving the second one
+        claim_next_job()
+        first, second = job.files.all()
+        ComparisonResult.objects.create(job=job, position=0, target_file_name='first.csv', perfectly_matching=1)
+        ComparisonResult.objects.create(job=job, position=1, target_file_name='second.csv')
+        first.file.delete(save=False)
+        first.status = ComparisonJob.STATUS_DONE
+        first.save()
+        self.assertIsNone(claim_next_job())
+
+        ComparisonJob.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        with self.assertLogs('bom.jobs', 'WARNING'):
+            self.assertEqual(run_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ComparisonJob.STATUS_DONE)
+        self.assertEqual(
+            list(job.results.values_list('position', 'perfectly_matching')), [(0, 1), (1, 1)],
+        )
+
+
+class ChunkedUploadTests(BOMDataTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        # Queued jobs are left in the queue rather than run by a worker thread
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name, BOM_COMPARISON_WORKER='external'))
+
+    def _put(self, url, offset, data):
+        return self.client.put(f'{url}?offset={offset}', data, content_type='application/octet-stream')
+
+    def test_resumable_upload_is_parsed_and_queued(self):
+        master = self._create_bom(3)
+        lines = ['Reference designators;Quantity;Identified MPN;Identified manufacturer']
+        lines += [f'C{i};1;MPN-3-{i};Murata' for i in range(3)]
+        content = '\n'.join(lines).encode()
+
+        response = self.client.post(
+            reverse('create_chunked_comparison', args=[master.pk]),
+            json.dumps({'files': [{'name': 'target.csv', 'size': len(content)}]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        created = response.json()
+        self.assertEqual(created['status'], ComparisonJob.STATUS_RECEIVING)
+        url = created['files'][0]['upload_url']
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(self._put(url, 0, content[:40]).json()['received'], 40)
+        self.assertEqual(len(callbacks), 1)
+        # A chunk sent twice, or past the declared size, is rejected with the offset to resume from
+        response = self._put(url, 0, content[:40])
+        self.assertEqual((response.status_code, response.json()['received']), (409, 40))
+        self.assertEqual(self._put(url, 40, content[40:] + b'x').status_code, 409)
+        self.assertEqual(self.client.get(url).json()['files'][0]['received'], 40)
+        self._put(url, 40, content[40:])
+
+        job = ComparisonJob.objects.get(pk=created['job_id'])
+        self.assertEqual(job.status, ComparisonJob.STATUS_RECEIVING)
+        job_file = job.files.get()
+        parse_spooled_file(job_file)
+        job.refresh_from_db()
+        job_file.refresh_from_db()
+        self.assertEqual(job.status, ComparisonJob.STATUS_PENDING)
+        self.assertEqual(self._put(url, len(content), b'').status_code, 409)
+
+        # The worker finds the entries in the parse cache instead of parsing again
+        parser = get_bom_parser(job_file.file.path, 'target.csv')
+        entries = get_cached_entries(parser, job_file.content_hash)
+        self.assertEqual(entries, [BOMLine(f'MPN-3-{i}', 'Murata', 1, f'C{i}') for i in range(3)])
+
+    def _create_job(self, size):
+        response = self.client.post(
+            reverse('create_chunked_comparison', args=[self._create_bom(1).pk]),
+            json.dumps({'files': [{'name': 'target.csv', 'size': size}]}),
+            content_type='application/json',
+        )
+        return ComparisonJob.objects.get(pk=response.json()['job_id']), response.json()['files'][0]['upload_url']
+
+    @skipIf(fcntl is None, 'Chunks are only locked where fcntl is available')
+    def test_concurrent_chunks_are_rejected(self):
+        job, url = self._create_job(100)
+        job_file = job.files.get()
+        with self.captureOnCommitCallbacks():
+            self._put(url, 0, b'x' * 40)
+        # Read before that chunk arrived
+        job_file.received = 0
+        with self.assertRaises(UploadError):
+            write_chunk(job_file, 0, io.BytesIO(b'y' * 40), 40)
+        self.assertEqual(job_file.received, 40)
+
+        with open(job_file.file.path, 'rb') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            response = self._put(url, 40, b'y' * 10)
+        self.assertEqual(response.status_code, 409)
+        with open(job_file.file.path, 'rb') as f:
+            self.assertEqual(f.read(), b'x' * 40)
+
+    @override_settings(BOM_UPLOAD_STALL_TIMEOUT=0.2)
+    def test_stalled_upload_is_given_up(self):
+        job, url = self._create_job(10 ** 6)
+        with self.captureOnCommitCallbacks():
+            self._put(url, 0, b'Reference designators,Quantity,Identified MPN,Identified manufacturer\nC1,1,GRM188,Murata\n')
+        job_file = job.files.get()
+        with mock.patch.object(SpoolReader, 'poll_interval', 0.01), \
+                mock.patch.object(SpoolReader, 'drain', autospec=True, side_effect=SpoolReader.drain) as drain, \
+                self.assertLogs('bom.uploads', 'INFO'):
+            parse_spooled_file(job_file)
+        drain.assert_not_called()
+        job_file.refresh_from_db()
+        self.assertEqual((job_file.content_hash, job_file.status), ('', ComparisonJob.STATUS_RECEIVING))
+
+    def test_rejects_unsupported_files(self):
+        response = self.client.post(
+            reverse('create_chunked_comparison', args=[self._create_bom(1).pk]),
+            json.dumps({'files': [{'name': 'notes.md', 'size': 10}]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ComparisonJob.objects.exists())
+
+
+class BulkImportTests(BOMDataTestCase):
+    def setUp(self):
+        super().setUp()
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.work_dir = work_dir.name
+        self.enterContext(override_settings(MEDIA_ROOT=os.path.join(self.work_dir, 'media')))
+
+    def _archive(self, files):
+        path = os.path.join(self.work_dir, 'archive.zip')
+        with zipfile.ZipFile(path, 'w') as archive:
+            for name, content in files.items():
+                archive.writestr(name, content)
+        return path
+
+    def _csv(self, *mpns):
+        lines = ['Reference designators,Quantity,Identified MPN,Identified manufacturer']
+        return '\n'.join(lines + [f'C{i},1,{mpn},TDK' for i, mpn in enumerate(mpns)])
+
+    def test_import_resumes_after_checkpoint(self):
+        path = self._archive({
+            'a/one.csv': self._csv('A', 'B'),
+            'a/two.txt': self._csv('B', 'C'),
+            'broken.csv': 'not a bom',
+            'notes.md': 'skipped',
+            '__MACOSX/a/._one.csv': 'skipped',
+        })
+        report = run_import(path, self.user, files_per_transaction=2, max_workers=1)
+        self.assertEqual((report['files'], report['imported'], report['entries'], report['parts_created']), (3, 2, 4, 3))
+        self.assertEqual(list(report['failures']), ['broken.csv'])
+        self.assertEqual(
+            list(bom_entries(BOMFile.objects.get(name='a/two.txt'))),
+            [BOMLine('B', 'TDK', 1, 'C0'), BOMLine('C', 'TDK', 1, 'C1')],
+        )
+        self.assertEqual(ImportedFile.objects.count(), 3)
+
+        # A second run only picks up what the first one didn't checkpoint
+        ImportedFile.objects.filter(name='a/two.txt').delete()
+        BOMFile.objects.filter(name='a/two.txt').delete()
+        report = run_import(path, self.user, max_workers=1, retry_failed=True)
+        self.assertEqual((report['files'], report['skipped'], report['imported']), (2, 1, 1))
+        self.assertEqual(BOMFile.objects.filter(is_master=True).count(), 2)
+
+    def test_rejects_other_sources(self):
+        path = os.path.join(self.work_dir, 'bom.csv')
+        with open(path, 'w') as f:
+            f.write(self._csv('A'))
+        with self.assertRaises(ValueError):
+            run_import(path, self.user)
+
+
+class WhereUsedTests(BOMDataTestCase):
+    def _master(self, name, entries, previous=None, user=None):
+        bom_file = BOMFile.objects.create(
+            user=user or self.user, name=name, file='boms/bom.xlsx', is_master=True, previous_revision=previous,
+        )
+        ingest_revision(bom_file, entries)
+        return bom_file
+
+    def _where_used(self, **params):
+        response = self.client.get(reverse('part_where_used'), params)
+        self.assertEqual(response.status_code, 200)
+        return {
+            part['mpn']: [(usage['bom_file_name'], usage['revision'], usage['quantity']) for usage in part['usages']]
+            for part in response.json()['parts']
+        }
+
+    def test_usage_across_revisions(self):
+        lines = [BOMLine(f'GRM188R6{i}J475', 'Murata', 1, f'C{i}') for i in range(10)]
+        first = self._master('Board', lines)
+        second = self._master('Board', [lines[0]._replace(quantity=4)] + lines[1:9], previous=first)
+        self.assertEqual(second.delta_depth, 1)
+        # Repeated lines of a part add up
+        self._master('Panel', [lines[0]._replace(quantity=2), lines[0]])
+        self._master('Theirs', lines, user=User.objects.create_user(username='other'))
+
+        self.assertEqual(self._where_used(mpn='grm188r60j475'), {
+            'GRM188R60J475': [('Board', 1, 1), ('Board', 2, 4), ('Panel', 1, 3)],
+        })
+        # Dropped from the second revision
+        self.assertEqual(self._where_used(mpn='GRM188R69'), {'GRM188R69J475': [('Board', 1, 1)]})
+        self.assertEqual(
+            self._where_used(mpn='GRM188R6?J47*', manufacturer='murata inc')['GRM188R68J475'],
+            [('Board', 1, 1), ('Board', 2, 1)],
+        )
+
+        # Admin edits of an entry only change its own revision
+        entry = first.entries.get(part__mpn='GRM188R61J475')
+        entry.quantity = 5
+        entry.save()
+        self.assertEqual(self._where_used(mpn='GRM188R61J475')['GRM188R61J475'], [('Board', 1, 5), ('Board', 2, 1)])
+
+    def test_wildcard_search(self):
+        self._master('Board', [BOMLine(mpn, 'TDK', 1, 'C1') for mpn in ['ABC1XYZ', 'ABCXYZ9', 'XABC[1]']])
+        searches = {'ABCXYZ*': {'ABCXYZ9'}, '*xyz*': {'ABC1XYZ', 'ABCXYZ9'}, '*[1]': {'XABC[1]'}, 'AB?1*': {'ABC1XYZ'}, 'X*Z': set()}
+        self.assertTrue(has_mpn_search_index())
+        for pattern, expected in searches.items():
+            self.assertEqual({part.mpn for part in find_parts(pattern)}, expected, pattern)
+        with mock.patch('bom.where_used.has_mpn_search_index', return_value=False):
+            for pattern, expected in searches.items():
+                self.assertEqual({part.mpn for part in find_parts(pattern)}, expected, pattern)
+
+        self.assertEqual(self.client.get(reverse('part_where_used'), {'mpn': '**'}).status_code, 400)
+        response = self.client.get(reverse('part_where_used'), {'mpn': 'ABC', 'limit': 1}).json()
+        self.assertEqual((len(response['parts']), response['truncated']), (1, True))
+
+
+class AsyncViewTests(BOMDataTestCase):
+    """The async views answer like the sync ones they replace under BOM_ASYNC_VIEWS."""
+
+    def setUp(self):
+        super().setUp()
+        # urls.py picks the views when imported: reload it once the setting is restored
+        self.addCleanup(self._reload_urls)
+        self.enterContext(override_settings(BOM_ASYNC_VIEWS=True))
+        self._reload_urls()
+
+    def _reload_urls(self):
+        importlib.reload(bom_urls)
+        importlib.reload(root_urls)
+        clear_url_caches()
+
+    async def _aget(self, url, params=None, **kwargs):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(url, params or {}, **kwargs)
+        if response.streaming:
+            response.content_bytes = b''.join([chunk async for chunk in response.streaming_content])
+        return response
+
+    async def test_bom_data_matches_sync_view(self):
+        bom_file = await BOMFile.objects.aget(pk=(await sync_to_async(self._create_bom)(2500)).pk)
+        url = reverse('get_bom_data', args=[bom_file.pk])
+        self.assertIs(resolve(url).func, async_views.get_bom_data)
+
+        response = await self._aget(url)
+        expected = await sync_to_async(lambda: ''.join(iter_bom_data_json(bom_file, bom_entries(bom_file))))()
+        self.assertEqual(json.loads(response.content_bytes), json.loads(expected))
+        page = (await self._aget(url, {'limit': 10, 'sort': '-mpn'})).json()
+        entries, next_cursor, total = await sync_to_async(bom_entries_page)(bom_file, search='', sort='-mpn', cursor=None, limit=10)
+        self.assertEqual((page['entries'], page['next_cursor'], page['total']), (entries, next_cursor, total))
+        self.assertEqual((await self._aget(url, {'limit': 0})).status_code, 400)
+
+        etag = response['ETag']
+        self.assertEqual(etag, f'"bom-{bom_file.pk}-v{bom_file.entries_version}"')
+        self.assertEqual((await self._aget(url, headers={'if-none-match': etag})).status_code, 304)
+
+    async def test_job_status_and_summary(self):
+        master = await sync_to_async(self._create_bom)(3)
+        job = await ComparisonJob.objects.acreate(user=self.user, master_bom=master, status=ComparisonJob.STATUS_RUNNING)
+        status = (await self._aget(reverse('comparison_job_status', args=[job.pk]))).json()
+        self.assertEqual(status['status'], ComparisonJob.STATUS_RUNNING)
+        response = await self._aget(reverse('comparison_run_summary', args=[job.pk]))
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+
+        job.status = ComparisonJob.STATUS_DONE
+        await job.asave()
+        result = await ComparisonResult.objects.acreate(job=job, position=0, target_file_name='target.csv', added=300)
+        await ComparisonResultRow.objects.abulk_create([
+            ComparisonResultRow(result=result, category=ComparisonResultRow.CATEGORY_ADDED, mpn=f'NEW-{i}', manufacturer='TDK')
+            for i in range(300)
+        ])
+        response = await self._aget(reverse('comparison_run_summary', args=[job.pk]), {f'p{result.pk}': 2})
+        self.assertEqual(response.status_code, 200)
+        comparison = response.context['all_comparison_results'][0]
+        self.assertEqual(comparison['page_obj'].number, 2)
+        self.assertEqual(
+            [part['mpn'] for part in comparison['results']['added_parts']],
+            [f'NEW-{i}' for i in range(250, 300)],
+        )
+
+
+class InstrumentationTests(BOMDataTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_metrics()
+
+    def test_disabled_by_default(self):
+        self.assertIs(span('parse'), span('comparison'))
+        response = self.client.get(reverse('get_bom_data', args=[self._create_bom(3).pk]), {'limit': 10})
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(metrics()['requests']['count'], 0)
+
+    @override_settings(BOM_INSTRUMENTATION=True)
+    def test_request_metrics(self):
+        bom_file = self._create_bom(3)
+        with self.assertLogs('bom.instrumentation', 'INFO') as logs:
+            response = self.client.get(reverse('get_bom_data', args=[bom_file.pk]), {'limit': 10})
+        self.assertIn('sql;dur=', response['Server-Timing'])
+        self.assertIn(f'/bom/api/bom-data/{bom_file.pk}/ 200', logs.output[0])
+
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        report = self.client.get(reverse('metrics')).json()
+        self.assertTrue(report['enabled'])
+        self.assertEqual(report['requests']['count'], 2)
+        self.assertGreater(report['requests']['sql_queries'], 0)
+
+    @override_settings(BOM_INSTRUMENTATION=True)
+    def test_spans(self):
+        with span('comparison'):
+            perform_comparison([], [])
+        self.assertEqual(metrics()['spans']['comparison']['count'], 2)
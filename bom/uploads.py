@@ -0,0 +1,268 @@
+"""
+Chunked, resumable uploads of comparison target files.
+
+A chunked job is created with the names and sizes of its files and stays in the
+receiving state while their chunks arrive. Chunks are written straight into the job
+file at their offset, and a client that lost its connection asks for the received
+offset and carries on from there. With the first chunk of a file a spool parser
+thread starts reading it as it grows: delimited text is parsed as the bytes arrive,
+other formats are hashed as they arrive and parsed once complete. The entries land
+in the parse cache, so when the last file is in and the job is queued, the worker
+only has to compare.
+"""
+import functools
+import hashlib
+import io
+import logging
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: concurrent chunks of one file aren't guarded against there
+    fcntl = None
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+
+from .aliases import get_manufacturer_resolver
+from .instrumentation import span
+from .jobs import start_worker_thread
+from .models import ComparisonJob, ComparisonJobFile
+from .parse_cache import store_entries
+from .parser_factory import get_bom_parser
+from .parsers import DelimitedTextParser
+
+logger = logging.getLogger(__name__)
+
+COPY_BUFFER_SIZE = 64 * 1024
+
+# job file pk -> spool parser thread running in this process
+_spool_threads = {}
+_spool_threads_lock = threading.Lock()
+
+
+class UploadError(ValueError):
+    """A chunk that doesn't fit the upload: wrong offset, past the declared size, or racing another chunk."""
+
+
+class UploadStalled(IOError):
+    """Raised by SpoolReader when an upload has made no progress for too long."""
+
+
+def create_chunked_job(user, master_bom, files):
+    """
+    Creates a job in the receiving state for files given as (name, size) pairs, with an
+    empty job file for each. Raises ValueError for unsupported file types or sizes.
+    """
+    for name, size in files:
+        get_bom_parser(name, name)
+        if size < 0:
+            raise ValueError(f"Invalid size for '{name}'.")
+
+    with transaction.atomic():
+        job = ComparisonJob.objects.create(user=user, master_bom=master_bom, status=ComparisonJob.STATUS_RECEIVING)
+        for position, (name, size) in enumerate(files):
+            job_file = ComparisonJobFile(
+                job=job,
+                position=position,
+                original_name=name,
+                size=size,
+                status=ComparisonJob.STATUS_RECEIVING,
+            )
+            job_file.file.save(name, ContentFile(b''), save=False)
+            job_file.save()
+            if not size:
+                # No chunk will ever arrive to start it
+                transaction.on_commit(functools.partial(start_spool_parser, job_file.pk))
+    return job
+
+
+def write_chunk(job_file, offset, stream, length):
+    """
+    Appends length bytes read from stream to a receiving job file. offset must be the
+    number of bytes received so far. Whatever was written is counted even if the stream
+    breaks off, so the client can resume from the returned received offset.
+
+    The file is locked while a chunk is written, and the received offset is checked
+    under the lock, so two requests sending the same chunk can't both write it.
+    """
+    with open(job_file.file.path, 'r+b') as f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadError("Another chunk of this file is being written.")
+        # A chunk written since job_file was read has moved the offset on
+        job_file.received = ComparisonJobFile.objects.filter(pk=job_file.pk).values_list('received', flat=True).get()
+        if offset != job_file.received:
+            raise UploadError(f"Expected offset {job_file.received}, got {offset}.")
+        if offset + length > job_file.size:
+            raise UploadError(f"Chunk ends past the declared size of {job_file.size} bytes.")
+
+        written = 0
+        try:
+            f.seek(offset)
+            while written < length:
+                data = stream.read(min(COPY_BUFFER_SIZE, length - written))
+                if not data:
+                    break
+                f.write(data)
+                written += len(data)
+            f.flush()
+        finally:
+            job_file.received = offset + written
+            ComparisonJobFile.objects.filter(pk=job_file.pk).update(received=job_file.received)
+
+    transaction.on_commit(lambda: start_spool_parser(job_file.pk))
+    return job_file.received
+
+
+class SpoolReader(io.RawIOBase):
+    """
+    Reads a file that is still being written, up to its declared size, hashing the
+    bytes as they go by. Reads block until data arrives; an upload that makes no
+    progress for settings.BOM_UPLOAD_STALL_TIMEOUT seconds fails with UploadStalled.
+    """
+    poll_interval = 0.2
+
+    def __init__(self, path, size):
+        self.file = open(path, 'rb')
+        self.size = size
+        self.position = 0
+        self.sha256 = hashlib.sha256()
+        self.stall_timeout = getattr(settings, 'BOM_UPLOAD_STALL_TIMEOUT', 600)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        # Fill the whole buffer, so peek() sees the complete sniffing prefix
+        wanted = min(len(buffer), self.size - self.position)
+        view = memoryview(buffer)
+        filled = 0
+        waiting_since = None
+        while filled < wanted:
+            count = self.file.readinto(view[filled:wanted])
+            if count:
+                filled += count
+                waiting_since = None
+                continue
+            if waiting_since is None:
+                waiting_since = time.monotonic()
+            elif time.monotonic() - waiting_since > self.stall_timeout:
+                raise UploadStalled(f"Upload stalled at {self.position + filled} of {self.size} bytes.")
+            time.sleep(self.poll_interval)
+        self.sha256.update(view[:filled])
+        self.position += filled
+        return filled
+
+    def drain(self):
+        """Reads whatever is left, so the digest covers the whole file."""
+        while self.readinto(bytearray(COPY_BUFFER_SIZE)):
+            pass
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+def parse_spooled_file(job_file):
+    """
+    Reads a chunked job file as it arrives: parses it on the fly when its format can be
+    streamed, and otherwise once it is complete. Stores the entries in the parse cache
+    under the file's digest, records the digest and queues the job once all its files
+    have one. Parse errors are left for the job to report; they only mean nothing is
+    cached. A stalled upload is given up on, leaving the next chunk to start over.
+    """
+    parser = get_bom_parser(job_file.file.path, job_file.original_name, get_manufacturer_resolver())
+    spool = SpoolReader(job_file.file.path, job_file.size)
+    try:
+        with spool:
+            entries = None
+            try:
+                with span('parse'):
+                    if isinstance(parser, DelimitedTextParser):
+                        buffered = io.BufferedReader(spool, buffer_size=parser.sniff_size)
+                        try:
+                            entries = parser.parse_stream(buffered)
+                        finally:
+                            # Detached rather than closed: the spool is read to the end below
+                            buffered.detach()
+                        spool.drain()
+                    else:
+                        spool.drain()
+                        entries = parser.parse(job_file.file.path)
+            except UploadStalled:
+                raise
+            except (IOError, ValueError) as e:
+                if spool.position < spool.size:
+                    spool.drain()
+                logger.info("Spooled parse of '%s' failed: %s", job_file.original_name, e)
+    except UploadStalled as e:
+        logger.info("Gave up on the upload of '%s': %s", job_file.original_name, e)
+        return
+
+    content_hash = spool.sha256.hexdigest()
+    if entries is not None:
+        store_entries(parser, content_hash, entries)
+
+    ComparisonJobFile.objects.filter(pk=job_file.pk).update(
+        content_hash=content_hash, status=ComparisonJob.STATUS_PENDING,
+    )
+    release_job(job_file.job_id)
+
+
+def release_job(job_id):
+    """Queues a receiving job once every one of its files has been received and hashed."""
+    if ComparisonJobFile.objects.filter(job_id=job_id, content_hash='').exists():
+        return False
+    queued = ComparisonJob.objects.filter(pk=job_id, status=ComparisonJob.STATUS_RECEIVING).update(
+        status=ComparisonJob.STATUS_PENDING,
+    )
+    if queued and getattr(settings, 'BOM_COMPARISON_WORKER', 'thread') == 'thread':
+        start_worker_thread()
+    return bool(queued)
+
+
+def _spool_thread_main(job_file_pk):
+    try:
+        job_file = ComparisonJobFile.objects.select_related('job').get(pk=job_file_pk)
+        parse_spooled_file(job_file)
+    except Exception:
+        logger.exception("Spool parser for job file %s failed", job_file_pk)
+    finally:
+        with _spool_threads_lock:
+            _spool_threads.pop(job_file_pk, None)
+        connection.close()
+
+
+def start_spool_parser(job_file_pk):
+    """
+    Starts the spool parser of a job file in this process, unless it already runs here
+    or the file has been hashed. Called for every chunk and status check, which also
+    restarts the parser of an upload whose previous parser stalled or died.
+    """
+    if ComparisonJobFile.objects.filter(pk=job_file_pk).exclude(content_hash='').exists():
+        return None
+    with _spool_threads_lock:
+        thread = _spool_threads.get(job_file_pk)
+        if thread is not None and thread.is_alive():
+            return thread
+        thread = threading.Thread(
+            target=_spool_thread_main, args=(job_file_pk,), name=f'bom-spool-{job_file_pk}', daemon=True,
+        )
+        _spool_threads[job_file_pk] = thread
+    thread.start()
+    return thread
+
+
+def upload_progress(job_file):
+    return {
+        'position': job_file.position,
+        'name': job_file.original_name,
+        'size': job_file.size,
+        'received': job_file.received,
+    }
@@ -1,10 +1,24 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+if getattr(settings, 'BOM_ASYNC_VIEWS', False):
+    from . import async_views as viewer_views
+else:
+    viewer_views = views
+
 urlpatterns = [
     path('', views.home, name='bom_home'),
     path('upload/', views.upload_master_bom, name='upload_master_bom'),
-    path('api/bom-data/<int:bom_file_id>/', views.get_bom_data, name='get_bom_data'),
+    path('api/bom-data/<int:bom_file_id>/', viewer_views.get_bom_data, name='get_bom_data'),
+    path('api/parse-cache-stats/', views.get_parse_cache_stats, name='parse_cache_stats'),
+    path('api/metrics/', views.get_metrics, name='metrics'),
+    path('api/where-used/', views.part_where_used, name='part_where_used'),
     path('compare/<int:master_bom_id>/', views.compare_boms, name='compare_boms'),
-    path('comparison-summary/', views.comparison_summary, name='comparison_summary'),
+    path('compare/<int:master_bom_id>/chunked/', views.create_chunked_comparison, name='create_chunked_comparison'),
+    path('compare-matrix/', views.compare_matrix, name='compare_matrix'),
+    path('api/comparison-jobs/<int:job_id>/', viewer_views.comparison_job_status, name='comparison_job_status'),
+    path('api/comparison-jobs/<int:job_id>/files/<int:position>/', views.upload_chunk, name='upload_chunk'),
+    path('comparison-summary/', viewer_views.comparison_summary, name='comparison_summary'),
+    path('comparison-summary/<int:job_id>/', viewer_views.comparison_summary, name='comparison_run_summary'),
 ]
@@ -2,34 +2,61 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages # Import messages
 from .forms import BOMUploadForm
-from .models import BOMFile, BOMEntry, Part
-from django.http import JsonResponse
-import openpyxl
+from .models import BOMFile, ComparisonJob, ComparisonResultRow
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.core.paginator import Paginator
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 import io
+import json
 import tempfile
-import os
-from .parser_factory import get_bom_parser # Import the factory
+from django.conf import settings
+from django.db import transaction
+from .aliases import get_manufacturer_resolver
+from .parsers import XLSXParser
+from .ingestion import bulk_ingest_entries, ingest_revision
+from .parse_cache import parse_cache_stats
+from .queries import InvalidQuery, bom_entries, bom_entries_page, has_entries, iter_bom_data_json
+from .jobs import enqueue_comparison, job_progress
+from .matrix import comparison_matrix, spool_uploads
+from .where_used import find_parts, where_used
+from .uploads import UploadError, create_chunked_job, start_spool_parser, upload_progress, write_chunk
+from .instrumentation import metrics, span
+
+COMPARISON_ROWS_PER_PAGE = 250
+BOM_DATA_PAGE_SIZE = 500
+BOM_DATA_MAX_PAGE_SIZE = 5000
+MATRIX_MAX_TARGETS = 20
+WHERE_USED_MAX_PARTS = 100
 
 @login_required
 def home(request):
     master_boms = BOMFile.objects.filter(user=request.user, is_master=True).order_by('-uploaded_at')
+    recent_comparisons = ComparisonJob.objects.filter(
+        user=request.user, status=ComparisonJob.STATUS_DONE,
+    ).select_related('master_bom').order_by('-created_at')[:10]
     context = {
-        'master_boms': master_boms
+        'master_boms': master_boms,
+        'recent_comparisons': recent_comparisons,
     }
     return render(request, 'home.html', context)
 
 @login_required
 def upload_master_bom(request):
     if request.method == 'POST':
-        form = BOMUploadForm(request.POST, request.FILES)
+        form = BOMUploadForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             bom_file = form.save(commit=False)
             bom_file.user = request.user
             bom_file.is_master = True
             bom_file.save()
+            # Reuse the entries parsed during validation instead of re-reading the workbook.
+            # A new revision of an existing master only stores the lines that changed.
+            ingest_revision(bom_file, form.parsed_entries)
             return redirect('home')
     else:
-        form = BOMUploadForm()
+        form = BOMUploadForm(user=request.user)
     return render(request, 'upload_bom.html', {'form': form})
 
 def parse_xlsx_and_save(bom_file_instance):
@@ -38,156 +65,110 @@ def parse_xlsx_and_save(bom_file_instance):
     Returns a tuple (success_boolean, error_message_string).
     """
     try:
-        workbook = openpyxl.load_workbook(bom_file_instance.file.path)
-        sheet = workbook.active
-
-        # Find header columns
-        headers = [cell.value for cell in sheet[1]]
-        required_columns = ['Reference designators', 'Quantity', 'Identified MPN', 'Identified manufacturer']
-        missing_columns = [col for col in required_columns if col not in headers]
-
-        if missing_columns:
-            return (False, f"The file is missing the following required columns: {', '.join(missing_columns)}.")
-
-        column_map = {col: headers.index(col) for col in required_columns}
-
-        # Parse rows
-        for row_index in range(2, sheet.max_row + 1):
-            row_data = [cell.value for cell in sheet[row_index]]
-            
-            if not any(row_data):
-                continue
-
-            mpn = row_data[column_map['Identified MPN']]
-            manufacturer = row_data[column_map['Identified manufacturer']]
-            
-            if not mpn or not manufacturer:
-                continue
-
-            part, _ = Part.objects.get_or_create(
-                mpn=mpn,
-                manufacturer=manufacturer
-            )
-            
-            BOMEntry.objects.create(
-                bom_file=bom_file_instance,
-                part=part,
-                quantity=int(row_data[column_map['Quantity']]),
-                reference_designators=row_data[column_map['Reference designators']]
-            )
+        parser = XLSXParser()
+        parser.manufacturer_resolver = get_manufacturer_resolver()
+        with span('parse'):
+            entries = parser.parse(bom_file_instance.file.path)
+
+        # One transaction and a handful of batched queries instead of two queries per row
+        bulk_ingest_entries(bom_file_instance, entries)
         return (True, None)
     except Exception as e:
         return (False, f"An unexpected error occurred while parsing the file: {e}")
 
 
+def _bom_data_etag(request, bom_file_id):
+    # Entries only change through ingestion or edits, both of which bump entries_version
+    version = BOMFile.objects.filter(pk=bom_file_id, user=request.user).values_list('entries_version', flat=True).first()
+    return None if version is None else f'bom-{bom_file_id}-v{version}'
+
+def _bom_data_last_modified(request, bom_file_id):
+    dates = BOMFile.objects.filter(pk=bom_file_id, user=request.user).values_list('entries_updated_at', 'uploaded_at').first()
+    return None if dates is None else (dates[0] or dates[1])
+
 @login_required
+@condition(etag_func=_bom_data_etag, last_modified_func=_bom_data_last_modified)
 def get_bom_data(request, bom_file_id):
+    """
+    Entries of a BOM file. Without query parameters the whole BOM is streamed; with any
+    of q (search), sort ([-]position/mpn/manufacturer/quantity/designators), cursor or limit,
+    one keyset-paginated page is returned along with the cursor of the next one.
+    """
     bom_file = get_object_or_404(BOMFile, pk=bom_file_id, user=request.user)
     
-    if not BOMEntry.objects.filter(bom_file=bom_file).exists():
+    if not has_entries(bom_file):
         success, error_message = parse_xlsx_and_save(bom_file)
         if not success:
             return JsonResponse({'error': error_message}, status=500)
 
-    entries = BOMEntry.objects.filter(bom_file=bom_file)
-    data = {
-        'file_name': bom_file.name,
-        'entries': [
-            {
-                'mpn': entry.part.mpn,
-                'manufacturer': entry.part.manufacturer,
-                'quantity': entry.quantity,
-                'designators': entry.reference_designators,
-            }
-            for entry in entries
-        ]
-    }
-    return JsonResponse(data)
+    if not any(param in request.GET for param in ('q', 'sort', 'cursor', 'limit')):
+        # One projected query for all entries, streamed out as it is read
+        response = StreamingHttpResponse(
+            iter_bom_data_json(bom_file, bom_entries(bom_file)),
+            content_type='application/json',
+        )
+    else:
+        try:
+            limit = int(request.GET.get('limit', BOM_DATA_PAGE_SIZE))
+            if limit < 1:
+                raise ValueError
+        except ValueError:
+            return JsonResponse({'error': 'limit must be a positive integer.'}, status=400)
+        try:
+            entries, next_cursor, total = bom_entries_page(
+                bom_file,
+                search=request.GET.get('q', '').strip(),
+                sort=request.GET.get('sort', ''),
+                cursor=request.GET.get('cursor'),
+                limit=min(limit, BOM_DATA_MAX_PAGE_SIZE),
+            )
+        except InvalidQuery as e:
+            return JsonResponse({'error': str(e)}, status=400)
 
-def _perform_comparison(master_bom_entries, target_bom_entries):
+        response = JsonResponse({
+            'file_name': bom_file.name,
+            'total': total,
+            'next_cursor': next_cursor,
+            'entries': entries,
+        })
+
+    # Let browsers keep the payload but revalidate it (ETag/Last-Modified) on every open
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+@login_required
+def get_parse_cache_stats(request):
+    return JsonResponse(parse_cache_stats())
+
+@login_required
+def get_metrics(request):
+    """Timing spans and request/SQL totals of this process (see instrumentation.py). Staff only."""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff access required.'}, status=403)
+    return JsonResponse(metrics())
+
+@login_required
+def part_where_used(request):
     """
-    Compares two BOMs and returns categorized differences along with summary counts.
+    The user's BOM files using each part whose MPN starts with ?mpn=, or matches it when
+    it contains * or ? wildcards, optionally narrowed to a ?manufacturer= prefix.
     """
-    master_parts_map = {}
-    for entry in master_bom_entries:
-        key = (entry['mpn'], entry['manufacturer'])
-        master_parts_map[key] = {
-            'quantity': entry['quantity'],
-            'designators': entry['designators']
-        }
-    
-    target_parts_map = {}
-    for entry in target_bom_entries:
-        key = (entry['mpn'], entry['manufacturer'])
-        target_parts_map[key] = {
-            'quantity': entry['quantity'],
-            'designators': entry['designators']
-        }
-
-    matching_parts = []
-    added_parts = []
-    removed_parts = []
-
-    perfectly_matching_count = 0
-    partially_matching_count = 0
-    totally_different_count = 0 # This will be sum of added_parts + removed_parts
-
-    # Check for matching and removed parts
-    for master_key, master_data in master_parts_map.items():
-        if master_key in target_parts_map:
-            target_data = target_parts_map[master_key]
-            if (master_data['quantity'] != target_data['quantity']) or \
-               (master_data['designators'] != target_data['designators']):
-                partially_matching_count += 1
-                matching_parts.append({
-                    'mpn': master_key[0],
-                    'manufacturer': master_key[1],
-                    'master_quantity': master_data['quantity'],
-                    'target_quantity': target_data['quantity'],
-                    'master_designators': master_data['designators'],
-                    'target_designators': target_data['designators'],
-                    'status': 'Quantity/Designator Changed'
-                })
-            else:
-                perfectly_matching_count += 1
-                matching_parts.append({
-                    'mpn': master_key[0],
-                    'manufacturer': master_key[1],
-                    'quantity': master_data['quantity'],
-                    'designators': master_data['designators'],
-                    'status': 'Identical'
-                })
-        else:
-            totally_different_count += 1 # Part removed from master
-            removed_parts.append({
-                'mpn': master_key[0],
-                'manufacturer': master_key[1],
-                'quantity': master_data['quantity'],
-                'designators': master_data['designators'],
-            })
-    
-    # Check for added parts
-    for target_key, target_data in target_parts_map.items():
-        if target_key not in master_parts_map:
-            totally_different_count += 1 # Part added to target
-            added_parts.append({
-                'mpn': target_key[0],
-                'manufacturer': target_key[1],
-                'quantity': target_data['quantity'],
-                'designators': target_data['designators'],
-            })
-    
-    return {
-        'matching_parts': matching_parts,
-        'added_parts': added_parts,
-        'removed_parts': removed_parts,
-        'summary': {
-            'perfectly_matching': perfectly_matching_count,
-            'partially_matching': partially_matching_count,
-            'totally_different': totally_different_count,
-        }
-    }
+    mpn = request.GET.get('mpn', '').strip()
+    if not mpn.strip('*?'):
+        return JsonResponse({'error': 'Enter a part number or part number pattern.'}, status=400)
+    try:
+        limit = int(request.GET.get('limit', WHERE_USED_MAX_PARTS))
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a positive integer.'}, status=400)
 
+    parts, truncated = where_used(
+        find_parts(mpn, request.GET.get('manufacturer', '')),
+        BOMFile.objects.filter(user=request.user),
+        limit=min(limit, WHERE_USED_MAX_PARTS),
+    )
+    return JsonResponse({'mpn': mpn, 'parts': parts, 'truncated': truncated})
 
 @login_required
 def compare_boms(request, master_bom_id):
@@ -201,96 +182,217 @@ def compare_boms(request, master_bom_id):
             return redirect('home')
 
         # Ensure master BOM is parsed
-        if not BOMEntry.objects.filter(bom_file=master_bom).exists():
+        if not has_entries(master_bom):
             success, error_message = parse_xlsx_and_save(master_bom)
             if not success:
                 messages.error(request, f"Error parsing Master BOM '{master_bom.name}': {error_message}")
                 return redirect('home')
         
-        master_bom_entries = []
-        for entry in BOMEntry.objects.filter(bom_file=master_bom):
-            master_bom_entries.append({
-                'mpn': entry.part.mpn,
-                'manufacturer': entry.part.manufacturer,
-                'quantity': entry.quantity,
-                'designators': entry.reference_designators,
-            })
-
-        all_comparison_results = []
-        global_parsing_errors = []
-
-        for uploaded_file in target_files:
-            # Create a temporary file with the original extension
-            file_extension = os.path.splitext(uploaded_file.name)[1]
-            with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-                for chunk in uploaded_file.chunks():
-                    temp_file.write(chunk)
-                temp_file_path = temp_file.name
-
-            try:
-                parser = get_bom_parser(temp_file_path, uploaded_file.name) 
-                target_parsed_data = parser.parse(temp_file_path)
-                
-                if not target_parsed_data:
-                    global_parsing_errors.append(f"No valid BOM entries found in '{uploaded_file.name}'.")
-                    continue
-
-                comparison_result = _perform_comparison(master_bom_entries, target_parsed_data)
-                all_comparison_results.append({
-                    'target_file_name': uploaded_file.name,
-                    'results': comparison_result
-                })
-            except (IOError, ValueError) as e:
-                global_parsing_errors.append(f"Error parsing '{uploaded_file.name}': {e}")
-            finally:
-                os.unlink(temp_file_path)
-        
-        # Debugging: Print session content before storing
-        # print("---", "Before storing in session (compare_boms) ---")
-        # print(f"Session key: {request.session.session_key}")
-        # print(f"Existing session data: {request.session.items()}")
-
-        # Store results in session
-        request.session['comparison_results'] = {
-            'master_bom_name': master_bom.name,
-            'all_comparison_results': all_comparison_results,
-            'global_parsing_errors': global_parsing_errors,
-        }
-        request.session.modified = True # Explicitly mark session as modified
-        
-        # Debugging: Print session content after storing and marking modified
-        # print("---", "After storing in session (compare_boms) ---")
-        # print(f"Session key: {request.session.session_key}")
-        # print(f"Session data after update: {request.session.items()}")
+        # Parsing and diffing happen in the background; the page polls the job's progress
+        job = enqueue_comparison(request.user, master_bom, target_files)
+        request.session['comparison_job_id'] = job.pk
 
-        return redirect('comparison_summary')
+        return JsonResponse({
+            'job_id': job.pk,
+            'status_url': reverse('comparison_job_status', args=[job.pk]),
+            'summary_url': reverse('comparison_summary'),
+        }, status=202)
 
     messages.error(request, "Invalid request method for comparison.")
     return redirect('home')
 
 
+def _chunked_upload_response(job):
+    return {
+        'job_id': job.pk,
+        'status': job.status,
+        'status_url': reverse('comparison_job_status', args=[job.pk]),
+        'summary_url': reverse('comparison_summary'),
+        'chunk_size': getattr(settings, 'BOM_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024),
+        'files': [
+            dict(upload_progress(job_file), upload_url=reverse('upload_chunk', args=[job.pk, job_file.position]))
+            for job_file in job.files.order_by('position')
+        ],
+    }
+
+
 @login_required
-def comparison_summary(request):
-    # Debugging: Print session content at the start of comparison_summary
-    # print("---", "Start of comparison_summary ---")
-    # print(f"Session key: {request.session.session_key}")
-    # print(f"Session data available: {request.session.items()}")
-
-    # Use .get() instead of .pop() to retrieve data without removing it
-    results = request.session.get('comparison_results', None)
-    
-    context = {
-        'master_bom_name': results.get('master_bom_name') if results else None,
-        'all_comparison_results': results.get('all_comparison_results') if results else [],
-        'global_parsing_errors': results.get('global_parsing_errors') if results else [],
+def create_chunked_comparison(request, master_bom_id):
+    """
+    Starts a comparison whose target files are uploaded in chunks, for files too large
+    for one request. Takes a JSON body {"files": [{"name": ..., "size": ...}, ...]} and
+    returns an upload URL per file; the job is queued once every file is complete.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method.'}, status=405)
+    master_bom = get_object_or_404(BOMFile, pk=master_bom_id, user=request.user, is_master=True)
+
+    try:
+        files = [(str(f['name']), int(f['size'])) for f in json.loads(request.body)['files']]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Expected {"files": [{"name": ..., "size": ...}]}.'}, status=400)
+    if not files:
+        return JsonResponse({'error': 'No target files were uploaded for comparison.'}, status=400)
+
+    if not has_entries(master_bom):
+        success, error_message = parse_xlsx_and_save(master_bom)
+        if not success:
+            return JsonResponse({'error': f"Error parsing Master BOM '{master_bom.name}': {error_message}"}, status=400)
+
+    try:
+        job = create_chunked_job(request.user, master_bom, files)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    request.session['comparison_job_id'] = job.pk
+    return JsonResponse(_chunked_upload_response(job), status=201)
+
+
+@login_required
+def upload_chunk(request, job_id, position):
+    """
+    PUT (or POST) a raw chunk of a chunked job's file at ?offset=<bytes received so
+    far>. A GET returns how much of each file has been received, to resume from.
+    """
+    job = get_object_or_404(ComparisonJob, pk=job_id, user=request.user)
+    job_file = get_object_or_404(job.files, position=position)
+
+    if request.method == 'GET':
+        if job.status == ComparisonJob.STATUS_RECEIVING and job_file.received:
+            # Restarts the file's parser if the process that ran it went away
+            transaction.on_commit(lambda: start_spool_parser(job_file.pk))
+        return JsonResponse(_chunked_upload_response(job))
+    if request.method not in ('PUT', 'POST'):
+        return JsonResponse({'error': 'Invalid request method.'}, status=405)
+    if job.status != ComparisonJob.STATUS_RECEIVING:
+        return JsonResponse({'error': 'This comparison is not receiving files.'}, status=409)
+
+    try:
+        offset = int(request.GET['offset'])
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'An offset query parameter and a Content-Length are required.'}, status=400)
+
+    try:
+        received = write_chunk(job_file, offset, request, length)
+    except UploadError as e:
+        return JsonResponse({'error': str(e), 'received': job_file.received}, status=409)
+    return JsonResponse({'received': received, 'size': job_file.size})
+
+
+@login_required
+def compare_matrix(request):
+    """
+    Scores each uploaded target against every selected master BOM and returns, per
+    target, the masters ranked by similarity. Nothing is stored; run compare_boms
+    against the best match for the line-by-line differences.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method.'}, status=405)
+
+    try:
+        master_ids = [int(master_id) for master_id in request.POST.getlist('master_bom_ids')]
+    except ValueError:
+        master_ids = []
+    master_boms = list(BOMFile.objects.filter(pk__in=master_ids, user=request.user, is_master=True).order_by('pk'))
+    target_files = request.FILES.getlist('target_files')
+    if not master_boms:
+        return JsonResponse({'error': 'Select at least one master BOM.'}, status=400)
+    if not target_files:
+        return JsonResponse({'error': 'No target files were uploaded for comparison.'}, status=400)
+    if len(target_files) > MATRIX_MAX_TARGETS:
+        return JsonResponse({'error': f'At most {MATRIX_MAX_TARGETS} target files can be compared at once.'}, status=400)
+
+    for master_bom in master_boms:
+        if not has_entries(master_bom):
+            success, error_message = parse_xlsx_and_save(master_bom)
+            if not success:
+                return JsonResponse({'error': f"Error parsing Master BOM '{master_bom.name}': {error_message}"}, status=400)
+
+    with tempfile.TemporaryDirectory() as directory:
+        with span('comparison'):
+            rows = comparison_matrix(master_boms, spool_uploads(target_files, directory))
+
+    return JsonResponse({
+        'masters': [{'id': master_bom.pk, 'name': master_bom.name} for master_bom in master_boms],
+        'targets': rows,
+    })
+
+
+@login_required
+def comparison_job_status(request, job_id):
+    job = get_object_or_404(ComparisonJob, pk=job_id, user=request.user)
+    return JsonResponse(job_progress(job))
+
+
+def _comparison_page(request, result, row_count):
+    """
+    The page of a target file's rows requested through its p<result id> query parameter,
+    as (page, rows queryset). The rows are paginated independently of the other targets.
+    """
+    page = Paginator(range(row_count), COMPARISON_ROWS_PER_PAGE).get_page(request.GET.get(f'p{result.pk}'))
+    return page, result.rows.all()[page.start_index() - 1 if row_count else 0:page.end_index()]
+
+
+def _paginated_comparison(request, result, page, rows):
+    """One target file's results for the summary page, given its page from _comparison_page and the page's rows."""
+    page_param = f'p{result.pk}'
+    parts = {
+        ComparisonResultRow.CATEGORY_MATCHING: [],
+        ComparisonResultRow.CATEGORY_ADDED: [],
+        ComparisonResultRow.CATEGORY_REMOVED: [],
     }
-    
-    if not results: # If results are not in session, means no comparison was just done or session expired
-        # print("---", "No comparison results found in session! ---")
+    for row in rows:
+        parts[row.category].append(row.as_dict())
+
+    def page_url(number):
+        query = request.GET.copy()
+        query[page_param] = number
+        return f'?{query.urlencode()}'
+
+    return {
+        'target_file_name': result.target_file_name,
+        'page_obj': page,
+        'previous_page_url': page_url(page.previous_page_number()) if page.has_previous() else None,
+        'next_page_url': page_url(page.next_page_number()) if page.has_next() else None,
+        'matching_total': result.perfectly_matching + result.partially_matching,
+        'added_total': result.added,
+        'removed_total': result.removed,
+        'results': {
+            'matching_parts': parts[ComparisonResultRow.CATEGORY_MATCHING],
+            'added_parts': parts[ComparisonResultRow.CATEGORY_ADDED],
+            'removed_parts': parts[ComparisonResultRow.CATEGORY_REMOVED],
+            'summary': result.summary(),
+        },
+    }
+
+
+@login_required
+def comparison_summary(request, job_id=None):
+    # Without an explicit job id, show the comparison this session started last
+    if job_id is None:
+        job_id = request.session.get('comparison_job_id', None)
+    job = ComparisonJob.objects.filter(pk=job_id, user=request.user).select_related('master_bom').first() if job_id else None
+
+    if job is not None and job.status in (ComparisonJob.STATUS_RECEIVING, ComparisonJob.STATUS_PENDING, ComparisonJob.STATUS_RUNNING):
+        messages.info(request, "The comparison is still running. Please try again in a moment.")
+        return redirect('home')
+
+    if job is not None and job.status == ComparisonJob.STATUS_FAILED:
+        messages.error(request, f"The comparison failed: {job.error}")
+        return redirect('home')
+
+    if job is None: # If there is no finished job, means no comparison was done or session expired
         current_messages = list(messages.get_messages(request)) # Consume messages
         if not current_messages: # Only add if no other messages are pending
             messages.warning(request, "No comparison results found. Please perform a comparison first.")
         return redirect('home') 
 
-    # print("---", "Comparison results retrieved from session. ---")
+    context = {
+        'master_bom_name': job.master_bom.name,
+        'all_comparison_results': [
+            _paginated_comparison(request, result, *_comparison_page(request, result, result.rows.count()))
+            for result in job.results.all()
+        ],
+        'global_parsing_errors': [job_file.error for job_file in job.files.all() if job_file.error],
+    }
     return render(request, 'compare_results.html', context)
@@ -0,0 +1,121 @@
+"""
+Where-used lookups: which BOM files use a part, and how many of it.
+
+Answering that from BOMEntry would mean replaying the delta chain of every revision
+stored as deltas. Instead PartUsage keeps one row per (part, BOM file) with the part's
+total quantity in the file, rebuilt whenever the file's entries change, so a lookup is
+one query on an index led by the part.
+
+Parts are found by part number prefix through the Part.mpn_key index, or by a pattern
+with * and ? wildcards. On SQLite wildcard patterns are answered by a trigram FTS5
+index of the keys (created by migration 0012, kept in sync by triggers); elsewhere, or
+without FTS5, the keys are scanned from the pattern's literal prefix on.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.db.models.expressions import RawSQL
+
+from .keys import normalize_manufacturer, normalize_mpn, prefix_range
+from .models import Part, PartUsage
+from .queries import bom_entry_rows
+
+MPN_SEARCH_TABLE = 'bom_part_mpn_fts'
+WILDCARDS = re.compile(r'[*?]')
+USAGE_BATCH_SIZE = 500
+# Entry rows keyed on (mpn, manufacturer) like any other, for bom_entry_rows
+USAGE_ROW_FIELDS = ('part__mpn', 'part__manufacturer', 'part_id', 'quantity')
+
+
+def part_usages(bom_file_id, rows):
+    """PartUsages of a BOM file from its (part_id, quantity) rows, quantities summed per part."""
+    quantities = {}
+    for part_id, quantity in rows:
+        quantities[part_id] = quantities.get(part_id, 0) + quantity
+    return [PartUsage(bom_file_id=bom_file_id, part_id=part_id, quantity=quantity) for part_id, quantity in quantities.items()]
+
+
+def store_part_usage(bom_file_id, rows):
+    """Replaces the where-used rows of a BOM file with those of its (part_id, quantity) rows."""
+    PartUsage.objects.filter(bom_file_id=bom_file_id).delete()
+    PartUsage.objects.bulk_create(part_usages(bom_file_id, rows), batch_size=USAGE_BATCH_SIZE)
+
+
+def refresh_part_usage(bom_files):
+    """Rebuilds the where-used rows of BOM files from their entries, however they are stored."""
+    for bom_file in bom_files:
+        store_part_usage(bom_file.pk, (row[2:] for row in bom_entry_rows(bom_file, USAGE_ROW_FIELDS)))
+
+
+def has_mpn_search_index():
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [MPN_SEARCH_TABLE])
+        return cursor.fetchone() is not None
+
+
+def _glob(pattern):
+    # '[' opens a character class in GLOB; it is literal inside one
+    return pattern.replace('[', '[[]')
+
+
+def _regex(pattern):
+    return '^' + ''.join({'*': '.*', '?': '.'}.get(char) or re.escape(char) for char in pattern) + '$'
+
+
+def find_parts(mpn, manufacturer=''):
+    """
+    Parts whose MPN starts with mpn, or matches it if it contains * or ? wildcards, and
+    whose manufacturer starts with manufacturer. Both are compared on their lookup keys,
+    so case and spacing don't matter.
+    """
+    pattern = normalize_mpn(mpn)
+    if not WILDCARDS.search(pattern):
+        parts = Part.objects.filter(**prefix_range('mpn_key', pattern))
+    elif has_mpn_search_index():
+        parts = Part.objects.filter(pk__in=RawSQL(
+            f"SELECT rowid FROM {MPN_SEARCH_TABLE} WHERE mpn_key GLOB %s", [_glob(pattern)],
+        ))
+    else:
+        literal_prefix = WILDCARDS.split(pattern, 1)[0]
+        parts = Part.objects.filter(**prefix_range('mpn_key', literal_prefix), mpn_key__regex=_regex(pattern))
+
+    if manufacturer.strip():
+        parts = parts.filter(**prefix_range('manufacturer_key', normalize_manufacturer(manufacturer)))
+    return parts
+
+
+def where_used(parts, bom_files, limit=100):
+    """
+    The BOM files among bom_files (a queryset) that use each of parts (a queryset, e.g.
+    from find_parts), for at most limit parts in part number order. Parts none of
+    bom_files use are left out.
+    Returns (parts, truncated): dicts with the part and its usages, and whether more
+    parts matched than were returned.
+    """
+    used = PartUsage.objects.filter(part=OuterRef('pk'), bom_file__in=bom_files)
+    parts = list(parts.filter(Exists(used)).order_by('mpn_key', 'manufacturer_key', 'pk').only('mpn', 'manufacturer')[:limit + 1])
+    truncated = len(parts) > limit
+    parts = parts[:limit]
+
+    usages = {part.pk: [] for part in parts}
+    rows = (
+        PartUsage.objects.filter(part__in=parts, bom_file__in=bom_files)
+        .order_by('bom_file__name', 'bom_file_id')
+        .values_list('part_id', 'quantity', 'bom_file_id', 'bom_file__name', 'bom_file__revision', 'bom_file__is_master')
+    )
+    for part_id, quantity, bom_file_id, name, revision, is_master in rows:
+        usages[part_id].append({
+            'bom_file_id': bom_file_id,
+            'bom_file_name': name,
+            'revision': revision,
+            'is_master': is_master,
+            'quantity': quantity,
+        })
+
+    return [
+        {'mpn': part.mpn, 'manufacturer': part.manufacturer, 'usages': usages[part.pk]}
+        for part in parts
+    ], truncated
@@ -42,6 +42,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost so it times the whole request; removes itself unless BOM_INSTRUMENTATION is on
+    'bom.instrumentation.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -82,6 +84,28 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Parsed target BOMs keyed by upload content hash, shared by all workers on the host.
+    'bom_parse': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'bom_parse',
+        'TIMEOUT': 7 * 24 * 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 2000,
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
+
+BOM_PARSE_CACHE_ALIAS = 'bom_parse'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -127,3 +151,73 @@ LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 
 LOGIN_URL = '/users/login/'
+
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'bom': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
+# BOM comparison jobs
+# 'thread' runs queued comparisons in a background thread of the web process that
+# accepted them; 'external' leaves them to `python manage.py run_comparison_worker`.
+BOM_COMPARISON_WORKER = 'thread'
+
+# Seconds a running job may go without progress (workers touch it after every target
+# file) before it is considered abandoned by a worker that died and is run again.
+BOM_JOB_STALE_TIMEOUT = 1800
+
+# Maximum number of processes used to parse the target files of one comparison job.
+# 1 parses them one after another in the worker itself.
+BOM_PARSE_WORKERS = 4
+
+# Chunked uploads (for target files too large for one request): the chunk size
+# clients are told to use, and how many seconds an unfinished upload may make no
+# progress before its spool parser gives up (the next chunk starts a new one).
+BOM_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+BOM_UPLOAD_STALL_TIMEOUT = 600
+
+# Serve the BOM viewer API, job status and comparison summary from the async views
+# (bom/async_views.py). Turn on when running under ASGI (bom_compare.asgi); under
+# WSGI each async view runs in an event loop of its own, for no gain.
+BOM_ASYNC_VIEWS = False
+
+# Number of master BOM indexes each process keeps in memory.
+BOM_MASTER_INDEX_MEMO_SIZE = 32
+
+# Processes used to extract tables from the pages of a large PDF when it is the only
+# file being parsed (files parsed in the BOM_PARSE_WORKERS pool use one each).
+BOM_PDF_PAGE_WORKERS = 4
+
+# New revisions of a master BOM are stored as the lines that changed since the previous
+# one. Once a chain reaches BOM_REVISION_MAX_DELTAS deltas, or a delta would exceed
+# BOM_REVISION_MAX_DELTA_RATIO of the file's lines, the revision is stored in full.
+BOM_REVISION_MAX_DELTAS = 10
+BOM_REVISION_MAX_DELTA_RATIO = 0.5
+
+# How similar (difflib ratio of the normalized names, 0-1) an unknown manufacturer name
+# must be to a ManufacturerAlias to be mapped to its canonical name.
+BOM_MANUFACTURER_FUZZY_THRESHOLD = 0.9
+
+# Request instrumentation: per-request SQL counts and timing spans (parsing, comparison,
+# ingestion, session save) logged on 'bom.instrumentation', returned in a Server-Timing
+# header and aggregated at /bom/api/metrics/. Off by default; the middleware then
+# removes itself from the chain.
+BOM_INSTRUMENTATION = False
+# With instrumentation on, requests slower than this many milliseconds have their
+# cProfile dumped to BOM_PROFILE_DIR (None disables profiling, which is costly).
+BOM_PROFILE_THRESHOLD_MS = None
+BOM_PROFILE_DIR = BASE_DIR / '.cache' / 'profiles'